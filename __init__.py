@@ -1,2 +1,11 @@
-from .panelize_action import PanelizePlugin
-PanelizePlugin().register()
+# The action plugin needs the GUI of pcbnew. Without wx or the action plugins, as for the command line
+# entry point, the package only provides the panel modules.
+try:
+    import wx
+    from pcbnew import ActionPlugin
+except ImportError:
+    ActionPlugin = None
+
+if ActionPlugin is not None:
+    from .panelize_action import PanelizePlugin
+    PanelizePlugin().register()
@@ -0,0 +1,220 @@
+# Scaling benchmark for Panel.create_panel, using the pcbnew stand-in so it runs without KiCad.
+#
+#   python benchmarks/bench_panel.py --grids 1,2,4,8 --tabs 1,2 --tracks 500
+import argparse
+import inspect
+import json
+import os
+import sys
+import time
+import tracemalloc
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import fake_pcbnew
+# The plugin does 'from pcbnew import *', so the stand-in has to be registered first
+sys.modules['pcbnew'] = fake_pcbnew
+
+# Import the plugin modules without running the package __init__, which registers the action plugin
+package = types.ModuleType('panelize_plugin')
+package.__path__ = [PLUGIN_DIR]
+sys.modules['panelize_plugin'] = package
+
+from panelize_plugin import panelize
+from panelize_plugin.panelize import Panel, PanelSettings
+from boards import register_synthetic_board
+
+# Methods of Panel which make up the phases of create_panel, the analysis covers the whole layout
+# planning as the tab offsets are only computed for some of the tab modes
+PHASES = [
+    ('analysis', ['PlanPanel']),
+    ('frame', ['AddFrame']),
+    ('boards', ['AddBoardSteps']),
+    ('tabs', ['AddTabSteps']),
+]
+# Calls which are reported separately in the verbose output
+HIGHLIGHT = [
+    'LoadBoard', 'BOARD_ITEM.Duplicate', 'BOARD.Add', 'DRAWSEGMENT.HitTest',
+    'MODULE.__init__', 'D_PAD.__init__', 'BOARD.BuildConnectivity', 'ZONE_FILLER.Fill',
+]
+
+
+class PhaseRecorder(object):
+    def __init__(self):
+        self.phases = {}
+        self.current = None
+
+    def Enter(self, name):
+        # Nested phases are accounted to the outermost phase
+        if self.current is not None:
+            return None
+        self.current = name
+        return (time.time(), fake_pcbnew.calls.copy())
+
+    def Exit(self, name, token):
+        if token is None:
+            return
+        start, calls_before = token
+        phase = self.phases.setdefault(name, {'time': 0.0, 'calls': {}})
+        phase['time'] += time.time() - start
+        for key, count in fake_pcbnew.calls.items():
+            diff = count - calls_before.get(key, 0)
+            if diff:
+                phase['calls'][key] = phase['calls'].get(key, 0) + diff
+        self.current = None
+
+
+def instrument(recorder):
+    # Wrap the phase methods of Panel and the board loading function
+    originals = []
+
+    def wrap(owner, attr, phase):
+        original = getattr(owner, attr)
+        originals.append((owner, attr, original))
+
+        def wrapper(*args, **kwargs):
+            token = recorder.Enter(phase)
+            try:
+                return original(*args, **kwargs)
+            finally:
+                recorder.Exit(phase, token)
+
+        def step_wrapper(*args, **kwargs):
+            # Steps are timed while they run, not while the caller handles the progress
+            steps = original(*args, **kwargs)
+            while True:
+                token = recorder.Enter(phase)
+                try:
+                    step = next(steps)
+                except StopIteration:
+                    return
+                finally:
+                    recorder.Exit(phase, token)
+                yield step
+        setattr(owner, attr, step_wrapper if inspect.isgeneratorfunction(original) else wrapper)
+
+    wrap(panelize, 'LoadBoard', 'load')
+    # The source board is analyzed when it is created and when it is turned
+    wrap(panelize.SourceBoard, 'Rotated', 'analysis')
+    wrap(panelize, 'SourceBoard', 'analysis')
+    for phase, methods in PHASES:
+        for method in methods:
+            wrap(Panel, method, phase)
+    return originals
+
+
+def restore(originals):
+    for owner, attr, original in reversed(originals):
+        setattr(owner, attr, original)
+
+
+def run_case(grid, tabs, board_args, settings_args, memory):
+    register_synthetic_board('bench.kicad_pcb', **board_args)
+
+    settings = PanelSettings('bench.kicad_pcb')
+    settings.boards_x = settings.boards_y = grid
+    settings.tabs_x = settings.tabs_y = tabs
+    for name, value in settings_args.items():
+        setattr(settings, name, value)
+
+    recorder = PhaseRecorder()
+    originals = instrument(recorder)
+    fake_pcbnew.reset_calls()
+    board = fake_pcbnew.BOARD()
+    try:
+        if memory:
+            tracemalloc.start()
+        start = time.time()
+        Panel(settings, board).create_panel()
+        total = time.time() - start
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+        restore(originals)
+
+    return {
+        'grid': grid,
+        'tabs': tabs,
+        'time': total,
+        'peak_memory': peak,
+        'calls': sum(fake_pcbnew.calls.values()),
+        'items': {
+            'drawings': len(board.drawings),
+            'tracks': len(board.tracks),
+            'modules': len(board.modules),
+            'zones': len(board.zones),
+        },
+        'phases': recorder.phases,
+    }
+
+
+def parse_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark Panel.create_panel with a pcbnew stand-in')
+    parser.add_argument('--grids', type=parse_list, default=[1, 2, 4, 8], help='panel sizes, as boards per side')
+    parser.add_argument('--tabs', type=parse_list, default=[1, 3], help='tab counts per side')
+    parser.add_argument('--tracks', type=int, default=500)
+    parser.add_argument('--footprints', type=int, default=50)
+    parser.add_argument('--zones', type=int, default=2)
+    parser.add_argument('--outline-segments', type=int, default=8)
+    parser.add_argument('--tab-mode', type=int, default=PanelSettings.TABS_SPACE_AROUND)
+    parser.add_argument('--trim-silkscreen', action='store_true')
+    parser.add_argument('--group-tab-holes', action='store_true')
+    parser.add_argument('--keep-zone-fills', action='store_true')
+    parser.add_argument('--separate-nets', action='store_true')
+    parser.add_argument('--no-memory', action='store_true', help='skip the separate peak memory run')
+    parser.add_argument('--verbose', action='store_true', help='show the most important calls per phase')
+    parser.add_argument('--json', help='write all results to this file')
+    args = parser.parse_args(argv)
+
+    board_args = {
+        'tracks': args.tracks,
+        'footprints': args.footprints,
+        'zones': args.zones,
+        'outline_segments': args.outline_segments,
+    }
+    settings_args = {
+        'tab_mode': args.tab_mode,
+        'trim_silkscreen': args.trim_silkscreen,
+        'group_tab_holes': args.group_tab_holes,
+        'keep_zone_fills': args.keep_zone_fills,
+        'separate_nets': args.separate_nets,
+    }
+
+    phase_names = ['load'] + [phase for phase, _ in PHASES]
+    print('{:>5} {:>4} {:>9} {:>9} {:>9} '.format('grid', 'tabs', 'total ms', 'peak MB', 'calls') +
+          ' '.join('{:>10}'.format(name + ' ms') for name in phase_names))
+
+    results = []
+    for grid in args.grids:
+        for tabs in args.tabs:
+            # Time without tracing, then measure the memory in a separate run
+            result = run_case(grid, tabs, board_args, settings_args, False)
+            if not args.no_memory:
+                result['peak_memory'] = run_case(grid, tabs, board_args, settings_args, True)['peak_memory']
+            results.append(result)
+
+            peak = '-' if result['peak_memory'] is None else '{:.1f}'.format(result['peak_memory'] / 1e6)
+            print('{:>5} {:>4} {:>9.1f} {:>9} {:>9} '.format(
+                '{0}x{0}'.format(grid), tabs, result['time'] * 1000, peak, result['calls']) +
+                ' '.join('{:>10.1f}'.format(result['phases'].get(name, {}).get('time', 0) * 1000) for name in phase_names))
+            if args.verbose:
+                for name in phase_names:
+                    calls = result['phases'].get(name, {}).get('calls', {})
+                    summary = ', '.join('{}={}'.format(key, calls[key]) for key in HIGHLIGHT if key in calls)
+                    print('{:>20}: {}'.format(name, summary))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
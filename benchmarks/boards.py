@@ -0,0 +1,84 @@
+# Generators for synthetic source boards built from the pcbnew stand-in
+import random
+from fake_pcbnew import *
+from fake_pcbnew import register_board
+
+
+def make_board(width=50, height=40, tracks=500, footprints=50, zones=2,
+               outline_segments=8, nets=20, origin=(100, 100), seed=0):
+    # All sizes are in millimeters, the board is a rectangle at the given origin
+    rng = random.Random(seed)
+    board = BOARD()
+    ox, oy = origin
+
+    def point(x, y):
+        return wxPoint(FromMM(ox + x), FromMM(oy + y))
+
+    # Split each side of the rectangular outline in a number of collinear segments
+    corners = [(0, 0), (width, 0), (width, height), (0, height)]
+    per_side = max(outline_segments // 4, 1)
+    for side in range(4):
+        (x0, y0), (x1, y1) = corners[side], corners[(side + 1) % 4]
+        for i in range(per_side):
+            segment = DRAWSEGMENT(board)
+            segment.SetLayer(44)
+            segment.SetWidth(FromMM(0.1))
+            segment.SetStart(point(x0 + (x1 - x0) * i / float(per_side), y0 + (y1 - y0) * i / float(per_side)))
+            segment.SetEnd(point(x0 + (x1 - x0) * (i + 1) / float(per_side), y0 + (y1 - y0) * (i + 1) / float(per_side)))
+            board.Add(segment)
+
+    # Silkscreen line crossing the board edge, which is removed when trimming
+    silk = DRAWSEGMENT(board)
+    silk.SetLayer(37)
+    silk.SetStart(point(-1.5, height / 2.0))
+    silk.SetEnd(point(width / 2.0, height / 2.0))
+    board.Add(silk)
+
+    net_items = []
+    for i in range(nets):
+        net = NETINFO_ITEM(board, 'Net-{}'.format(i + 1))
+        board.Add(net)
+        net_items.append(net)
+
+    def random_point(margin=1):
+        return point(rng.uniform(margin, width - margin), rng.uniform(margin, height - margin))
+
+    for i in range(tracks):
+        track = TRACK(board)
+        start = random_point()
+        track.SetStart(start)
+        track.SetEnd(start + wxPoint(FromMM(rng.uniform(-1, 1)), FromMM(rng.uniform(-1, 1))))
+        track.SetNet(net_items[i % nets] if nets else None)
+        board.Add(track)
+
+    for i in range(footprints):
+        module = MODULE(board)
+        for x in (-0.5, 0.5):
+            pad = D_PAD(module)
+            pad.SetPos0(wxPoint(FromMM(x), 0))
+            pad.SetNet(net_items[(i + int(x > 0)) % nets] if nets else None)
+            module.Add(pad)
+        outline = EDGE_MODULE(module)
+        outline.SetLayer(37)
+        outline.SetStart(wxPoint(FromMM(-1), FromMM(-0.6)))
+        outline.SetEnd(wxPoint(FromMM(1), FromMM(-0.6)))
+        module.Add(outline)
+        module.SetPosition(random_point(2))
+        board.Add(module)
+
+    for i in range(zones):
+        zone = ZONE_CONTAINER(board)
+        zone.SetNet(net_items[i % nets] if nets else None)
+        zone.SetOutline([point(1, 1), point(width - 1, 1), point(width - 1, height - 1), point(1, height - 1)])
+        # Filled like a zone on a board which was saved after a refill
+        zone.SetFilledPolysList([[point(1.2, 1.2), point(width - 1.2, 1.2), point(width - 1.2, height - 1.2), point(1.2, height - 1.2)]])
+        zone.SetIsFilled(True)
+        board.Add(zone)
+
+    return board
+
+
+def register_synthetic_board(file_name, **kwargs):
+    board = make_board(**kwargs)
+    register_board(file_name, board)
+    return board
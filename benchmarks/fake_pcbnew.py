@@ -0,0 +1,930 @@
+# Recording stand-in for the subset of the KiCad 5 pcbnew API used by the
+# panelize plugin. Geometry is kept in integer nanometres like pcbnew itself.
+import copy
+import math
+from collections import Counter, OrderedDict
+
+# Number of calls made into the board API, keyed by 'Class.Method'
+calls = Counter()
+# Boards that LoadBoard can return, keyed by file name
+boards = {}
+_current_board = [None]
+
+
+def record(name):
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        return wrapper
+    return decorator
+
+
+def reset_calls():
+    calls.clear()
+
+
+def register_board(file_name, board):
+    boards[file_name] = board
+
+
+IU_PER_MM = 1000000
+
+PAD_ATTRIB_STANDARD = 0
+PAD_ATTRIB_SMD = 1
+PAD_ATTRIB_CONN = 2
+PAD_ATTRIB_HOLE_NOT_PLATED = 3
+
+PAD_SHAPE_CIRCLE = 0
+PAD_SHAPE_RECT = 1
+
+
+def _rotate(point, center, angle):
+    # Same direction as pcbnew's RotatePoint, counterclockwise on screen for positive angles
+    a = math.radians(angle / 10.0)
+    dx, dy = point[0] - center[0], point[1] - center[1]
+    return wxPoint(int(round(center[0] + dx * math.cos(a) + dy * math.sin(a))),
+                   int(round(center[1] - dx * math.sin(a) + dy * math.cos(a))))
+
+
+def FromMM(mm):
+    return int(round(mm * IU_PER_MM))
+
+
+def ToMM(iu):
+    return float(iu) / IU_PER_MM
+
+
+class wxPoint(object):
+    __slots__ = ('x', 'y')
+
+    def __init__(self, x=0, y=0):
+        self.x = int(x)
+        self.y = int(y)
+
+    def __getitem__(self, index):
+        return (self.x, self.y)[index]
+
+    def __len__(self):
+        return 2
+
+    def __add__(self, other):
+        return wxPoint(self.x + other[0], self.y + other[1])
+
+    def __sub__(self, other):
+        return wxPoint(self.x - other[0], self.y - other[1])
+
+    def __eq__(self, other):
+        return self.x == other[0] and self.y == other[1]
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'wxPoint({}, {})'.format(self.x, self.y)
+
+
+class wxSize(wxPoint):
+    __slots__ = ()
+
+    def GetWidth(self):
+        return self.x
+
+    def GetHeight(self):
+        return self.y
+
+
+class EDA_RECT(object):
+    def __init__(self, origin=None, size=None):
+        origin = origin if origin is not None else wxPoint()
+        size = size if size is not None else wxSize()
+        self.x, self.y = int(origin[0]), int(origin[1])
+        self.w, self.h = int(size[0]), int(size[1])
+
+    def Normalize(self):
+        if self.w < 0:
+            self.x += self.w
+            self.w = -self.w
+        if self.h < 0:
+            self.y += self.h
+            self.h = -self.h
+
+    def GetOrigin(self):
+        return wxPoint(self.x, self.y)
+
+    def GetPosition(self):
+        return self.GetOrigin()
+
+    def GetSize(self):
+        return wxSize(self.w, self.h)
+
+    def GetWidth(self):
+        return self.w
+
+    def GetHeight(self):
+        return self.h
+
+    def GetX(self):
+        return self.x
+
+    def GetY(self):
+        return self.y
+
+    def GetLeft(self):
+        return self.x
+
+    def GetTop(self):
+        return self.y
+
+    def GetRight(self):
+        return self.x + self.w
+
+    def GetBottom(self):
+        return self.y + self.h
+
+    def GetEnd(self):
+        return wxPoint(self.GetRight(), self.GetBottom())
+
+    def GetCenter(self):
+        return wxPoint(self.x + self.w // 2, self.y + self.h // 2)
+
+    def Inflate(self, dx, dy=None):
+        dy = dx if dy is None else dy
+        dx, dy = int(dx), int(dy)
+        self.x -= dx
+        self.y -= dy
+        self.w += 2 * dx
+        self.h += 2 * dy
+        return self
+
+    def Merge(self, other):
+        left = min(self.x, other.x)
+        top = min(self.y, other.y)
+        right = max(self.GetRight(), other.GetRight())
+        bottom = max(self.GetBottom(), other.GetBottom())
+        self.x, self.y, self.w, self.h = left, top, right - left, bottom - top
+
+    def Contains(self, point, y=None):
+        if isinstance(point, EDA_RECT):
+            return self.Contains(point.GetOrigin()) and self.Contains(point.GetEnd())
+        px, py = (point, y) if y is not None else (point[0], point[1])
+        return self.x <= px <= self.GetRight() and self.y <= py <= self.GetBottom()
+
+    def Intersects(self, a, b=None):
+        if isinstance(a, EDA_RECT):
+            return not (a.GetRight() < self.x or a.x > self.GetRight() or
+                        a.GetBottom() < self.y or a.y > self.GetBottom())
+        return _segment_hits_rect(a, b, self)
+
+
+def _segment_hits_rect(a, b, rect):
+    # Liang-Barsky clip of the segment against the rectangle
+    x0, y0 = a[0], a[1]
+    dx, dy = b[0] - x0, b[1] - y0
+    t0, t1 = 0.0, 1.0
+    for p, q in ((-dx, x0 - rect.GetLeft()), (dx, rect.GetRight() - x0),
+                 (-dy, y0 - rect.GetTop()), (dy, rect.GetBottom() - y0)):
+        if p == 0:
+            if q < 0:
+                return False
+        else:
+            t = float(q) / p
+            if p < 0:
+                t0 = max(t0, t)
+            else:
+                t1 = min(t1, t)
+            if t0 > t1:
+                return False
+    return True
+
+
+class LSET(object):
+    def __init__(self, layer=None):
+        self.layers = set() if layer is None else {layer}
+
+
+class NETCLASS(object):
+    Default = 'Default'
+
+    def __init__(self, name):
+        self.name = name
+        self.members = []
+        self.rules = {}
+
+    def GetName(self):
+        return self.name
+
+    def Add(self, net_name):
+        if net_name not in self.members:
+            self.members.append(net_name)
+
+    def __iter__(self):
+        return iter(list(self.members))
+
+    def __getattr__(self, attr):
+        # Getters and setters of the design rules, like GetClearance and SetClearance
+        if attr.startswith('Get'):
+            return lambda: self.rules.get(attr[3:], 0)
+        if attr.startswith('Set'):
+            return lambda value: self.rules.__setitem__(attr[3:], value)
+        raise AttributeError(attr)
+
+
+class NETCLASSES(object):
+    def __init__(self):
+        self.default = NETCLASS(NETCLASS.Default)
+        self.classes = OrderedDict()
+
+    def GetDefault(self):
+        return self.default
+
+    def Add(self, netclass):
+        if netclass.GetName() == NETCLASS.Default or netclass.GetName() in self.classes:
+            return False
+        self.classes[netclass.GetName()] = netclass
+        return True
+
+    def Find(self, name):
+        if name == NETCLASS.Default:
+            return self.default
+        return self.classes.get(name)
+
+
+class BOARD_DESIGN_SETTINGS(object):
+    def __init__(self):
+        self.netclasses = NETCLASSES()
+
+    def GetNetClasses(self):
+        return self.netclasses
+
+
+class NETINFO_ITEM(object):
+    def __init__(self, board=None, name='', code=-1):
+        self.board = board
+        self.name = name
+        self.code = code
+        self.netclass = None
+
+    def GetNet(self):
+        return self.code
+
+    def GetNetname(self):
+        return self.name
+
+    def GetNetClass(self):
+        return self.netclass
+
+    def SetClass(self, netclass):
+        self.netclass = netclass
+
+    def GetClassName(self):
+        return self.netclass.GetName() if self.netclass is not None else NETCLASS.Default
+
+
+class NETINFO_LIST(object):
+    def __init__(self):
+        self.nets = OrderedDict()
+        self.nets[0] = NETINFO_ITEM(None, '', 0)
+
+    def NetsByNetcode(self):
+        return self.nets
+
+    def GetNetItem(self, code):
+        return self.nets.get(code)
+
+    def GetNetCount(self):
+        return len(self.nets)
+
+
+class BOARD_ITEM(object):
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.layer = 0
+
+    @property
+    def this(self):
+        # Stands in for the SWIG pointer, which identifies the underlying item
+        return id(self)
+
+    def GetLayer(self):
+        return self.layer
+
+    def SetLayer(self, layer):
+        self.layer = layer
+
+    def GetParent(self):
+        return self.parent
+
+    @record('BOARD_ITEM.Duplicate')
+    def Duplicate(self):
+        dup = copy.copy(self)
+        dup._copy_children()
+        return dup
+
+    def _copy_children(self):
+        pass
+
+    def GetBoundingBox(self):
+        return EDA_RECT()
+
+    def DeleteStructure(self):
+        self.parent.Remove(self)
+
+
+class BOARD_CONNECTED_ITEM(BOARD_ITEM):
+    def __init__(self, parent=None):
+        BOARD_ITEM.__init__(self, parent)
+        self.net = None
+
+    def GetNetCode(self):
+        return self.net.code if self.net is not None else 0
+
+    def GetNet(self):
+        return self.net
+
+    def SetNet(self, net):
+        self.net = net
+
+    def SetNetCode(self, code):
+        self.net = NETINFO_ITEM(None, '', code)
+
+
+class DRAWSEGMENT(BOARD_ITEM):
+    def __init__(self, parent=None):
+        BOARD_ITEM.__init__(self, parent)
+        calls['DRAWSEGMENT.__init__'] += 1
+        self.shape = 0
+        self.width = FromMM(0.15)
+        self.start = wxPoint()
+        self.end = wxPoint()
+        self.angle = 0
+        self.poly = []
+
+    def GetShape(self):
+        return self.shape
+
+    def SetShape(self, shape):
+        self.shape = shape
+
+    def GetWidth(self):
+        return self.width
+
+    def SetWidth(self, width):
+        self.width = int(width)
+
+    def GetStart(self):
+        return wxPoint(self.start.x, self.start.y)
+
+    def SetStart(self, point):
+        self.start = wxPoint(point[0], point[1])
+
+    def GetEnd(self):
+        return wxPoint(self.end.x, self.end.y)
+
+    def SetEnd(self, point):
+        self.end = wxPoint(point[0], point[1])
+
+    def GetCenter(self):
+        return self.GetStart()
+
+    def GetArcStart(self):
+        return self.GetEnd()
+
+    def GetAngle(self):
+        return self.angle
+
+    def SetAngle(self, angle):
+        self.angle = angle
+
+    def GetRadius(self):
+        dx, dy = self.end.x - self.start.x, self.end.y - self.start.y
+        return int(round((dx * dx + dy * dy) ** 0.5))
+
+    def GetPolyPoints(self):
+        return [wxPoint(p[0], p[1]) for p in self.poly]
+
+    def SetPolyPoints(self, points):
+        self.poly = [wxPoint(p[0], p[1]) for p in points]
+
+    def _copy_children(self):
+        self.poly = list(self.poly)
+
+    @record('DRAWSEGMENT.Move')
+    def Move(self, offset):
+        self.start = self.start + offset
+        self.end = self.end + offset
+        self.poly = [p + offset for p in self.poly]
+
+    @record('DRAWSEGMENT.Rotate')
+    def Rotate(self, center, angle):
+        self.start = _rotate(self.start, center, angle)
+        self.end = _rotate(self.end, center, angle)
+        self.poly = [_rotate(p, center, angle) for p in self.poly]
+
+    def GetBoundingBox(self):
+        if self.shape == 4 and self.poly:
+            xs = [p.x for p in self.poly]
+            ys = [p.y for p in self.poly]
+        elif self.shape == 3 or self.shape == 2:
+            r = self.GetRadius()
+            xs = [self.start.x - r, self.start.x + r]
+            ys = [self.start.y - r, self.start.y + r]
+        else:
+            xs = [self.start.x, self.end.x]
+            ys = [self.start.y, self.end.y]
+        rect = EDA_RECT(wxPoint(min(xs), min(ys)), wxSize(max(xs) - min(xs), max(ys) - min(ys)))
+        rect.Inflate(self.width // 2, self.width // 2)
+        return rect
+
+    @record('DRAWSEGMENT.HitTest')
+    def HitTest(self, rect, contained=True, accuracy=0):
+        arect = EDA_RECT(rect.GetOrigin(), rect.GetSize())
+        arect.Normalize()
+        arect.Inflate(accuracy, accuracy)
+        if self.shape == 0:
+            if contained:
+                return arect.Contains(self.start) and arect.Contains(self.end)
+            return arect.Intersects(self.start, self.end)
+        box = self.GetBoundingBox()
+        if contained:
+            return arect.Contains(box)
+        return arect.Intersects(box)
+
+
+class EDGE_MODULE(DRAWSEGMENT):
+    def SetLocalCoord(self):
+        pass
+
+
+class TEXTE_PCB(BOARD_ITEM):
+    def __init__(self, parent=None):
+        BOARD_ITEM.__init__(self, parent)
+        self.pos = wxPoint()
+        self.size = wxSize(FromMM(1), FromMM(1))
+        self.visible = True
+        self.text = ''
+
+    def GetPosition(self):
+        return wxPoint(self.pos.x, self.pos.y)
+
+    def SetPosition(self, point):
+        self.pos = wxPoint(point[0], point[1])
+
+    def SetText(self, text):
+        self.text = text
+
+    def GetText(self):
+        return self.text
+
+    def IsVisible(self):
+        return self.visible
+
+    def SetVisible(self, visible):
+        self.visible = visible
+
+    @record('TEXTE_PCB.Move')
+    def Move(self, offset):
+        self.pos = self.pos + offset
+
+    def Rotate(self, center, angle):
+        self.pos = _rotate(self.pos, center, angle)
+
+    def GetBoundingBox(self):
+        return EDA_RECT(self.pos - wxPoint(self.size.x // 2, self.size.y // 2), self.size)
+
+    def GetTextBox(self, line=-1):
+        return self.GetBoundingBox()
+
+    def HitTest(self, rect, contained=True, accuracy=0):
+        arect = EDA_RECT(rect.GetOrigin(), rect.GetSize())
+        arect.Inflate(accuracy, accuracy)
+        if contained:
+            return arect.Contains(self.GetBoundingBox())
+        return arect.Intersects(self.GetBoundingBox())
+
+
+class TEXTE_MODULE(TEXTE_PCB):
+    pass
+
+
+class TRACK(BOARD_CONNECTED_ITEM):
+    def __init__(self, parent=None):
+        BOARD_CONNECTED_ITEM.__init__(self, parent)
+        self.start = wxPoint()
+        self.end = wxPoint()
+        self.width = FromMM(0.25)
+
+    def GetStart(self):
+        return wxPoint(self.start.x, self.start.y)
+
+    def SetStart(self, point):
+        self.start = wxPoint(point[0], point[1])
+
+    def GetEnd(self):
+        return wxPoint(self.end.x, self.end.y)
+
+    def SetEnd(self, point):
+        self.end = wxPoint(point[0], point[1])
+
+    def GetWidth(self):
+        return self.width
+
+    def SetWidth(self, width):
+        self.width = int(width)
+
+    @record('TRACK.Move')
+    def Move(self, offset):
+        self.start = self.start + offset
+        self.end = self.end + offset
+
+    @record('TRACK.Rotate')
+    def Rotate(self, center, angle):
+        self.start = _rotate(self.start, center, angle)
+        self.end = _rotate(self.end, center, angle)
+
+    def GetBoundingBox(self):
+        rect = EDA_RECT(wxPoint(min(self.start.x, self.end.x), min(self.start.y, self.end.y)),
+                        wxSize(abs(self.end.x - self.start.x), abs(self.end.y - self.start.y)))
+        rect.Inflate(self.width // 2, self.width // 2)
+        return rect
+
+
+class VIA(TRACK):
+    pass
+
+
+class D_PAD(BOARD_CONNECTED_ITEM):
+    def __init__(self, parent=None):
+        BOARD_CONNECTED_ITEM.__init__(self, parent)
+        calls['D_PAD.__init__'] += 1
+        self.size = wxSize(FromMM(1), FromMM(1))
+        self.drill = wxSize(0, 0)
+        self.attribute = PAD_ATTRIB_STANDARD
+        self.shape = PAD_SHAPE_CIRCLE
+        self.pos = wxPoint()
+        self.pos0 = wxPoint()
+        self.layerset = LSET()
+
+    def SetSize(self, size):
+        self.size = wxSize(size[0], size[1])
+
+    def GetSize(self):
+        return self.size
+
+    def SetDrillSize(self, size):
+        self.drill = wxSize(size[0], size[1])
+
+    def GetDrillSize(self):
+        return self.drill
+
+    def SetAttribute(self, attribute):
+        self.attribute = attribute
+
+    def GetAttribute(self):
+        return self.attribute
+
+    def SetShape(self, shape):
+        self.shape = shape
+
+    def SetLayerSet(self, layerset):
+        self.layerset = layerset
+
+    def GetPosition(self):
+        return wxPoint(self.pos.x, self.pos.y)
+
+    def SetPosition(self, point):
+        self.pos = wxPoint(point[0], point[1])
+
+    def SetPos0(self, point):
+        self.pos0 = wxPoint(point[0], point[1])
+
+    def GetPos0(self):
+        return self.pos0
+
+    @record('D_PAD.Move')
+    def Move(self, offset):
+        self.pos = self.pos + offset
+
+    def Rotate(self, center, angle):
+        self.pos = _rotate(self.pos, center, angle)
+        if angle % 1800:
+            self.size = wxSize(self.size.y, self.size.x)
+
+    def GetBoundingBox(self):
+        return EDA_RECT(self.pos - wxPoint(self.size.x // 2, self.size.y // 2), self.size)
+
+
+class MODULE(BOARD_ITEM):
+    def __init__(self, parent=None):
+        BOARD_ITEM.__init__(self, parent)
+        self.pos = wxPoint()
+        self.pads = []
+        self.drawings = []
+        self.reference = TEXTE_MODULE(self)
+        self.value = TEXTE_MODULE(self)
+        self.reference.SetLayer(37)
+        self.value.SetLayer(49)
+        calls['MODULE.__init__'] += 1
+
+    def _copy_children(self):
+        self.pads = [copy.copy(p) for p in self.pads]
+        self.drawings = [copy.copy(d) for d in self.drawings]
+        self.reference = copy.copy(self.reference)
+        self.value = copy.copy(self.value)
+        for item in self.pads + self.drawings + [self.reference, self.value]:
+            item.parent = self
+
+    @record('MODULE.Add')
+    def Add(self, item):
+        item.parent = self
+        if isinstance(item, D_PAD):
+            item.SetPosition(self.pos + item.GetPos0())
+            self.pads.append(item)
+        else:
+            self.drawings.append(item)
+
+    def Remove(self, item):
+        if isinstance(item, D_PAD):
+            self.pads.remove(item)
+        else:
+            self.drawings.remove(item)
+
+    def Pads(self):
+        return list(self.pads)
+
+    def GraphicalItems(self):
+        return list(self.drawings)
+
+    def Reference(self):
+        return self.reference
+
+    def Value(self):
+        return self.value
+
+    def GetPosition(self):
+        return wxPoint(self.pos.x, self.pos.y)
+
+    @record('MODULE.SetPosition')
+    def SetPosition(self, point):
+        self.Move(wxPoint(point[0], point[1]) - self.pos)
+
+    @record('MODULE.Move')
+    def Move(self, offset):
+        self.pos = self.pos + offset
+        for item in self.pads + self.drawings + [self.reference, self.value]:
+            item.Move(offset)
+
+    @record('MODULE.Rotate')
+    def Rotate(self, center, angle):
+        self.pos = _rotate(self.pos, center, angle)
+        for item in self.pads + self.drawings + [self.reference, self.value]:
+            item.Rotate(center, angle)
+
+    def GetFootprintRect(self):
+        rect = EDA_RECT(self.pos, wxSize())
+        for item in self.pads + self.drawings:
+            rect.Merge(item.GetBoundingBox())
+        return rect
+
+    def GetBoundingBox(self):
+        return self.GetFootprintRect()
+
+
+class ZONE_CONTAINER(BOARD_CONNECTED_ITEM):
+    def __init__(self, parent=None):
+        BOARD_CONNECTED_ITEM.__init__(self, parent)
+        self.outline = []
+        self.filled = []
+        self.is_filled = False
+        self.need_refill = False
+        self.clearance = FromMM(0.5)
+
+    def SetOutline(self, points):
+        self.outline = [wxPoint(p[0], p[1]) for p in points]
+
+    def GetFilledPolysList(self):
+        return list(self.filled)
+
+    def SetFilledPolysList(self, polys):
+        self.filled = list(polys)
+
+    def IsFilled(self):
+        return self.is_filled
+
+    def SetIsFilled(self, filled):
+        self.is_filled = filled
+
+    def SetNeedRefill(self, need):
+        self.need_refill = need
+
+    def GetZoneClearance(self):
+        return self.clearance
+
+    def _copy_children(self):
+        self.outline = list(self.outline)
+        self.filled = list(self.filled)
+
+    @record('ZONE_CONTAINER.Move')
+    def Move(self, offset):
+        self.outline = [p + offset for p in self.outline]
+        self.filled = [[p + offset for p in poly] for poly in self.filled]
+
+    def Rotate(self, center, angle):
+        self.outline = [_rotate(p, center, angle) for p in self.outline]
+        self.filled = [[_rotate(p, center, angle) for p in poly] for poly in self.filled]
+
+    def GetBoundingBox(self):
+        if not self.outline:
+            return EDA_RECT()
+        xs = [p.x for p in self.outline]
+        ys = [p.y for p in self.outline]
+        return EDA_RECT(wxPoint(min(xs), min(ys)), wxSize(max(xs) - min(xs), max(ys) - min(ys)))
+
+
+class ZONE_FILLER(object):
+    def __init__(self, board):
+        self.board = board
+
+    @record('ZONE_FILLER.Fill')
+    def Fill(self, zones):
+        calls['zones_filled'] += len(zones)
+        for zone in zones:
+            zone.SetIsFilled(True)
+            zone.SetNeedRefill(False)
+        return True
+
+
+class BOARD(object):
+    def __init__(self):
+        self.drawings = []
+        self.tracks = []
+        self.modules = []
+        self.zones = []
+        self.netinfo = NETINFO_LIST()
+        self.design_settings = BOARD_DESIGN_SETTINGS()
+        self.copper_layers = 2
+        self.file_name = ''
+
+    @property
+    def this(self):
+        # Stands in for the SWIG pointer, which identifies the underlying board
+        return id(self)
+
+    def IsEmpty(self):
+        return not (self.drawings or self.tracks or self.modules or self.zones)
+
+    def GetFileName(self):
+        return self.file_name
+
+    def GetCopperLayerCount(self):
+        return self.copper_layers
+
+    def SetCopperLayerCount(self, count):
+        self.copper_layers = count
+
+    @record('BOARD.GetDrawings')
+    def GetDrawings(self):
+        return list(self.drawings)
+
+    @record('BOARD.GetTracks')
+    def GetTracks(self):
+        return list(self.tracks)
+
+    @record('BOARD.GetModules')
+    def GetModules(self):
+        return list(self.modules)
+
+    def GetAreaCount(self):
+        return len(self.zones)
+
+    def GetArea(self, index):
+        return self.zones[index]
+
+    def Zones(self):
+        return list(self.zones)
+
+    def GetNetInfo(self):
+        return self.netinfo
+
+    def GetDesignSettings(self):
+        return self.design_settings
+
+    def GetNetCount(self):
+        return len(self.netinfo.nets)
+
+    def FindNet(self, name):
+        for net in self.netinfo.nets.values():
+            if net.name == name:
+                return net
+        return None
+
+    @record('BOARD.Add')
+    def Add(self, item):
+        if isinstance(item, NETINFO_ITEM):
+            if item.code < 0:
+                item.code = max(self.netinfo.nets) + 1
+            self.netinfo.nets[item.code] = item
+            return
+        item.parent = self
+        if isinstance(item, MODULE):
+            self.modules.append(item)
+        elif isinstance(item, TRACK):
+            self.tracks.append(item)
+        elif isinstance(item, ZONE_CONTAINER):
+            self.zones.append(item)
+        else:
+            self.drawings.append(item)
+
+    @record('BOARD.Delete')
+    def Delete(self, item):
+        self.Remove(item)
+
+    @record('BOARD.Remove')
+    def Remove(self, item):
+        if isinstance(item, NETINFO_ITEM):
+            if self.netinfo.nets.get(item.code) is item:
+                del self.netinfo.nets[item.code]
+            return
+        for items in (self.drawings, self.tracks, self.modules, self.zones):
+            for i, other in enumerate(items):
+                if other is item:
+                    del items[i]
+                    return
+
+    @record('BOARD.Move')
+    def Move(self, offset):
+        for items in (self.drawings, self.tracks, self.modules, self.zones):
+            for item in items:
+                item.Move(offset)
+
+    def GetBoardEdgesBoundingBox(self):
+        rect = None
+        for drawing in self.drawings:
+            if isinstance(drawing, DRAWSEGMENT) and drawing.GetLayer() == 44:
+                box = drawing.GetBoundingBox()
+                if rect is None:
+                    rect = box
+                else:
+                    rect.Merge(box)
+        return rect if rect is not None else EDA_RECT()
+
+    @record('BOARD.BuildListOfNets')
+    def BuildListOfNets(self):
+        pass
+
+    @record('BOARD.SynchronizeNetsAndNetClasses')
+    def SynchronizeNetsAndNetClasses(self):
+        # Every net is in the default class, unless it is a member of another class
+        netclasses = self.design_settings.GetNetClasses()
+        for net in self.netinfo.nets.values():
+            net.SetClass(netclasses.GetDefault())
+        for netclass in netclasses.classes.values():
+            for name in netclass:
+                net = self.FindNet(name)
+                if net is not None and net.GetClassName() == NETCLASS.Default:
+                    net.SetClass(netclass)
+
+    @record('BOARD.BuildConnectivity')
+    def BuildConnectivity(self):
+        # Connectivity cost grows with the number of connected items
+        calls['connectivity_items'] += len(self.tracks) + sum(len(m.pads) for m in self.modules) + len(self.zones)
+
+    @record('BOARD.Save')
+    def Save(self, file_name):
+        with open(file_name, 'w') as f:
+            f.write('(kicad_pcb (stand_in {} {} {} {}))\n'.format(
+                len(self.drawings), len(self.tracks), len(self.modules), len(self.zones)))
+        return True
+
+
+@record('LoadBoard')
+def LoadBoard(file_name):
+    if file_name not in boards:
+        raise IOError('Cannot open board {}'.format(file_name))
+    board = copy.deepcopy(boards[file_name])
+    board.file_name = file_name
+    return board
+
+
+def SaveBoard(file_name, board):
+    return board.Save(file_name)
+
+
+def GetBoard():
+    if _current_board[0] is None:
+        _current_board[0] = BOARD()
+    return _current_board[0]
+
+
+def SetBoard(board):
+    _current_board[0] = board
+
+
+def Refresh():
+    pass
+
+
+class ActionPlugin(object):
+    def register(self):
+        pass
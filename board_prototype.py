@@ -0,0 +1,139 @@
+from pcbnew import *
+from .constants import Layers, DrawSegmentShape
+from .source_board import SourceBoard
+from .geometry import ClassifyBoxes, ClipSegment, TRIM_KEEP, TRIM_CLIP
+
+SILKSCREEN_LAYERS = (Layers.F_SilkS, Layers.B_SilkS)
+# Outline shapes which are copied as their straight sides, so that tabs can break them open
+SPLIT_SHAPES = (DrawSegmentShape.Rect, DrawSegmentShape.Polygon)
+# Text fields of a footprint, which are hidden instead of removed
+FIELDS = ('Reference', 'Value')
+
+class BoardPrototype:
+    def __init__(self, board, box, trim_box=None, keep_outline=True):
+        self.board = board
+        # Bounding box of the board outline, every copy is placed relative to its origin
+        self.box = EDA_RECT(box.GetOrigin(), box.GetSize())
+
+        # All tracks and vias are copied as-is
+        self.tracks = list(board.GetTracks())
+
+        modules = list(board.GetModules())
+        drawings = list(board.GetDrawings())
+        if not keep_outline:
+            drawings = [drawing for drawing in drawings if not self.IsOuterOutline(drawing)]
+        drawings = [part for drawing in drawings for part in self.SplitOutline(drawing)]
+        trim = self.TrimSilkscreen(modules, drawings, trim_box) if trim_box is not None else {}
+
+        # Store each footprint with the silkscreen changes of its copies, as (index, clip) for the graphical
+        # items where the clip is None to remove the item or the new (start, end), and the hidden fields
+        self.modules = []
+        for m, module in enumerate(modules):
+            trimmed = [(i, trim[(m, i)]) for i in range(len(module.GraphicalItems())) if (m, i) in trim]
+            hidden = [name for name in FIELDS if (m, name) in trim]
+            self.modules.append((module, trimmed, hidden))
+
+        # Only keep the graphical items that are not trimmed, the clipped ones are replaced by a shorter copy
+        self.drawings = []
+        for i, drawing in enumerate(drawings):
+            clip = trim.get((None, i), False)
+            if clip is False:
+                self.drawings.append(drawing)
+            elif clip is not None:
+                clipped = drawing.Duplicate()
+                clipped.SetStart(wxPoint(clip[0], clip[1]))
+                clipped.SetEnd(wxPoint(clip[2], clip[3]))
+                self.drawings.append(clipped)
+
+        # All zones are copied as-is, with their fill when the source zone is filled
+        self.zones = [board.GetArea(i) for i in range(board.GetAreaCount())]
+        self.zone_fills = [zone.IsFilled() for zone in self.zones]
+
+        # Nets which need to be present on the panel
+        net_info = board.GetNetInfo()
+        self.nets = [net_info.GetNetItem(net) for net in net_info.NetsByNetcode()]
+        # Net class of every net, taken before the nets are added to a panel which assigns its own classes
+        self.net_classes = [net.GetNetClass() for net in self.nets]
+
+        # Net code of every track, pad and zone, so the nets of a copy can be replaced without looking them up
+        self.track_nets = [track.GetNetCode() for track in self.tracks]
+        self.pad_nets = [[pad.GetNetCode() for pad in module.Pads()] for module, _, _ in self.modules]
+        self.zone_nets = [zone.GetNetCode() for zone in self.zones]
+
+    def GetOffset(self, board_x, board_y):
+        # Determine the move offset needed to place the board at the requested position
+        return wxPoint(board_x, board_y) - self.box.GetOrigin()
+
+    def DuplicateModule(self, index):
+        # Duplicate of a footprint, with the silkscreen which was marked for trimming clipped or removed
+        module, trimmed, hidden = self.modules[index]
+        module_dup = BOARD_ITEM.Duplicate(module)
+        if trimmed:
+            graphical_items = list(module_dup.GraphicalItems())
+            for j, clip in trimmed:
+                if clip is None:
+                    graphical_items[j].DeleteStructure()
+                else:
+                    graphical_items[j].SetStart(wxPoint(clip[0], clip[1]))
+                    graphical_items[j].SetEnd(wxPoint(clip[2], clip[3]))
+                    graphical_items[j].SetLocalCoord()
+        for name in hidden:
+            getattr(module_dup, name)().SetVisible(False)
+        return module_dup
+
+    def SplitOutline(self, drawing):
+        # The drawing, or for a rectangle or polygon on the outline a line segment for each side
+        if (type(drawing) != DRAWSEGMENT or drawing.GetLayer() != Layers.Edge_Cuts or
+                drawing.GetShape() not in SPLIT_SHAPES):
+            return [drawing]
+        segments = []
+        for x0, y0, x1, y1 in SourceBoard.OutlineSegments(drawing):
+            segment = DRAWSEGMENT(self.board)
+            segment.SetShape(DrawSegmentShape.Segment)
+            segment.SetLayer(Layers.Edge_Cuts)
+            segment.SetWidth(drawing.GetWidth())
+            segment.SetStart(wxPoint(x0, y0))
+            segment.SetEnd(wxPoint(x1, y1))
+            segments.append(segment)
+        return segments
+
+    def IsOuterOutline(self, drawing):
+        # Whether the drawing is part of the board outline which follows the bounding box, the cutouts
+        # within the board are not
+        if type(drawing) != DRAWSEGMENT or drawing.GetLayer() != Layers.Edge_Cuts:
+            return False
+        left, top, right, bottom = self.box.GetLeft(), self.box.GetTop(), self.box.GetRight(), self.box.GetBottom()
+        on_line = lambda a, b, value: abs(a - value) <= 10 and abs(b - value) <= 10
+        return all(
+            on_line(y0, y1, top) or on_line(y0, y1, bottom) or on_line(x0, x1, left) or on_line(x0, x1, right)
+            for x0, y0, x1, y1 in SourceBoard.OutlineSegments(drawing)
+        )
+
+    def TrimSilkscreen(self, modules, drawings, trim_box):
+        # Silkscreen changes keyed by (footprint index or None, item index or field name), as None to
+        # remove the item or the clipped segment. The bounding boxes of all silkscreen items, including
+        # the footprint fields, are classified against the trim box at once.
+        items = [((None, i), drawing) for i, drawing in enumerate(drawings) if drawing.GetLayer() in SILKSCREEN_LAYERS]
+        for m, module in enumerate(modules):
+            items.extend(((m, i), drawing) for i, drawing in enumerate(module.GraphicalItems())
+                         if drawing.GetLayer() in SILKSCREEN_LAYERS)
+            for name in FIELDS:
+                field = getattr(module, name)()
+                if field.IsVisible() and field.GetLayer() in SILKSCREEN_LAYERS:
+                    items.append(((m, name), field))
+
+        boxes = [item.GetBoundingBox() for _, item in items]
+        left, top, right, bottom = trim_box.GetLeft(), trim_box.GetTop(), trim_box.GetRight(), trim_box.GetBottom()
+        classes = ClassifyBoxes([(b.GetLeft(), b.GetTop(), b.GetRight(), b.GetBottom()) for b in boxes], left, top, right, bottom)
+
+        trim = {}
+        for (key, item), cls in zip(items, classes):
+            if cls == TRIM_KEEP:
+                continue
+            trim[key] = None
+            # Straight lines which cross the edge are shortened, so they stay within the box with their width
+            if cls == TRIM_CLIP and isinstance(item, DRAWSEGMENT) and item.GetShape() == DrawSegmentShape.Segment:
+                half = item.GetWidth() // 2
+                start, end = item.GetStart(), item.GetEnd()
+                trim[key] = ClipSegment(start[0], start[1], end[0], end[1], left + half, top + half, right - half, bottom - half)
+        return trim
@@ -58,3 +58,6 @@ class DrawSegmentShape():
     Circle = 3
     Polygon = 4
     Curve = 5
+
+# Name of a net of a single copy, when every copy gets its own nets
+COPY_NET_NAME = 'Board_{index}-{name}'
@@ -0,0 +1,412 @@
+# Fabrication output of a panel as Gerber and Excellon files. Every design is plotted once, and every
+# layer of the panel repeats the plotted layer of the design with a step and repeat block, or for a
+# mixed panel with a block aperture which is flashed at every copy. The outline with the tab cuts,
+# the fiducials and the holes of the frame are written around the repeated boards.
+import os
+import re
+import shutil
+import tempfile
+from collections import OrderedDict
+from pcbnew import *
+from .constants import Layers
+from .panelize import Panel
+from .geometry import CutOutline
+from .board_prototype import SILKSCREEN_LAYERS
+from .pcb_writer import FormatMM
+
+# Layers which are repeated from the source boards, the inner copper layers are added as needed
+TECHNICAL_LAYERS = [Layers.F_Paste, Layers.B_Paste, Layers.F_SilkS, Layers.B_SilkS, Layers.F_Mask, Layers.B_Mask]
+# File name suffix of every layer, the same as used by KiCad
+LAYER_SUFFIXES = dict((value, name) for name, value in vars(Layers).items() if not name.startswith('_'))
+
+GERBER_STATEMENT = re.compile(r'%[^%]*%|[^%*\s][^%*]*\*')
+GERBER_FORMAT = re.compile(r'%FSLAX\d(\d)Y\d(\d)\*%')
+APERTURE_DEFINITION = re.compile(r'%ADD(\d+)([^,*]+)(.*)', re.S)
+APERTURE_MACRO = re.compile(r'%AM([^*]+)\*')
+APERTURE_SELECT = re.compile(r'(G54)?D(\d+)\*$')
+# Statements which draw or select an aperture, the first one starts the objects of the file
+OBJECT_STATEMENT = re.compile(r'(G54)?D(\d\d+)\*$|(G0[123])?[XYIJ][-+\d]|G36\*')
+
+EXCELLON_TOOL = re.compile(r'T(\d+)C([\d.]+)')
+EXCELLON_COORDINATE = re.compile(r'([XY])([-+]?[\d.]+)')
+
+class GerberLayer:
+    def __init__(self, text):
+        # Statements before the first object, aperture definitions and macros, and the objects
+        self.prelude = []
+        self.apertures = []
+        self.body = []
+        self.decimals = 6
+        for statement in GERBER_STATEMENT.findall(text):
+            statement = statement.strip()
+            if statement.startswith('%MO') and statement != '%MOMM*%':
+                raise ValueError('Only Gerber files in millimeters can be repeated')
+            match = GERBER_FORMAT.match(statement)
+            if match:
+                self.decimals = int(match.group(1))
+            if statement.startswith('%AD') or statement.startswith('%AM'):
+                self.apertures.append(statement)
+            elif statement == 'M02*':
+                break
+            elif self.body or OBJECT_STATEMENT.match(statement):
+                self.body.append(statement)
+            elif statement.startswith('%TA') or statement.startswith('%TD'):
+                self.apertures.append(statement)
+            else:
+                self.prelude.append(statement)
+
+    def Renumbered(self, first_code, suffix):
+        # The aperture definitions and objects with the apertures numbered from the first code, and the
+        # macros renamed with the suffix, so the apertures of several designs can be combined
+        macros = set(APERTURE_MACRO.match(s).group(1) for s in self.apertures if s.startswith('%AM'))
+        codes = {}
+        apertures = []
+        for statement in self.apertures:
+            match = APERTURE_DEFINITION.match(statement)
+            if match:
+                code, template, rest = match.groups()
+                codes[int(code)] = first_code + len(codes)
+                if template in macros:
+                    template += suffix
+                statement = '%ADD{}{}{}'.format(codes[int(code)], template, rest)
+            elif statement.startswith('%AM'):
+                statement = '%AM{}{}'.format(APERTURE_MACRO.match(statement).group(1) + suffix, statement[statement.index('*'):])
+            apertures.append(statement)
+
+        body = []
+        for statement in self.body:
+            match = APERTURE_SELECT.match(statement)
+            if match and int(match.group(2)) in codes:
+                statement = 'D{}*'.format(codes[int(match.group(2))])
+            body.append(statement)
+        return apertures, body, first_code + len(codes)
+
+class ExcellonFile:
+    def __init__(self, text):
+        # Drill commands of every tool diameter, in millimeters
+        self.tools = OrderedDict()
+        diameters = {}
+        tool = None
+        header = True
+        for line in text.splitlines():
+            line = line.strip()
+            if header:
+                match = EXCELLON_TOOL.match(line)
+                if match:
+                    diameters[match.group(1)] = match.group(2)
+                elif line == 'INCH' or line.startswith('INCH,'):
+                    raise ValueError('Only drill files in millimeters can be repeated')
+                header = line != '%'
+            elif line.startswith('T') and line[1:].isdigit():
+                tool = diameters.get(str(int(line[1:])))
+                if tool is not None:
+                    self.tools.setdefault(tool, [])
+            elif tool is not None and line and not line.startswith(';') and line not in ('M30', 'G90', 'G05'):
+                self.tools[tool].append(line)
+
+class FabOutput:
+    def __init__(self, settings, stats=None):
+        self.settings = settings
+        # Plan the panel the same way as when it is created in pcbnew, in an empty board
+        self.panel = Panel(settings, BOARD(), stats)
+        self.stats = self.panel.stats
+
+    def Write(self, directory, name='panel', source=None):
+        # Write the Gerber and drill files of the panel into the directory and return their paths. For a
+        # mixed panel the source is a list with a board for each design.
+        with self.stats.Phase('load'):
+            if source is None:
+                source = self.panel.LoadSources()
+        self.panel.sources = self.panel.Sources(source)
+        sources = [s.Rotated(self.settings.rotation * 10) for s in self.panel.sources]
+
+        with self.stats.Phase('layout'):
+            plan = self.panel.PlanPanel(sources)
+            # Every orientation of a design is plotted once, the copies refer to it by index
+            variants, self.copy_variants = plan.CopyVariants()
+            sources = [self.panel.OrientedSource(design, orientation) for design, orientation in variants]
+            outline_thickness = max(s.outline_thickness for s in sources)
+            outline = [[x0, y0, x1, y1, outline_thickness] for x0, y0, x1, y1 in plan.frame_segments]
+            # The copies of a scored panel are not cut out
+            cut_copies = list(zip(plan.copies, self.copy_variants)) if not plan.scores else []
+            for (board_x, board_y), variant in cut_copies:
+                source = sources[variant]
+                dx, dy = board_x - source.box.GetLeft(), board_y - source.box.GetTop()
+                outline.extend([x0 + dx, y0 + dy, x1 + dx, y1 + dy, source.outline_thickness]
+                               for x0, y0, x1, y1 in source.GetOutline())
+            outline, cut_tabs = CutOutline(plan, outline, outline_thickness)
+            self.stats.Count('outline_breaks', 2 * len(cut_tabs))
+            holes = [(x, y, self.settings.outline_hole) for x, y in plan.frame_holes]
+            holes.extend((x, y, plan.hole_size) for tab in cut_tabs for x, y in plan.TabHoles(tab))
+            self.stats.Count('holes', len(holes))
+
+        grid = self.GridSteps(plan)
+        self.origin = self.Origin(plan, grid)
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        plot_directory = tempfile.mkdtemp()
+        try:
+            with self.stats.Phase('plot'):
+                plotted = [self.PlotSource(s, os.path.join(plot_directory, str(i))) for i, s in enumerate(sources)]
+            copper_layers = max(s.board.GetCopperLayerCount() for s in sources)
+            layers = [Layers.F_Cu] + list(range(Layers.In1_Cu, Layers.In1_Cu + copper_layers - 2)) + [Layers.B_Cu]
+
+            files = []
+            with self.stats.Phase('gerber'):
+                for layer in layers + TECHNICAL_LAYERS:
+                    designs = [gerbers.get(layer) for gerbers, _ in plotted]
+                    file_name = os.path.join(directory, '{}-{}.gbr'.format(name, LAYER_SUFFIXES[layer]))
+                    if self.WriteLayer(file_name, designs, plan, grid, self.LayerFlashes(layer, plan, holes)):
+                        files.append(file_name)
+                file_name = os.path.join(directory, '{}-{}.gbr'.format(name, LAYER_SUFFIXES[Layers.Edge_Cuts]))
+                self.WriteProfile(file_name, outline)
+                files.append(file_name)
+                if plan.scores:
+                    file_name = os.path.join(directory, '{}-{}.gbr'.format(name, LAYER_SUFFIXES[self.settings.vscore_layer]))
+                    scores = [[x0, y0, x1, y1, outline_thickness] for x0, y0, x1, y1 in plan.scores]
+                    self.WriteProfile(file_name, scores, 'Vcut')
+                    files.append(file_name)
+            with self.stats.Phase('drill'):
+                for i, plating in enumerate(('PTH', 'NPTH')):
+                    file_name = os.path.join(directory, '{}-{}.drl'.format(name, plating))
+                    self.WriteDrill(file_name, [drills[i] for _, drills in plotted], plan, holes if plating == 'NPTH' else [])
+                    files.append(file_name)
+        finally:
+            shutil.rmtree(plot_directory, ignore_errors=True)
+        return files
+
+    def GridSteps(self, plan):
+        # The counts and distances (nx, ny, step_x, step_y) of the copies when they form a regular grid
+        # of a single design in a single orientation, or None
+        if any(self.copy_variants):
+            return None
+        xs = sorted(set(x for x, _ in plan.copies))
+        ys = sorted(set(y for _, y in plan.copies))
+        if len(xs) * len(ys) != len(plan.copies):
+            return None
+        step_x = xs[1] - xs[0] if len(xs) > 1 else 0
+        step_y = ys[1] - ys[0] if len(ys) > 1 else 0
+        if any(b - a != step_x for a, b in zip(xs, xs[1:])) or any(b - a != step_y for a, b in zip(ys, ys[1:])):
+            return None
+        return (len(xs), len(ys), step_x, step_y)
+
+    def Origin(self, plan, grid):
+        # Panel position of the Gerber origin. For a grid it is the top left corner of the bottom left
+        # copy, where the plotted board lies, as the step and repeat goes up and to the right.
+        if grid is not None:
+            return (min(x for x, _ in plan.copies), max(y for _, y in plan.copies))
+        return (0, plan.panel_height)
+
+    def PlotSource(self, source, directory):
+        # Plot the layers and the drill files of the source board with the origin at the top left corner
+        # of its outline, returns ({layer: GerberLayer}, (PTH, NPTH)) for the board
+        board = source.board
+        old_origin = board.GetAuxOrigin()
+        board.SetAuxOrigin(source.box.GetOrigin())
+        removed, added = self.TrimSilkscreen(source)
+        for item in removed:
+            board.Remove(item)
+        for item in added:
+            board.Add(item)
+        try:
+            controller = PLOT_CONTROLLER(board)
+            options = controller.GetPlotOptions()
+            options.SetOutputDirectory(directory)
+            options.SetPlotFrameRef(False)
+            options.SetUseAuxOrigin(True)
+            options.SetScale(1)
+            options.SetMirror(False)
+            options.SetUseGerberProtelExtensions(False)
+            options.SetUseGerberX2format(True)
+            options.SetIncludeGerberNetlistInfo(False)
+            options.SetCreateGerberJobFile(False)
+            options.SetGerberPrecision(6)
+            options.SetSubtractMaskFromSilk(False)
+            options.SetExcludeEdgeLayer(True)
+            options.SetDrillMarksType(PCB_PLOT_PARAMS.NO_DRILL_SHAPE)
+
+            gerbers = {}
+            for layer in range(Layers.F_Cu, Layers.Edge_Cuts):
+                if not board.IsLayerEnabled(layer) or (not IsCopperLayer(layer) and layer not in TECHNICAL_LAYERS):
+                    continue
+                controller.SetLayer(layer)
+                controller.OpenPlotfile(LAYER_SUFFIXES[layer], PLOT_FORMAT_GERBER, LAYER_SUFFIXES[layer])
+                controller.PlotLayer()
+                file_name = controller.GetPlotFileName()
+                controller.ClosePlot()
+                with open(file_name) as f:
+                    gerbers[layer] = GerberLayer(f.read())
+                self.stats.Count('plotted_layers')
+
+            # Plated and non plated holes in separate files, in millimeters with a decimal point
+            writer = EXCELLON_WRITER(board)
+            writer.SetOptions(False, False, board.GetAuxOrigin(), False)
+            writer.SetFormat(True)
+            writer.CreateDrillandMapFilesSet(directory, True, False)
+        finally:
+            for item in added:
+                board.Remove(item)
+            for item in removed:
+                board.Add(item)
+            board.SetAuxOrigin(old_origin)
+
+        drills = []
+        for plating in ('PTH', 'NPTH'):
+            file_names = [f for f in os.listdir(directory) if f.endswith('-{}.drl'.format(plating))]
+            if file_names:
+                with open(os.path.join(directory, file_names[0])) as f:
+                    drills.append(ExcellonFile(f.read()))
+            else:
+                drills.append(None)
+        return gerbers, tuple(drills)
+
+    def TrimSilkscreen(self, source):
+        # The silkscreen of the copies as it is trimmed in pcbnew, as the items to take off the source board
+        # and the items to put on it while plotting. Drawings are removed or replaced by their clipped copy,
+        # footprints with a trimmed silkscreen are replaced by their trimmed duplicate.
+        if not self.settings.trim_silkscreen:
+            return [], []
+        prototype = self.panel.GetPrototype(source)
+        drawings = [d for d in source.board.GetDrawings() if d.GetLayer() in SILKSCREEN_LAYERS]
+        # pcbnew creates a new wrapper on every access, so the items are compared by their KiCad object
+        kept = set(int(d.this) for d in prototype.drawings)
+        on_board = set(int(d.this) for d in drawings)
+        removed = [d for d in drawings if int(d.this) not in kept]
+        added = [d for d in prototype.drawings if d.GetLayer() in SILKSCREEN_LAYERS and int(d.this) not in on_board]
+        for i, (module, trimmed, hidden) in enumerate(prototype.modules):
+            if trimmed or hidden:
+                removed.append(module)
+                added.append(prototype.DuplicateModule(i))
+        return removed, added
+
+    def LayerFlashes(self, layer, plan, holes):
+        # Flashes (x, y, diameter) of the fiducials and the hole openings which the frame adds to a layer
+        flashes = []
+        for x, y, back in plan.fiducials:
+            if layer == (Layers.B_Cu if back else Layers.F_Cu):
+                flashes.append((x, y, self.settings.fiducial_copper))
+            elif layer == (Layers.B_Mask if back else Layers.F_Mask):
+                flashes.append((x, y, self.settings.fiducial_mask))
+        if layer in (Layers.F_Mask, Layers.B_Mask):
+            flashes.extend(holes)
+        return flashes
+
+    def Point(self, x, y, decimals=6):
+        # Gerber coordinates of a panel position, the y axis points up
+        scale = 10 ** decimals / 1e6
+        return 'X{}Y{}'.format(int(round((x - self.origin[0]) * scale)), int(round((self.origin[1] - y) * scale)))
+
+    def WriteLayer(self, file_name, designs, plan, grid, flashes):
+        # Write the layer if any design or the frame has something on it. The designs are the
+        # GerberLayer of every design and orientation, or None for a design without the layer.
+        if not flashes and not any(d is not None and d.body for d in designs):
+            return False
+        first = next((d for d in designs if d is not None), None)
+        prelude = first.prelude if first is not None else ['%FSLAX46Y46*%', '%MOMM*%', '%LPD*%', 'G01*']
+        decimals = first.decimals if first is not None else 6
+        if any(d is not None and d.decimals != decimals for d in designs):
+            raise ValueError('The designs were plotted with a different precision')
+
+        # Combine the apertures of all designs, followed by the round apertures of the frame
+        apertures = []
+        bodies = []
+        code = 10
+        for i, design in enumerate(designs):
+            if design is None:
+                bodies.append([])
+                continue
+            design_apertures, body, code = design.Renumbered(code, '_{}'.format(i) if i else '')
+            apertures.extend(design_apertures)
+            bodies.append(body)
+        frame_codes = OrderedDict()
+        for _, _, size in flashes:
+            if size not in frame_codes:
+                frame_codes[size] = code
+                apertures.append('%ADD{}C,{}*%'.format(code, FormatMM(size)))
+                code += 1
+
+        with open(file_name, 'w') as out:
+            for statement in prelude + apertures:
+                out.write(statement + '\n')
+            if grid is not None:
+                # A single design on a regular grid, the plotted board lies at the first copy
+                nx, ny, step_x, step_y = grid
+                if bodies[0]:
+                    out.write('%SRX{}Y{}I{}J{}*%\n'.format(nx, ny, FormatMM(step_x), FormatMM(step_y)))
+                    for statement in bodies[0]:
+                        out.write(statement + '\n')
+                    out.write('%SR*%\n')
+            else:
+                # Every design and orientation becomes a block aperture with its origin at the top left
+                # corner of the board
+                blocks = {}
+                for i, body in enumerate(bodies):
+                    if body:
+                        blocks[i] = code
+                        out.write('%ABD{}*%\n'.format(code))
+                        for statement in body:
+                            out.write(statement + '\n')
+                        out.write('%AB*%\n')
+                        code += 1
+                for design in sorted(blocks):
+                    out.write('D{}*\n'.format(blocks[design]))
+                    for (x, y), variant in zip(plan.copies, self.copy_variants):
+                        if variant == design:
+                            out.write('{}D03*\n'.format(self.Point(x, y, decimals)))
+                self.stats.Count('gerber_blocks', len(blocks))
+
+            out.write('%LPD*%\nG01*\n')
+            for size, aperture in frame_codes.items():
+                out.write('D{}*\n'.format(aperture))
+                for x, y, _ in [f for f in flashes if f[2] == size]:
+                    out.write('{}D03*\n'.format(self.Point(x, y, decimals)))
+            out.write('M02*\n')
+        return True
+
+    def WriteProfile(self, file_name, outline, function='Profile,NP'):
+        # The outline of all copies and the frame with the tab cuts, or the score lines, with one aperture
+        # per line width
+        widths = OrderedDict()
+        for segment in outline:
+            widths.setdefault(segment[4], []).append(segment)
+        with open(file_name, 'w') as out:
+            out.write('%TF.FileFunction,{}*%\n%FSLAX46Y46*%\n%MOMM*%\n%LPD*%\nG01*\n'.format(function))
+            for code, width in enumerate(widths, 10):
+                out.write('%ADD{}C,{}*%\n'.format(code, FormatMM(width)))
+            for code, width in enumerate(widths, 10):
+                out.write('D{}*\n'.format(code))
+                for x0, y0, x1, y1, _ in widths[width]:
+                    out.write('{}D02*\n{}D01*\n'.format(self.Point(x0, y0), self.Point(x1, y1)))
+            out.write('M02*\n')
+
+    def WriteDrill(self, file_name, designs, plan, holes):
+        # The drills of every copy and the holes of the frame and tabs. Excellon repeat patterns are
+        # not supported by all fabs, so the drills of every copy are written out.
+        tools = OrderedDict()
+        for design, drills in enumerate(designs):
+            if drills is None:
+                continue
+            for diameter, commands in drills.tools.items():
+                tools.setdefault(float(diameter), [])
+                for (x, y), variant in zip(plan.copies, self.copy_variants):
+                    if variant != design:
+                        continue
+                    dx = (x - self.origin[0]) / 1e6
+                    dy = (self.origin[1] - y) / 1e6
+                    move = lambda m: '{}{}'.format(m.group(1), FormatMM((float(m.group(2)) + (dx if m.group(1) == 'X' else dy)) * 1e6))
+                    tools[float(diameter)].extend(EXCELLON_COORDINATE.sub(move, c) for c in commands)
+        for x, y, size in holes:
+            tools.setdefault(size / 1e6, []).append('X{}Y{}'.format(FormatMM(x - self.origin[0]), FormatMM(self.origin[1] - y)))
+        self.stats.Count('drill_tools', len(tools))
+
+        with open(file_name, 'w') as out:
+            out.write('M48\n; DRILL file of a panel\n; FORMAT={-:-/ absolute / metric / decimal}\nFMAT,2\nMETRIC\n')
+            for number, diameter in enumerate(tools, 1):
+                out.write('T{}C{}\n'.format(number, FormatMM(diameter * 1e6)))
+            out.write('%\nG90\nG05\n')
+            for number, commands in enumerate(tools.values(), 1):
+                out.write('T{}\n'.format(number))
+                for command in commands:
+                    out.write(command + '\n')
+            out.write('T0\nM30\n')
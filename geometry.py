@@ -0,0 +1,760 @@
+# Panel layout computations on integer nanometre coordinates. This module does not
+# depend on pcbnew, the Panel turns the resulting plan into board items.
+import math
+from collections import OrderedDict
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MM = 1000000
+
+# Tab directions, the direction in which the outline is broken open
+TAB_HORIZONTAL_CUT = 0
+TAB_VERTICAL_CUT = 1
+
+# Ways of placing the tabs along the board edges, the values of PanelSettings.tab_mode
+TABS_SPACE_EVENLY = 0
+TABS_SPACE_AROUND = 1
+TABS_SPACE_AUTO = 2
+TABS_OPTIMIZE = 3
+
+# Which copies are turned by 180 degrees, the values of PanelSettings.alternate
+ALTERNATE_NONE = 0
+ALTERNATE_COLUMNS = 1
+ALTERNATE_ROWS = 2
+
+# Classes of items against a trim box
+TRIM_KEEP = 0
+TRIM_REMOVE = 1
+TRIM_CLIP = 2
+
+# Distance within which an outline segment counts as hit by a tab
+HIT_ACCURACY = 10
+
+# Diameter of the mouse bite holes, 0.5 mm
+MOUSEBITE_HOLE = 500000
+
+def FromMM(mm):
+    return int(round(mm * MM))
+
+class GridIndex:
+    def __init__(self, cell_size):
+        # Size of a single square cell of the grid
+        self.cell_size = max(int(cell_size), 1)
+        # Items in each of the cells, keyed by the cell coordinate
+        self.cells = {}
+        # Bounding box and insertion order of each item, keyed by the item id
+        self.items = {}
+        self.sequence = 0
+
+    def CellRange(self, left, top, right, bottom):
+        # Determine the cells which overlap the given box
+        c = self.cell_size
+        for cy in range(int(top) // c, int(bottom) // c + 1):
+            for cx in range(int(left) // c, int(right) // c + 1):
+                yield (cx, cy)
+
+    def Insert(self, item, left, top, right, bottom):
+        key = id(item)
+        self.items[key] = (item, self.sequence, (left, top, right, bottom))
+        self.sequence += 1
+        # Put the item in every cell it overlaps
+        for cell in self.CellRange(left, top, right, bottom):
+            self.cells.setdefault(cell, set()).add(key)
+
+    def Remove(self, item):
+        key = id(item)
+        entry = self.items.pop(key, None)
+        if entry is None:
+            return
+        # Remove the item from every cell it was in
+        for cell in self.CellRange(*entry[2]):
+            keys = self.cells.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.cells[cell]
+
+    def Query(self, left, top, right, bottom):
+        # Collect all items in the overlapping cells
+        keys = set()
+        for cell in self.CellRange(left, top, right, bottom):
+            keys.update(self.cells.get(cell, ()))
+
+        results = []
+        for key in keys:
+            item, sequence, box = self.items[key]
+            # Only keep the items for which the bounding box actually overlaps
+            if box[0] <= right and box[2] >= left and box[1] <= bottom and box[3] >= top:
+                results.append((sequence, item))
+        # Return the items in the order in which they were inserted
+        results.sort(key=lambda r: r[0])
+        return [item for _, item in results]
+
+    def __len__(self):
+        return len(self.items)
+
+def PanelLength(outline_width, spacing_width, board_length, count):
+    # Length of a panel side holding the given number of boards, including the frame
+    return 2 * outline_width + spacing_width + (spacing_width + board_length) * count
+
+class LayoutPlan:
+    def __init__(self, settings, panel_width, panel_height):
+        self.spacing_width = settings.spacing_width
+        self.tab_width = settings.tab_width
+        self.outline_width = settings.outline_width
+
+        # Size of the complete panel
+        self.panel_width = panel_width
+        self.panel_height = panel_height
+
+        # Origin of every board copy
+        self.copies = []
+        # Design of every board copy, as an index into the list of source boards
+        self.copy_designs = []
+        # Turn of every board copy in degrees, 0 or 180, on top of the rotation of the panel
+        self.copy_orientations = []
+        # Line segments of the frame, as (x0, y0, x1, y1)
+        self.frame_segments = []
+        # Mounting holes in the frame, as (x, y)
+        self.frame_holes = []
+        # Fiducials in the frame, as (x, y, back)
+        self.fiducials = []
+        # Tabs between the boards, as (direction, x, y)
+        self.tabs = []
+        # Full length V-score lines along the board edges, as (x0, y0, x1, y1)
+        self.scores = []
+        # Offsets of the mouse bite holes relative to the tab position, for each direction
+        self.hole_pattern = {TAB_HORIZONTAL_CUT: [], TAB_VERTICAL_CUT: []}
+        self.hole_size = 0
+
+    def TabCuts(self, tab):
+        # Rectangles (x, y, w, h) where the outline has to be opened on both sides of the tab
+        direction, x, y = tab
+        half = self.tab_width // 2
+        if direction == TAB_HORIZONTAL_CUT:
+            return [(x - half, y + offset, self.tab_width, 0) for offset in (0, self.spacing_width)]
+        return [(x + offset, y - half, 0, self.tab_width) for offset in (0, self.spacing_width)]
+
+    def TabLines(self, tab):
+        # Outline segments which connect both sides of the tab
+        direction, x, y = tab
+        half = self.tab_width // 2
+        if direction == TAB_HORIZONTAL_CUT:
+            return [(lx, y, lx, y + self.spacing_width) for lx in (x - half, x - half + self.tab_width)]
+        return [(x, ly, x + self.spacing_width, ly) for ly in (y - half, y - half + self.tab_width)]
+
+    def TabHoles(self, tab):
+        direction, x, y = tab
+        return [(x + dx, y + dy) for dx, dy in self.hole_pattern[direction]]
+
+    def TabRows(self):
+        # Tabs in rows of the same direction and height, in the order in which they were planned
+        rows = OrderedDict()
+        for tab in self.tabs:
+            rows.setdefault((tab[0], tab[2]), []).append(tab)
+        return list(rows.values())
+
+    def HoleCenters(self):
+        # Centers of the mouse bite holes of all tabs
+        return [hole for tab in self.tabs for hole in self.TabHoles(tab)]
+
+    def CopyVariants(self):
+        # The distinct (design, orientation) pairs of the copies in order of appearance, and for every
+        # copy the index of its pair
+        variants = []
+        indices = []
+        for variant in zip(self.copy_designs, self.copy_orientations):
+            if variant not in variants:
+                variants.append(variant)
+            indices.append(variants.index(variant))
+        return variants, indices
+
+def MouseBitePattern(direction, tab_width, spacing_width, pitch=FromMM(1), inset=FromMM(0.1)):
+    # Rows of holes slightly inset from both boards, centered on the tab
+    count = int(tab_width // (2 * pitch))
+    along = [0]
+    for i in range(1, count + 1):
+        along.extend([-i * pitch, i * pitch])
+    pattern = []
+    for across in (inset, spacing_width - inset):
+        if direction == TAB_HORIZONTAL_CUT:
+            pattern.extend((a, across) for a in along)
+        else:
+            pattern.extend((across, a) for a in along)
+    return pattern
+
+def PlanLayout(settings, board_w, board_h, tab_ver_offsets, tab_hor_offsets):
+    plan = LayoutPlan(
+        settings,
+        PanelLength(settings.outline_width, settings.spacing_width, board_w, settings.boards_x),
+        PanelLength(settings.outline_width, settings.spacing_width, board_h, settings.boards_y)
+    )
+
+    # Position of each column and row of boards, including one past the last board
+    start = settings.outline_width + settings.spacing_width
+    columns = [start + (settings.spacing_width + board_w) * x for x in range(settings.boards_x + 1)]
+    rows = [start + (settings.spacing_width + board_h) * y for y in range(settings.boards_y + 1)]
+    plan.copies = [(x, y) for y in rows[:-1] for x in columns[:-1]]
+    plan.copy_designs = [0 for _ in plan.copies]
+    plan.copy_orientations = CopyOrientations(settings)
+
+    PlanFrame(plan, settings)
+    if settings.vscore:
+        PlanScores(plan, columns[:-1], rows[:-1], board_w, board_h)
+        PlanHoles(plan, settings)
+        return plan
+
+    # Tabs above each board and to the left of each board, including the last row and column
+    spacing = settings.spacing_width
+    last_x = len(columns) - 1
+    last_y = len(rows) - 1
+    for y, board_y in enumerate(rows):
+        for x, board_x in enumerate(columns):
+            if x != last_x:
+                plan.tabs.extend((TAB_HORIZONTAL_CUT, board_x + int(o), board_y - spacing) for o in tab_ver_offsets)
+            if y != last_y:
+                plan.tabs.extend((TAB_VERTICAL_CUT, board_x - spacing, board_y + int(o)) for o in tab_hor_offsets)
+
+    PlanHoles(plan, settings)
+    return plan
+
+def CopyOrientations(settings):
+    # Turn of every copy of a grid in row order, every other column or row is turned by 180 degrees
+    # so that parts which overhang an edge do not face each other
+    if settings.alternate == ALTERNATE_COLUMNS:
+        return [180 * (x % 2) for y in range(settings.boards_y) for x in range(settings.boards_x)]
+    if settings.alternate == ALTERNATE_ROWS:
+        return [180 * (y % 2) for y in range(settings.boards_y) for x in range(settings.boards_x)]
+    return [0] * (settings.boards_x * settings.boards_y)
+
+def PlanFrame(plan, settings):
+    w, h = plan.panel_width, plan.panel_height
+    ow = settings.outline_width
+
+    # Outer and inner outline of the frame, a scored panel stays in one piece up to the outer outline
+    rectangles = [(0, 0, w, h)] if settings.vscore else [(0, 0, w, h), (ow, ow, w - 2*ow, h - 2*ow)]
+    for x, y, sw, sh in rectangles:
+        plan.frame_segments.extend([
+            (x, y, x + sw, y),
+            (x + sw, y, x + sw, y + sh),
+            (x, y + sh, x + sw, y + sh),
+            (x, y, x, y + sh),
+        ])
+
+    # Half the outline width and 1.5 outline width
+    outline_1w2 = ow // 2
+    outline_3w2 = ow * 3 // 2
+
+    # Holes in three corners of the frame
+    plan.frame_holes = [
+        (outline_1w2, outline_1w2),
+        (w - outline_1w2, outline_1w2),
+        (outline_1w2, h - outline_1w2),
+    ]
+    # Fiducials on the front and the back
+    plan.fiducials = [
+        (outline_3w2, outline_1w2, False),
+        (w - outline_1w2, outline_3w2, False),
+        (outline_1w2, h - outline_3w2, False),
+        (outline_1w2, outline_3w2, True),
+        (w - outline_3w2, outline_1w2, True),
+        (outline_3w2, h - outline_1w2, True),
+    ]
+
+def PlanScores(plan, columns, rows, board_w, board_h):
+    # A score line across the whole panel at both edges of every column and row of boards, boards
+    # without spacing share a single line
+    xs = sorted(set(columns) | set(x + board_w for x in columns))
+    ys = sorted(set(rows) | set(y + board_h for y in rows))
+    plan.scores = [(x, 0, x, plan.panel_height) for x in xs] + [(0, y, plan.panel_width, y) for y in ys]
+
+def PlanHoles(plan, settings):
+    # The hole pattern is the same for every tab in the same direction
+    plan.hole_size = MOUSEBITE_HOLE
+    for direction in plan.hole_pattern:
+        plan.hole_pattern[direction] = MouseBitePattern(
+            direction, settings.tab_width, settings.spacing_width,
+            settings.mousebite_pitch, settings.mousebite_inset
+        )
+
+def PlanMixedLayout(settings, sizes, edge_ranges, positions, designs, pack_width, pack_height):
+    # Layout of differently sized boards, placed at the packed positions. The sizes and edge ranges
+    # are given per design, the positions and designs per board copy.
+    ow = settings.outline_width
+    spacing = settings.spacing_width
+    plan = LayoutPlan(settings, 2 * ow + spacing + pack_width, 2 * ow + spacing + pack_height)
+    start = ow + spacing
+    plan.copies = [(start + x, start + y) for x, y in positions]
+    plan.copy_designs = list(designs)
+    plan.copy_orientations = [0 for _ in plan.copies]
+
+    PlanFrame(plan, settings)
+
+    # Boards and the frame sides as (left, top, right, bottom, vertical tab ranges, horizontal tab ranges),
+    # with the tab ranges in panel coordinates
+    inner_right = plan.panel_width - ow
+    inner_bottom = plan.panel_height - ow
+    frame_ver = [(ow, inner_right)]
+    frame_hor = [(ow, inner_bottom)]
+    boxes = [
+        (ow, ow - 1, inner_right, ow, frame_ver, frame_hor),
+        (ow, inner_bottom, inner_right, inner_bottom + 1, frame_ver, frame_hor),
+        (ow - 1, ow, ow, inner_bottom, frame_ver, frame_hor),
+        (inner_right, ow, inner_right + 1, inner_bottom, frame_ver, frame_hor),
+    ]
+    for (x, y), design in zip(plan.copies, plan.copy_designs):
+        w, h = sizes[design]
+        ver, hor = edge_ranges[design]
+        boxes.append((x, y, x + w, y + h, [(x + a, x + b) for a, b in ver], [(y + a, y + b) for a, b in hor]))
+
+    # Find the pairs of boxes which face each other across exactly the spacing
+    by_bottom = {}
+    by_right = {}
+    for box in boxes:
+        by_bottom.setdefault(box[3] + spacing, []).append(box)
+        by_right.setdefault(box[2] + spacing, []).append(box)
+    for lower in boxes[4:] + boxes[1:2]:
+        for upper in by_bottom.get(lower[1], []):
+            plan.tabs.extend((TAB_HORIZONTAL_CUT, x, lower[1] - spacing) for x in PlaceSharedTabs(
+                upper[0], upper[2], lower[0], lower[2], upper[4], lower[4], settings.tabs_x, settings.tab_width))
+    for right in boxes[4:] + boxes[3:4]:
+        for left in by_right.get(right[0], []):
+            plan.tabs.extend((TAB_VERTICAL_CUT, right[0] - spacing, y) for y in PlaceSharedTabs(
+                left[1], left[3], right[1], right[3], left[5], right[5], settings.tabs_y, settings.tab_width))
+
+    PlanHoles(plan, settings)
+    return plan
+
+def PlaceSharedTabs(low_a, high_a, low_b, high_b, ranges_a, ranges_b, count, tab_width):
+    # Positions of the tabs along the part of two edges which face each other
+    low, high = max(low_a, low_b), min(high_a, high_b)
+    if high - low <= tab_width:
+        return []
+    ranges = IntersectRanges(IntersectRanges(MergeRanges(ranges_a), MergeRanges(ranges_b)), [(low, high)])
+    ranges = [r for r in ranges if r[1] - r[0] > tab_width]
+    if not ranges:
+        return []
+    # Use as many tabs as on a full edge of the shorter board, for the part of the edge which is shared
+    edge = min(high_a - low_a, high_b - low_b)
+    count = max(1, int(round(float(count) * (high - low) / edge)))
+
+    return DistributeTabs(ranges, count, tab_width)
+
+def PackRectangles(sizes, width):
+    # Place the rectangles (w, h) in a strip of the given width, using the MaxRects algorithm with the
+    # bottom left rule. Returns the position (x, y) of every rectangle, or None when it is wider than the strip.
+    height = sum(h for w, h in sizes) + 1
+    free = [(0, 0, width, height)]
+    positions = [None for _ in sizes]
+    # Place the tallest rectangles first
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    # Smallest width and height of the rectangles which are still to be placed after each one
+    min_w = [0] * len(order)
+    min_h = [0] * len(order)
+    for k in range(len(order) - 2, -1, -1):
+        w, h = sizes[order[k + 1]]
+        min_w[k] = min(w, min_w[k + 1]) if k + 2 < len(order) else w
+        min_h[k] = min(h, min_h[k + 1]) if k + 2 < len(order) else h
+    for k, i in enumerate(order):
+        w, h = sizes[i]
+        # Find the free rectangle where the rectangle ends up highest, then most to the left
+        best = None
+        for fx, fy, fw, fh in free:
+            if w <= fw and h <= fh and (best is None or (fy + h, fx) < best):
+                best = (fy + h, fx)
+        if best is None:
+            continue
+        x, y = best[1], best[0] - h
+        positions[i] = (x, y)
+
+        # Split every free rectangle which overlaps the placed rectangle into the parts around it
+        kept = []
+        split = []
+        for fx, fy, fw, fh in free:
+            if x >= fx + fw or x + w <= fx or y >= fy + fh or y + h <= fy:
+                kept.append((fx, fy, fw, fh))
+                continue
+            if x > fx:
+                split.append((fx, fy, x - fx, fh))
+            if x + w < fx + fw:
+                split.append((x + w, fy, fx + fw - x - w, fh))
+            if y > fy:
+                split.append((fx, fy, fw, y - fy))
+            if y + h < fy + fh:
+                split.append((fx, y + h, fw, fy + fh - y - h))
+
+        # Remove the parts which are contained in another free rectangle. The kept free rectangles were
+        # not contained in the rectangles which were split, so they cannot be contained in their parts,
+        # and only the parts need to be checked.
+        split.sort(key=lambda r: -r[2] * r[3])
+        # Free rectangles which none of the remaining rectangles fits in are dropped as well
+        free = [r for r in kept if r[2] >= min_w[k] and r[3] >= min_h[k]]
+        for r in split:
+            if r[2] < min_w[k] or r[3] < min_h[k]:
+                continue
+            right, bottom = r[0] + r[2], r[1] + r[3]
+            contained = False
+            for o in free:
+                if r[0] >= o[0] and r[1] >= o[1] and right <= o[0] + o[2] and bottom <= o[1] + o[3]:
+                    contained = True
+                    break
+            if not contained:
+                free.append(r)
+    return positions
+
+def PackPanel(sizes, spacing, width=0):
+    # Pack the boards with the spacing between them, returning (positions, used width, used height).
+    # Without a width, a few widths around a square panel are tried and the smallest panel is kept.
+    padded = [(w + spacing, h + spacing) for w, h in sizes]
+    if width:
+        widths = [width + spacing]
+    else:
+        widest = max(w for w, h in padded)
+        side = math.sqrt(sum(w * h for w, h in padded))
+        widths = sorted(set(max(widest, int(side * f)) for f in (1.0, 1.15, 1.3, 1.5, 2.0)))
+
+    best = None
+    for strip in widths:
+        positions = PackRectangles(padded, strip)
+        if None in positions:
+            continue
+        used_w = max(x + w for (x, y), (w, h) in zip(positions, padded))
+        used_h = max(y + h for (x, y), (w, h) in zip(positions, padded))
+        # Prefer the smallest and then the most square panel
+        score = (used_w * used_h, abs(used_w - used_h))
+        if best is None or score < best[0]:
+            best = (score, positions, used_w, used_h)
+    if best is None:
+        return None
+    return best[1:]
+
+def SpaceItemsAround(low, high, count):
+    # Space the items with equal space around each item
+    return [low + (high - low) * (t*2+1) // (count * 2) for t in range(count)]
+
+def SpaceItemsEvenly(low, high, count):
+    # Space the items with equal distance between them
+    return [low + (high - low) * (t+1) // (count + 1) for t in range(count)]
+
+def ArcPoints(cx, cy, sx, sy, angle, max_error=FromMM(0.01)):
+    # Points along an arc around (cx, cy) starting at (sx, sy), with the angle in tenths of a degree
+    radius = math.hypot(sx - cx, sy - cy)
+    total = math.radians(angle / 10.0)
+    if radius <= max_error:
+        steps = 1
+    else:
+        # Use enough chords to stay within the maximum error from the real arc
+        step_angle = 2 * math.acos(1 - float(max_error) / radius)
+        steps = min(max(int(math.ceil(abs(total) / step_angle)), 1), 360)
+    points = []
+    for i in range(steps + 1):
+        a = total * i / steps
+        dx, dy = sx - cx, sy - cy
+        points.append((
+            int(round(cx + dx * math.cos(a) - dy * math.sin(a))),
+            int(round(cy + dx * math.sin(a) + dy * math.cos(a))),
+        ))
+    return points
+
+def BezierPoints(p0, p1, p2, p3, steps=16):
+    # Points along a cubic bezier curve
+    points = []
+    for i in range(steps + 1):
+        t = float(i) / steps
+        u = 1 - t
+        points.append(tuple(
+            int(round(u*u*u*p0[k] + 3*u*u*t*p1[k] + 3*u*t*t*p2[k] + t*t*t*p3[k]))
+            for k in (0, 1)
+        ))
+    return points
+
+def PolylineSegments(points, closed=False):
+    # Line segments (x0, y0, x1, y1) connecting the points
+    segments = [points[i] + points[i+1] for i in range(len(points) - 1)]
+    if closed and len(points) > 2:
+        segments.append(points[-1] + points[0])
+    return segments
+
+def MergeRanges(ranges):
+    # Combine overlapping and touching ranges into the smallest set of ranges
+    merged = []
+    for low, high in sorted(ranges):
+        if merged and low <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+def IntersectRanges(a, b):
+    # Sweep both sorted lists of disjoint ranges and return the parts present in both
+    results = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        low = max(a[i][0], b[j][0])
+        high = min(a[i][1], b[j][1])
+        if low < high:
+            results.append((low, high))
+        # Advance the range which ends first
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return results
+
+def FindEdgeRanges(segments, left, top, right, bottom, tolerance=10):
+    # Collect the parts of the outline which lie on each side of the bounding box
+    sides = {'top': [], 'bottom': [], 'left': [], 'right': []}
+    for x0, y0, x1, y1 in segments:
+        if abs(y0 - top) <= tolerance and abs(y1 - top) <= tolerance:
+            sides['top'].append((min(x0, x1) - left, max(x0, x1) - left))
+        elif abs(y0 - bottom) <= tolerance and abs(y1 - bottom) <= tolerance:
+            sides['bottom'].append((min(x0, x1) - left, max(x0, x1) - left))
+        elif abs(x0 - left) <= tolerance and abs(x1 - left) <= tolerance:
+            sides['left'].append((min(y0, y1) - top, max(y0, y1) - top))
+        elif abs(x0 - right) <= tolerance and abs(x1 - right) <= tolerance:
+            sides['right'].append((min(y0, y1) - top, max(y0, y1) - top))
+
+    # Tabs can be placed where the opposite sides of the board both follow the bounding box
+    overlap_ver = IntersectRanges(MergeRanges(sides['top']), MergeRanges(sides['bottom']))
+    overlap_hor = IntersectRanges(MergeRanges(sides['left']), MergeRanges(sides['right']))
+    return (overlap_ver, overlap_hor)
+
+def FollowsBoundingBox(edge_ranges, board_w, board_h, tolerance=10):
+    # Whether the outline follows the whole bounding box on every side, as needed for V-scores
+    full = lambda ranges, length: len(ranges) == 1 and ranges[0][0] <= tolerance and ranges[0][1] >= length - tolerance
+    return full(edge_ranges[0], board_w) and full(edge_ranges[1], board_h)
+
+def ScoreDistributeTabs(ranges, count, tab_width):
+    # Set the initial scores to the width of the range
+    score_orig = [b - a for a, b in ranges]
+    score = score_orig[:]
+    # Set the number of tabs for each range to zero
+    tabs = [0 for _ in ranges]
+    if not ranges:
+        return tabs
+
+    # Distribute the tabs
+    for _ in range(count):
+        # Find the range with the highest score
+        hs, hs_idx = 0, 0
+        for i, s in enumerate(score):
+            if s > hs:
+                hs, hs_idx = s, i
+        # Assign a tab to the range
+        tabs[hs_idx] += 1
+        # Update the score of the range based on the number of tabs
+        score[hs_idx] = (score_orig[hs_idx] - tabs[hs_idx] * tab_width) / (tabs[hs_idx] + 1)
+
+    # Return the number of tabs for each range
+    return tabs
+
+def OptimizeTabs(ranges, count, length, tab_width, clearance, required, step=FromMM(0.5), clearance_weight=10):
+    # Choose tab positions within the ranges which stay close to an even spacing over the whole
+    # edge, while avoiding positions with less than the required clearance
+    candidates = []
+    for low, high in ranges:
+        low += tab_width // 2
+        high -= tab_width // 2
+        if high < low:
+            continue
+        steps = max((high - low) // step, 1)
+        for i in range(steps + 1):
+            candidates.append(low + (high - low) * i // steps)
+    candidates = sorted(set(candidates))
+    # Cost of each candidate for not having enough room around the tab
+    penalty = [clearance_weight * max(required - clearance(p), 0) for p in candidates]
+
+    # Use fewer tabs when not all of them fit without overlapping
+    for count in range(count, 0, -1):
+        targets = SpaceItemsAround(0, length, count)
+        # cost[i] is the lowest cost of placing the tabs up to the current one with the current tab at candidate i
+        cost = [abs(p - targets[0]) + penalty[i] for i, p in enumerate(candidates)]
+        choice = []
+        for target in targets[1:]:
+            # Sweep the candidates while keeping the best earlier candidate at least a tab width away
+            new_cost = [None] * len(candidates)
+            previous = [None] * len(candidates)
+            best = None
+            j = 0
+            for i, p in enumerate(candidates):
+                while j < i and candidates[j] <= p - tab_width:
+                    if cost[j] is not None and (best is None or cost[j] < cost[best]):
+                        best = j
+                    j += 1
+                if best is not None:
+                    new_cost[i] = cost[best] + abs(p - target) + penalty[i]
+                    previous[i] = best
+            cost = new_cost
+            choice.append(previous)
+
+        valid = [i for i, c in enumerate(cost) if c is not None]
+        if not valid:
+            continue
+        # Walk back from the cheapest position of the last tab
+        i = min(valid, key=lambda i: cost[i])
+        positions = [candidates[i]]
+        for previous in reversed(choice):
+            i = previous[i]
+            positions.append(candidates[i])
+        return positions[::-1]
+    return []
+
+def ShiftTabs(offsets, ranges, tab_width, clearance, required, step=FromMM(0.5)):
+    # Move every tab with less than the required clearance to the closest position within the ranges
+    # which has enough room, without overlapping the other tabs. Returns the new offsets and the tabs
+    # which could not be moved as (offset, clearance).
+    half = tab_width // 2
+    offsets = list(offsets)
+    crowded = []
+    for i, offset in enumerate(offsets):
+        current = clearance(offset)
+        if current >= required:
+            continue
+        others = offsets[:i] + offsets[i + 1:]
+        fits = lambda p: (any(low <= p - half and p + half <= high for low, high in ranges)
+                          and all(abs(p - o) >= tab_width for o in others))
+        # Look further away from the planned position one step at a time, on both sides
+        limit = max(high for low, high in ranges) if ranges else 0
+        moved = False
+        distance = step
+        while not moved and distance <= limit:
+            for p in (offset - distance, offset + distance):
+                if fits(p) and clearance(p) >= required:
+                    offsets[i] = p
+                    moved = True
+                    break
+            distance += step
+        if not moved:
+            crowded.append((offset, current))
+    return offsets, crowded
+
+def DistributeTabs(ranges, count, tab_width):
+    # Positions of the tabs, divided over the ranges by their score and spaced around within each range
+    positions = []
+    for i, n in enumerate(ScoreDistributeTabs(ranges, count, tab_width)):
+        if n > 0:
+            positions.extend(SpaceItemsAround(ranges[i][0], ranges[i][1], n))
+    return positions
+
+def TabOffsets(settings, board_w, board_h, edge_ranges=None, clearance_ver=None, clearance_hor=None):
+    # Offsets of the tabs along the top and bottom edges and along the left and right edges of a board.
+    # The edge ranges are needed for the auto and optimize modes, without clearance functions the
+    # optimize mode assumes there is nothing near the edges.
+    if settings.tab_mode == TABS_SPACE_EVENLY:
+        # Space the tabs evenly over the sides of the board
+        return (SpaceItemsEvenly(0, board_w, settings.tabs_x), SpaceItemsEvenly(0, board_h, settings.tabs_y))
+    elif settings.tab_mode == TABS_SPACE_AROUND:
+        # Space the tabs with equal space around them
+        return (SpaceItemsAround(0, board_w, settings.tabs_x), SpaceItemsAround(0, board_h, settings.tabs_y))
+
+    overlap_ver, overlap_hor = edge_ranges
+    if settings.tab_mode == TABS_SPACE_AUTO:
+        # Distribute the tabs based on the ranges of the board edges which follow the bounding box
+        return (
+            DistributeTabs(overlap_ver, settings.tabs_x, settings.tab_width),
+            DistributeTabs(overlap_hor, settings.tabs_y, settings.tab_width),
+        )
+    elif settings.tab_mode == TABS_OPTIMIZE:
+        # Place the tabs in the ranges, away from the parts near the edges
+        required = settings.tab_clearance
+        no_parts = lambda p: required
+        return (
+            OptimizeTabs(overlap_ver, settings.tabs_x, board_w, settings.tab_width, clearance_ver or no_parts, required),
+            OptimizeTabs(overlap_hor, settings.tabs_y, board_h, settings.tab_width, clearance_hor or no_parts, required),
+        )
+    return ([], [])
+
+def SegmentHitsRect(x0, y0, x1, y1, left, top, right, bottom):
+    # Check whether the line segment passes through the rectangle
+    return ClipSegment(x0, y0, x1, y1, left, top, right, bottom) is not None
+
+def ClipSegment(x0, y0, x1, y1, left, top, right, bottom):
+    # The part (x0, y0, x1, y1) of the line segment within the rectangle, or None when it misses the
+    # rectangle, using Liang-Barsky clipping
+    low, high = 0.0, 1.0
+    for p, q in ((x0 - x1, x0 - left), (x1 - x0, right - x0), (y0 - y1, y0 - top), (y1 - y0, bottom - y0)):
+        if p == 0:
+            if q < 0:
+                return None
+        else:
+            t = float(q) / p
+            if p < 0:
+                low = max(low, t)
+            else:
+                high = min(high, t)
+            if low > high:
+                return None
+    dx, dy = x1 - x0, y1 - y0
+    return (int(round(x0 + low * dx)), int(round(y0 + low * dy)), int(round(x0 + high * dx)), int(round(y0 + high * dy)))
+
+def ClassifyBoxes(boxes, left, top, right, bottom):
+    # Class of every box (left, top, right, bottom) against the trim box: inside it, outside of it or
+    # crossing its edge, in a single pass over all boxes
+    if not boxes:
+        return []
+    if numpy is not None:
+        a = numpy.array(boxes, dtype=numpy.int64)
+        inside = (a[:, 0] >= left) & (a[:, 1] >= top) & (a[:, 2] <= right) & (a[:, 3] <= bottom)
+        outside = (a[:, 2] < left) | (a[:, 0] > right) | (a[:, 3] < top) | (a[:, 1] > bottom)
+        return numpy.where(inside, TRIM_KEEP, numpy.where(outside, TRIM_REMOVE, TRIM_CLIP)).tolist()
+    return [
+        TRIM_KEEP if l >= left and t >= top and r <= right and b <= bottom else
+        TRIM_REMOVE if r < left or l > right or b < top or t > bottom else
+        TRIM_CLIP
+        for l, t, r, b in boxes
+    ]
+
+def CutOutline(plan, outline, outline_thickness):
+    # Open up the outline segments [x0, y0, x1, y1, width] for the tabs of the plan and connect both
+    # sides of each tab. Returns the new outline and the tabs which hit the outline on both sides.
+    index = GridIndex(4 * max(plan.tab_width, plan.spacing_width))
+    for segment in outline:
+        _IndexSegment(index, segment)
+
+    outline = list(outline)
+    cut_tabs = []
+    removed = set()
+    for tab in plan.tabs:
+        hits = []
+        # Open up both sides of the tab
+        for x, y, w, h in plan.TabCuts(tab):
+            segment = _FindHit(index, x, y, x + w, y + h)
+            if segment is not None:
+                hits.append((segment, (x, y, x + w, y + h)))
+        # Only add the tab when both of its sides hit the outline
+        if len(hits) != 2:
+            continue
+
+        for segment, cut in hits:
+            removed.add(id(segment))
+            index.Remove(segment)
+            for half in _BreakSegment(segment, cut, tab[0]):
+                outline.append(half)
+                _IndexSegment(index, half)
+        cut_tabs.append(tab)
+        outline.extend([x0, y0, x1, y1, outline_thickness] for x0, y0, x1, y1 in plan.TabLines(tab))
+
+    return [s for s in outline if id(s) not in removed], cut_tabs
+
+def _IndexSegment(index, segment):
+    x0, y0, x1, y1, width = segment
+    margin = width // 2 + HIT_ACCURACY
+    index.Insert(segment, min(x0, x1) - margin, min(y0, y1) - margin, max(x0, x1) + margin, max(y0, y1) + margin)
+
+def _FindHit(index, left, top, right, bottom):
+    left, right = min(left, right) - HIT_ACCURACY, max(left, right) + HIT_ACCURACY
+    top, bottom = min(top, bottom) - HIT_ACCURACY, max(top, bottom) + HIT_ACCURACY
+    for segment in index.Query(left, top, right, bottom):
+        if SegmentHitsRect(segment[0], segment[1], segment[2], segment[3], left, top, right, bottom):
+            return segment
+    return None
+
+def _BreakSegment(segment, cut, direction):
+    # Two segments which replace the segment with a gap at the cut
+    x0, y0, x1, y1, width = segment
+    if (x0, y0)[direction] > (x1, y1)[direction]:
+        x0, y0, x1, y1 = x1, y1, x0, y0
+    left, top, right, bottom = cut
+    return ([x0, y0, left, top, width], [right, bottom, x1, y1, width])
@@ -0,0 +1,101 @@
+import json
+import time
+
+class PanelStats:
+    def __init__(self):
+        # Phases in the order in which they were entered
+        self.phases = []
+        # Statistics of each placed board copy
+        self.copies = []
+        # Counters summed over the whole run
+        self.totals = {}
+        self.current_phase = None
+        self.current_copy = None
+
+    def Phase(self, name):
+        # A phase which is entered again, as for every step of the boards and tabs, adds its time and
+        # counters to the same entry
+        entry = next((phase for phase in self.phases if phase['name'] == name), None)
+        if entry is None:
+            entry = {'name': name, 'duration': 0.0, 'counters': {}}
+            self.phases.append(entry)
+        return _Scope(self, 'phase', entry)
+
+    def Copy(self, index, x, y):
+        return _Scope(self, 'copy', {'index': index, 'x': x, 'y': y, 'duration': 0.0, 'counters': {}})
+
+    def Count(self, name, amount=1):
+        # Add to the totals and to the phase and copy which are currently active
+        self.totals[name] = self.totals.get(name, 0) + amount
+        for entry in (self.current_phase, self.current_copy):
+            if entry is not None:
+                entry['counters'][name] = entry['counters'].get(name, 0) + amount
+
+    def Report(self):
+        return {
+            'duration': sum(phase['duration'] for phase in self.phases),
+            'phases': self.phases,
+            'copies': self.copies,
+            'totals': self.totals,
+        }
+
+    def Write(self, file_name):
+        with open(file_name, 'w') as f:
+            json.dump(self.Report(), f, indent=2, sort_keys=True)
+
+    def Format(self):
+        # Human readable summary of the phases and counters
+        lines = []
+        for phase in self.phases:
+            lines.append('{}: {:.1f} ms'.format(phase['name'], phase['duration'] * 1000))
+            for name in sorted(phase['counters']):
+                lines.append('    {}: {}'.format(name, phase['counters'][name]))
+        if self.copies:
+            durations = [copy['duration'] for copy in self.copies]
+            lines.append('copies: {}, {:.1f} ms average, {:.1f} ms slowest'.format(
+                len(durations), sum(durations) / len(durations) * 1000, max(durations) * 1000))
+        lines.append('total: {:.1f} ms'.format(self.Report()['duration'] * 1000))
+        return '\n'.join(lines)
+
+class _Scope:
+    def __init__(self, stats, kind, entry):
+        self.stats = stats
+        self.kind = kind
+        self.entry = entry
+
+    def __enter__(self):
+        if self.kind == 'phase':
+            self.outer, self.stats.current_phase = self.stats.current_phase, self.entry
+        else:
+            self.stats.copies.append(self.entry)
+            self.outer, self.stats.current_copy = self.stats.current_copy, self.entry
+        self.start = time.time()
+        return self.entry
+
+    def __exit__(self, *exc):
+        self.entry['duration'] += time.time() - self.start
+        if self.kind == 'phase':
+            self.stats.current_phase = self.outer
+        else:
+            self.stats.current_copy = self.outer
+        return False
+
+class NullStats:
+    # Stand-in which records nothing, used when instrumentation is turned off
+    def Phase(self, name):
+        return _NULL_SCOPE
+
+    def Copy(self, index, x, y):
+        return _NULL_SCOPE
+
+    def Count(self, name, amount=1):
+        pass
+
+class _NullScope:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SCOPE = _NullScope()
@@ -0,0 +1,90 @@
+import copy
+from .geometry import PanelLength
+
+class LayoutSolver:
+    GOAL_MOST_BOARDS = 0
+    GOAL_LOWEST_COST = 1
+
+    def __init__(self, settings, max_width=None, max_height=None, prices=None, goal=None):
+        # Settings used for the frame and spacing, the solver only chooses the board counts and rotation
+        self.settings = settings
+        # Largest panel which can be made, either way around
+        self.max_width = max_width
+        self.max_height = max_height
+        # Price of each fabrication panel size, as (width, height, price)
+        self.prices = sorted(prices or [], key=lambda p: p[2])
+        if goal is None:
+            goal = LayoutSolver.GOAL_LOWEST_COST if self.prices else LayoutSolver.GOAL_MOST_BOARDS
+        self.goal = goal
+
+    def Limits(self):
+        # Size which no panel may exceed in either direction
+        sizes = []
+        if self.max_width is not None and self.max_height is not None:
+            sizes.append((self.max_width, self.max_height))
+        sizes.extend((w, h) for w, h, _ in self.prices)
+        if not sizes:
+            raise ValueError('A maximum panel size or a price table is required')
+        return max(max(w, h) for w, h in sizes)
+
+    def Fits(self, width, height, max_width, max_height):
+        return (width <= max_width and height <= max_height) or (width <= max_height and height <= max_width)
+
+    def Price(self, width, height):
+        # Cheapest fabrication panel which holds the panel
+        for w, h, price in self.prices:
+            if self.Fits(width, height, w, h):
+                return price
+        return None
+
+    def Candidates(self, board_w, board_h):
+        # Every grid of boards which fits, with the board upright and turned by 90 degrees,
+        # as (rotation, boards_x, boards_y, panel_width, panel_height)
+        limit = self.Limits()
+        ow = self.settings.outline_width
+        sw = self.settings.spacing_width
+        results = []
+        for rotation, w, h in [(0, board_w, board_h), (90, board_h, board_w)]:
+            # Panel lengths for every board count, up to the largest allowed size
+            widths = []
+            while PanelLength(ow, sw, w, len(widths) + 1) <= limit:
+                widths.append(PanelLength(ow, sw, w, len(widths) + 1))
+            heights = []
+            while PanelLength(ow, sw, h, len(heights) + 1) <= limit:
+                heights.append(PanelLength(ow, sw, h, len(heights) + 1))
+
+            for bx, width in enumerate(widths, 1):
+                for by, height in enumerate(heights, 1):
+                    if self.max_width is not None and not self.Fits(width, height, self.max_width, self.max_height):
+                        continue
+                    results.append((rotation, bx, by, width, height))
+        return results
+
+    def Score(self, candidate):
+        # Lower scores are better
+        rotation, bx, by, width, height = candidate
+        boards = bx * by
+        if self.goal == LayoutSolver.GOAL_LOWEST_COST:
+            price = self.Price(width, height)
+            if price is None:
+                return None
+            return (float(price) / boards, -boards, width * height, rotation)
+        return (-boards, width * height, rotation)
+
+    def Solve(self, board_w, board_h):
+        # Find the best candidate and return the settings for it, or None when no panel fits
+        best, best_score = None, None
+        for candidate in self.Candidates(board_w, board_h):
+            score = self.Score(candidate)
+            if score is not None and (best_score is None or score < best_score):
+                best, best_score = candidate, score
+        if best is None:
+            return None
+
+        settings = copy.copy(self.settings)
+        settings.rotation, settings.boards_x, settings.boards_y = best[:3]
+        return settings
+
+    def SolveSource(self, source):
+        # Use the size of the board outline of a loaded source board
+        return self.Solve(source.GetWidth(), source.GetHeight())
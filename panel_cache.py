@@ -0,0 +1,136 @@
+# On-disk cache of generated panel files. A panel is stored under a hash of the content of its source
+# boards, all of its settings and the code which generates it, so an identical request is answered by
+# copying the stored file instead of creating the panel again.
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+
+# Bump when the generated panels change in a way which the code hash does not cover
+CACHE_VERSION = 1
+# Timestamps which differ between two runs that create the same panel
+TIMESTAMP = re.compile(r'\((tstamp|tedit) [0-9A-Fa-f]+\)')
+
+_file_hashes = {}
+_code_hash = None
+
+def FileHash(file_name):
+    # Hash of the content of a file, remembered as long as the file is not modified
+    stat = os.stat(file_name)
+    key = (os.path.abspath(file_name), stat.st_mtime, stat.st_size)
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(file_name, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+def CodeHash():
+    # Hash of the plugin code, so panels from an older version are not reused
+    global _code_hash
+    if _code_hash is None:
+        digest = hashlib.sha256()
+        for file_name in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+            digest.update(FileHash(file_name).encode('ascii'))
+        _code_hash = digest.hexdigest()
+    return _code_hash
+
+def PanelKey(settings, kind, extra=None):
+    # Key of the panel of the settings, for the kind of output and any extra parameters of the job.
+    # The source boards are identified by their content, not by their path.
+    data = settings.ToDict()
+    if settings.designs:
+        data['board_file'] = ''
+        data['designs'] = [[FileHash(board_file), quantity] for board_file, quantity in settings.designs]
+    else:
+        data['board_file'] = FileHash(settings.board_file)
+    text = json.dumps({
+        'version': CACHE_VERSION, 'code': CodeHash(), 'kind': kind,
+        'settings': data, 'extra': extra or {},
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def SamePanel(file_a, file_b):
+    # Compare two panel files, ignoring the timestamps of the items
+    with open(file_a) as a, open(file_b) as b:
+        return TIMESTAMP.sub('', a.read()) == TIMESTAMP.sub('', b.read())
+
+class PanelCache:
+    def __init__(self, directory, max_bytes=1 << 30):
+        self.directory = directory
+        # Total size of the stored panels, the least recently used ones are removed beyond it
+        self.max_bytes = max_bytes
+
+    def Path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.kicad_pcb')
+
+    def WarningsPath(self, path):
+        # The warnings of a panel are stored next to it
+        return os.path.splitext(path)[0] + '.txt'
+
+    def Get(self, key, file_name):
+        # Copy the stored panel to the file, returns False when it is not in the cache
+        path = self.Path(key)
+        if not os.path.isfile(path):
+            return False
+        shutil.copyfile(path, file_name)
+        # Mark the panel as recently used
+        os.utime(path, None)
+        return True
+
+    def Warnings(self, key):
+        # The warnings which were given when the stored panel was created
+        try:
+            with open(self.WarningsPath(self.Path(key))) as f:
+                return f.read()
+        except (IOError, OSError):
+            return ''
+
+    def Put(self, key, file_name, warnings=''):
+        # Store a copy of the panel file, through a temporary file so readers never see a partial panel.
+        # The warnings are written first, so a stored panel always has its warnings.
+        path = self.Path(key)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        if warnings:
+            with open(self.WarningsPath(path), 'w') as f:
+                f.write(warnings)
+        elif os.path.exists(self.WarningsPath(path)):
+            os.remove(self.WarningsPath(path))
+        handle, temp_name = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(handle)
+        try:
+            shutil.copyfile(file_name, temp_name)
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(temp_name, path)
+        except (IOError, OSError):
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
+            raise
+        self.Evict()
+
+    def Evict(self):
+        # Remove the least recently used panels until the cache fits in its size
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, '*', '*.kicad_pcb')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            if os.path.exists(self.WarningsPath(path)):
+                os.remove(self.WarningsPath(path))
+            total -= size
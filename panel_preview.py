@@ -0,0 +1,135 @@
+import wx
+from .geometry import FindEdgeRanges, IntersectRanges, CopyOrientations, PlanLayout, TabOffsets, TAB_HORIZONTAL_CUT
+
+# Number of copied outline segments above which the copies are drawn as rectangles
+MAX_PREVIEW_SEGMENTS = 20000
+
+class OutlineSnapshot:
+    def __init__(self, width, height, segments):
+        # Outline of a source board as line segments (x0, y0, x1, y1) relative to the top left corner
+        # of its bounding box, and the ranges of the edges which follow the bounding box
+        self.width = width
+        self.height = height
+        self.segments = segments
+        self.edge_ranges = FindEdgeRanges(segments, 0, 0, width, height)
+        self.rotations = {}
+
+    @staticmethod
+    def FromSource(source):
+        left, top = source.box.GetLeft(), source.box.GetTop()
+        segments = [(x0 - left, y0 - top, x1 - left, y1 - top) for x0, y0, x1, y1 in source.GetOutline()]
+        return OutlineSnapshot(source.GetWidth(), source.GetHeight(), segments)
+
+    def Rotated(self, rotation):
+        # This outline turned counterclockwise by the rotation in degrees, a multiple of 90
+        rotation %= 360
+        if rotation == 0:
+            return self
+        if rotation not in self.rotations:
+            # Turn the outline which is a quarter turn behind by another quarter turn
+            previous = self.Rotated(rotation - 90)
+            w = previous.width
+            segments = [(y0, w - x0, y1, w - x1) for x0, y0, x1, y1 in previous.segments]
+            self.rotations[rotation] = OutlineSnapshot(previous.height, previous.width, segments)
+        return self.rotations[rotation]
+
+def PlanPreview(settings, snapshot):
+    # The layout of the panel from the outline alone, the optimized tab mode does not look at the parts
+    f = lambda r: r[1] - r[0] > settings.tab_width
+    # The tabs have to suit the edges of every orientation of the board in the panel
+    orientations = sorted(set(CopyOrientations(settings)))
+    snapshot = snapshot.Rotated(settings.rotation)
+    edge_ranges = tuple([r for r in ranges if f(r)] for ranges in snapshot.edge_ranges)
+    for orientation in orientations[1:]:
+        other = snapshot.Rotated(orientation).edge_ranges
+        edge_ranges = tuple([r for r in IntersectRanges(a, b) if f(r)] for a, b in zip(edge_ranges, other))
+    tab_ver_offsets, tab_hor_offsets = TabOffsets(settings, snapshot.width, snapshot.height, edge_ranges)
+    return PlanLayout(settings, snapshot.width, snapshot.height, tab_ver_offsets, tab_hor_offsets)
+
+class PanelPreview(wx.Panel):
+    def __init__(self, parent, size=wx.Size(360, 360)):
+        wx.Panel.__init__(self, parent, size=size)
+        self.SetMinSize(size)
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+        self.Bind(wx.EVT_PAINT, self.OnPaint)
+        self.Bind(wx.EVT_SIZE, lambda event: self.Refresh())
+        self.plan = None
+        self.snapshot = None
+        self.settings = None
+        self.message = 'Select a board file'
+
+    def SetPlan(self, plan, snapshot, settings):
+        self.plan = plan
+        self.snapshot = snapshot.Rotated(settings.rotation)
+        self.settings = settings
+        self.Refresh()
+
+    def SetMessage(self, message):
+        self.plan = None
+        self.message = message
+        self.Refresh()
+
+    def OnPaint(self, event):
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(wx.Brush(wx.Colour(32, 32, 32)))
+        dc.Clear()
+        width, height = self.GetClientSize()
+        dc.SetTextForeground(wx.Colour(200, 200, 200))
+        if self.plan is None:
+            dc.DrawText(self.message, 10, 10)
+            return
+
+        plan = self.plan
+        margin = 10
+        scale = min(float(width - 2 * margin) / max(plan.panel_width, 1),
+                    float(height - 2 * margin - 20) / max(plan.panel_height, 1))
+        px = lambda x: int(margin + x * scale)
+        py = lambda y: int(margin + y * scale)
+
+        # Frame
+        dc.SetPen(wx.Pen(wx.Colour(180, 180, 180)))
+        dc.DrawLineList([(px(x0), py(y0), px(x1), py(y1)) for x0, y0, x1, y1 in plan.frame_segments])
+
+        # Copies, as outlines in their orientation or as their bounding boxes for large panels
+        snapshot = self.snapshot
+        dc.SetPen(wx.Pen(wx.Colour(80, 200, 80)))
+        dc.SetBrush(wx.TRANSPARENT_BRUSH)
+        if len(snapshot.segments) * len(plan.copies) <= MAX_PREVIEW_SEGMENTS:
+            lines = []
+            for (bx, by), orientation in zip(plan.copies, plan.copy_orientations):
+                segments = snapshot.Rotated(orientation).segments
+                lines.extend((px(bx + x0), py(by + y0), px(bx + x1), py(by + y1)) for x0, y0, x1, y1 in segments)
+            dc.DrawLineList(lines)
+        else:
+            w, h = int(snapshot.width * scale), int(snapshot.height * scale)
+            dc.DrawRectangleList([(px(bx), py(by), w, h) for bx, by in plan.copies])
+
+        # Tabs across the spacing between the boards
+        half = plan.tab_width // 2
+        rects = []
+        for direction, x, y in plan.tabs:
+            if direction == TAB_HORIZONTAL_CUT:
+                rects.append((px(x - half), py(y), max(1, int(plan.tab_width * scale)), max(1, int(plan.spacing_width * scale))))
+            else:
+                rects.append((px(x), py(y - half), max(1, int(plan.spacing_width * scale)), max(1, int(plan.tab_width * scale))))
+        dc.SetPen(wx.Pen(wx.Colour(230, 150, 40)))
+        dc.SetBrush(wx.Brush(wx.Colour(230, 150, 40)))
+        dc.DrawRectangleList(rects)
+
+        # Score lines across the panel
+        dc.SetPen(wx.Pen(wx.Colour(90, 160, 230), 1, wx.SHORT_DASH))
+        dc.DrawLineList([(px(x0), py(y0), px(x1), py(y1)) for x0, y0, x1, y1 in plan.scores])
+
+        # Mouse bite holes, frame holes and fiducials
+        dc.SetPen(wx.Pen(wx.Colour(20, 20, 20)))
+        dc.DrawPointList([(px(x), py(y)) for x, y in plan.HoleCenters()])
+        dc.SetPen(wx.Pen(wx.Colour(220, 220, 220)))
+        dc.SetBrush(wx.TRANSPARENT_BRUSH)
+        for x, y in plan.frame_holes:
+            dc.DrawCircle(px(x), py(y), max(1, int(self.settings.outline_hole * scale / 2)))
+        dc.SetPen(wx.Pen(wx.Colour(200, 120, 60)))
+        for x, y, back in plan.fiducials:
+            dc.DrawCircle(px(x), py(y), max(2, int(self.settings.fiducial_mask * scale / 2)))
+
+        dc.DrawText('{:.1f} x {:.1f} mm, {} boards'.format(plan.panel_width / 1e6, plan.panel_height / 1e6, len(plan.copies)),
+                    margin, height - margin - 14)
@@ -1,10 +1,23 @@
+import json
 from pcbnew import *
-from .constants import Layers, DrawSegmentShape
+from .constants import Layers, COPY_NET_NAME
+from .spatial_index import OutlineIndex, KeepoutIndex
+from .board_prototype import BoardPrototype
+from .source_board import SourceBoard
+from .instrumentation import NullStats
+from .geometry import GridIndex, PlanLayout, FindEdgeRanges, FollowsBoundingBox, IntersectRanges, CopyOrientations, TabOffsets, ShiftTabs, MouseBitePattern, PlanMixedLayout, PackPanel, MOUSEBITE_HOLE, TAB_HORIZONTAL_CUT, TAB_VERTICAL_CUT, TABS_SPACE_EVENLY, TABS_SPACE_AROUND, TABS_SPACE_AUTO, TABS_OPTIMIZE, ALTERNATE_NONE, ALTERNATE_COLUMNS, ALTERNATE_ROWS
 
 class PanelSettings:
-    TABS_SPACE_EVENLY = 0
-    TABS_SPACE_AROUND = 1
-    TABS_SPACE_AUTO = 2
+    TABS_SPACE_EVENLY = TABS_SPACE_EVENLY
+    TABS_SPACE_AROUND = TABS_SPACE_AROUND
+    TABS_SPACE_AUTO = TABS_SPACE_AUTO
+    TABS_OPTIMIZE = TABS_OPTIMIZE
+    ALTERNATE_NONE = ALTERNATE_NONE
+    ALTERNATE_COLUMNS = ALTERNATE_COLUMNS
+    ALTERNATE_ROWS = ALTERNATE_ROWS
+
+    # Settings which change the copied boards, all other settings only affect the frame and tabs
+    COPY_SETTINGS = ['board_file', 'boards_x', 'boards_y', 'spacing_width', 'trim_silkscreen', 'rotation', 'designs', 'pack_width', 'keep_zone_fills', 'separate_nets', 'vscore', 'alternate']
 
     def __init__(self, board_file):
         self.board_file = board_file
@@ -14,173 +27,495 @@ class PanelSettings:
         self.tab_width = FromMM(2.5)
         self.boards_x = 1
         self.boards_y = 1
+        # Rotation of the boards in the panel in degrees, 0 or 90
+        self.rotation = 0
+        # Turn every other column or row of boards by another 180 degrees
+        self.alternate = PanelSettings.ALTERNATE_NONE
         self.tabs_x = 1
         self.tabs_y = 1
         self.tab_mode = PanelSettings.TABS_SPACE_EVENLY
         self.trim_silkscreen = False
         self.fiducial_mask = FromMM(2.5)
         self.fiducial_copper = FromMM(1)
+        self.mousebite_pitch = FromMM(1)
+        self.mousebite_inset = FromMM(0.1)
+        self.group_tab_holes = False
+        self.tab_clearance = FromMM(1)
+        # Move the tabs which come closer than the tab clearance to the copper of the board, instead of
+        # only reporting them
+        self.move_crowded_tabs = False
+        # Keep the fill of the source zones in the copies, only zones near the tabs are refilled
+        self.keep_zone_fills = False
+        # Give every copy its own nets, named after the copy, instead of sharing the nets between copies
+        self.separate_nets = False
+        # Separate the boards with V-score lines on the score layer instead of tabs with mouse bites
+        self.vscore = False
+        self.vscore_layer = Layers.Cmts_User
+        # Boards of a mixed panel as (board_file, quantity), used instead of the board file and counts
+        self.designs = []
+        # Width available for packing the boards of a mixed panel, or 0 to choose one
+        self.pack_width = 0
+
+    def ToDict(self):
+        # All settings as plain values, the lengths in internal units
+        data = dict(vars(self))
+        data['designs'] = [[board_file, quantity] for board_file, quantity in self.designs]
+        return data
+
+    @staticmethod
+    def FromDict(data):
+        settings = PanelSettings(data.get('board_file', ''))
+        for name, value in data.items():
+            if name != 'designs' and hasattr(settings, name):
+                setattr(settings, name, value)
+        settings.designs = [(board_file, int(quantity)) for board_file, quantity in data.get('designs') or []]
+        return settings
+
+    def Save(self, file_name):
+        # Write the settings as a recipe file, which gives the same panel when loaded again
+        with open(file_name, 'w') as f:
+            json.dump(self.ToDict(), f, indent=2, sort_keys=True)
+
+    @staticmethod
+    def Load(file_name):
+        with open(file_name) as f:
+            return PanelSettings.FromDict(json.load(f))
+
+    def DesignQuantities(self):
+        # The designs of a mixed panel with every board file only once
+        quantities = []
+        for board_file, quantity in self.designs:
+            for i, (other, count) in enumerate(quantities):
+                if other == board_file:
+                    quantities[i] = (other, count + quantity)
+                    break
+            else:
+                quantities.append((board_file, quantity))
+        return quantities
+
+# Design rules of a net class, which are copied to the net classes of the panel
+NET_CLASS_RULES = ['Description', 'Clearance', 'TrackWidth', 'ViaDiameter', 'ViaDrill', 'uViaDiameter', 'uViaDrill', 'DiffPairWidth', 'DiffPairGap']
+
+# Number of holes added in a single step
+HOLE_BATCH = 200
+
+class _Progress:
+    def __init__(self, total):
+        self.done = 0
+        self.total = total
+
+    def Step(self, message):
+        self.done = min(self.done + 1, self.total)
+        return (self.done, self.total, message)
+
+    def Done(self):
+        self.done = self.total
+        return (self.total, self.total, 'Done')
 
 class Panel:
-    def __init__(self, settings):
-        self.board = GetBoard()
+    def __init__(self, settings, board=None, stats=None):
+        # Build the panel in the given board, or in the board which is open in pcbnew
+        self.board = board if board is not None else GetBoard()
         self.settings = settings
+        # Collect timings and counters only when a PanelStats is given
+        self.stats = stats if stats is not None else NullStats()
         self.page_offset = wxPoint(FromMM(20), FromMM(20))
-
-    def create_panel(self):
-        # Load the board to be panelized
-        other_board = LoadBoard(self.settings.board_file)
-
-        # Get the thickness of the outline
-        box = other_board.GetBoardEdgesBoundingBox()
-        outline_thickness = 0
-        for drawing in other_board.GetDrawings():
-            if type(drawing) == DRAWSEGMENT and drawing.GetLayer() == Layers.Edge_Cuts:
-                outline_thickness = max(outline_thickness, drawing.GetWidth())
-        box.Inflate(-outline_thickness / 2, -outline_thickness / 2)
-        board_w = box.GetWidth()
-        board_h = box.GetHeight()
-
-        # Update the number of copper layers if needed
-        this_copper = self.board.GetCopperLayerCount()
-        other_copper = other_board.GetCopperLayerCount()
-        if other_copper > this_copper:
-            self.board.SetCopperLayerCount(other_copper)
-
-        # Add outline
-        needed_width = 2 * self.settings.outline_width + self.settings.spacing_width + (self.settings.spacing_width + board_w) * self.settings.boards_x
-        needed_height = 2 * self.settings.outline_width + self.settings.spacing_width + (self.settings.spacing_width + board_h) * self.settings.boards_y
-
-        self.AddBoardOutlineSquare(0, 0, needed_width, needed_height, outline_thickness)
-        self.AddBoardOutlineSquare(
-            self.settings.outline_width,
-            self.settings.outline_width,
-            needed_width - 2*self.settings.outline_width,
-            needed_height - 2*self.settings.outline_width,
-            outline_thickness
+        self.outline_index = None
+        self.assembly_prototypes = None
+        # Copied zones which kept the fill of the source zone
+        self.filled_zones = []
+        # Nets which were added to the board
+        self.added_nets = []
+
+        # Items generated for the frame, the board copies and the tabs
+        self.items = {'frame': [], 'copies': [], 'tabs': []}
+        # Group to which newly generated items belong
+        self.group = 'frame'
+        # Group of every outline segment, and the items that were removed again
+        self.outline_groups = {}
+        self.removed = set()
+        # Items generated by the current run. Items of an earlier run are only taken off the board, as
+        # the undo step of that run still refers to them.
+        self.new_items = set()
+        # Outline segments which were opened up for a tab
+        self.breaks = []
+        # Tabs with less than the tab clearance to the copper of the source board, as
+        # (direction, offset, clearance) with the offset along the edge of the board
+        self.crowded_tabs = []
+        # Source boards and item counts of the last run
+        self.sources = None
+        self.fingerprint = None
+
+    def create_panel(self, source=None):
+        for _ in self.create_panel_steps(source):
+            pass
+
+    def create_panel_steps(self, source=None):
+        # Create the panel step by step, yielding (done, total, message) after every step. When the steps
+        # are not run to the end, Rollback removes the partially created panel.
+        # Load and analyze the board to be panelized, unless it was already loaded. For a mixed panel
+        # the source is a list with a source board for each design.
+        self.new_items = set()
+        with self.stats.Phase('load'):
+            if source is None:
+                source = self.LoadSources()
+        for step in self.BuildSteps(source, True):
+            yield step
+
+    def update_panel(self, settings, source=None, stats=None):
+        for _ in self.update_panel_steps(settings, source, stats):
+            pass
+
+    def update_panel_steps(self, settings, source=None, stats=None):
+        # Rebuild the panel with new settings, the copied boards are kept when possible
+        self.stats = stats if stats is not None else NullStats()
+        self.new_items = set()
+        previous = self.settings
+        self.settings = settings
+        with self.stats.Phase('load'):
+            if source is None:
+                source = self.LoadSources()
+
+        sources = self.Sources(source)
+        rebuild_copies = (
+            self.sources is None or len(sources) != len(self.sources) or
+            any(a is not b for a, b in zip(sources, self.sources)) or
+            any(getattr(previous, name) != getattr(settings, name) for name in PanelSettings.COPY_SETTINGS)
         )
 
-        # Calculate half the outline width and 1.5 outline width
-        outline_1w2 = self.settings.outline_width / 2
-        outline_3w2 = self.settings.outline_width * 3 / 2
+        with self.stats.Phase('rollback'):
+            # Work in panel coordinates again
+            self.board.Move(wxPoint(-self.page_offset[0], -self.page_offset[1]))
+            self.RemoveTabs()
+            self.RemoveGroup('frame')
+            if rebuild_copies:
+                self.RemoveGroup('copies')
+                self.RemoveNets()
+            elif settings.outline_width != previous.outline_width:
+                # A different frame width moves all the boards
+                delta = settings.outline_width - previous.outline_width
+                for item in self.items['copies']:
+                    item.Move(wxPoint(delta, delta))
+        self.fingerprint = None
+
+        for step in self.BuildSteps(source, rebuild_copies):
+            yield step
+
+    def Rollback(self):
+        # Remove everything this panel added to the board, used when the steps were not run to the end
+        self.outline_index = None
+        self.assembly_prototypes = None
+        self.RemoveTabs()
+        self.RemoveGroup('frame')
+        self.RemoveGroup('copies')
+        self.RemoveNets()
+        self.filled_zones = []
+        self.sources = None
+        self.fingerprint = None
+        self.RebuildNetlist()
+
+    def LoadSource(self, file_name=None):
+        file_name = file_name if file_name is not None else self.settings.board_file
+        return SourceBoard(LoadBoard(file_name), file_name)
+
+    def LoadSources(self):
+        # Every design of a mixed panel is loaded once
+        if self.settings.designs:
+            return [self.LoadSource(board_file) for board_file, _ in self.settings.DesignQuantities()]
+        return self.LoadSource()
+
+    def Sources(self, source):
+        return list(source) if isinstance(source, (list, tuple)) else [source]
+
+    def BuildSteps(self, source, add_copies):
+        self.sources = self.Sources(source)
+        # Place the source boards turned if requested
+        sources = [s.Rotated(self.settings.rotation * 10) for s in self.sources]
+        outline_thickness = max(s.outline_thickness for s in sources)
+
+        with self.stats.Phase('layout'):
+            # Update the number of copper layers if needed
+            this_copper = self.board.GetCopperLayerCount()
+            other_copper = max(s.board.GetCopperLayerCount() for s in sources)
+            if other_copper > this_copper:
+                self.board.SetCopperLayerCount(other_copper)
+
+            plan = self.PlanPanel(sources)
+
+        # Every copy, row of tabs and batch of holes is a separate step, the number of holes is an estimate
+        # as tabs which do not meet the outline on both sides are skipped
+        tab_rows = plan.TabRows()
+        holes = sum(len(plan.hole_pattern[tab[0]]) if not self.settings.group_tab_holes else 1 for tab in plan.tabs)
+        total = 2 + len(tab_rows) + (holes + HOLE_BATCH - 1) // HOLE_BATCH
+        if add_copies:
+            total += len(plan.copies) + 1
+        progress = _Progress(total)
+        yield progress.Step('Placing the frame')
+
+        # Turn the layout into board items
+        with self.stats.Phase('frame'):
+            self.group = 'frame'
+            self.AddFrame(plan, outline_thickness)
+        if add_copies:
+            self.group = 'copies'
+            self.filled_zones = []
+            for step in self.AddBoardSteps(plan, progress):
+                yield step
+        self.group = 'tabs'
+        for step in self.AddTabSteps(plan, outline_thickness, tab_rows, progress):
+            yield step
+        if self.filled_zones:
+            with self.stats.Phase('zones'):
+                self.RefillZonesNearTabs(plan)
+
+        with self.stats.Phase('move'):
+            self.board.Move(self.page_offset)
+        self.fingerprint = self.Fingerprint(self.board)
+        yield progress.Done()
+
+    def Fingerprint(self, board):
+        # Item counts used to detect whether the board was modified after the panel was created
+        return (len(board.GetDrawings()), len(board.GetModules()), len(board.GetTracks()), board.GetAreaCount())
+
+    def IsPanelBoard(self, board):
+        # Check whether the board still holds this panel, unchanged since the last run
+        if (self.fingerprint is None or
+                board.this != self.board.this or
+                self.Fingerprint(board) != self.fingerprint):
+            return False
+        # The counts also match when a generated item was deleted and another one added, so every
+        # generated item has to be found on the board. pcbnew creates a new wrapper on every access, so
+        # the items are compared by the address of the KiCad object.
+        board_items = set(int(item.this) for item in self.BoardItems(board))
+        return all(int(item.this) in board_items
+                   for items in self.items.values() for item in items if id(item) not in self.removed)
+
+    def BoardItems(self, board):
+        # Every item which the panel can generate
+        return (list(board.GetDrawings()) + list(board.GetModules()) + list(board.GetTracks()) +
+                [board.GetArea(i) for i in range(board.GetAreaCount())])
+
+    def Record(self, item, outline=False):
+        # Remember the generated item in the current group
+        self.items[self.group].append(item)
+        self.new_items.add(id(item))
+        if outline:
+            self.outline_groups[id(item)] = self.group
+
+    def RemoveItem(self, item):
+        if self.outline_index is not None:
+            self.outline_index.Remove(item)
+        self.DeleteItem(item)
+        self.removed.add(id(item))
+
+    def DeleteItem(self, item):
+        if id(item) in self.new_items:
+            self.board.Delete(item)
+            self.new_items.discard(id(item))
+        else:
+            self.board.Remove(item)
+
+    def RemoveGroup(self, group):
+        # Delete all remaining items of the group from the board
+        for item in self.items[group]:
+            if id(item) not in self.removed:
+                self.DeleteItem(item)
+            self.outline_groups.pop(id(item), None)
+            self.removed.discard(id(item))
+        self.items[group] = []
+
+    def RemoveNets(self):
+        for net in self.added_nets:
+            self.board.Remove(net)
+        self.added_nets = []
+
+    def RemoveTabs(self):
+        # Restore the outline segments which were opened up, in reverse order so that
+        # segments which were broken more than once are restored correctly
+        replaced = {}
+        for original, group, start, end, width, halves in reversed(self.breaks):
+            for half in halves:
+                while id(half) in replaced:
+                    half = replaced[id(half)]
+                self.RemoveItem(half)
+            self.group = group
+            replaced[id(original)] = self.AddBoardOutline(start[0], start[1], end[0], end[1], width)
+        self.breaks = []
+
+        # Drop the items which no longer exist
+        for group in self.items:
+            items = self.items[group]
+            self.items[group] = [item for item in items if id(item) not in self.removed]
+            for item in items:
+                if id(item) in self.removed:
+                    self.outline_groups.pop(id(item), None)
+        self.removed = set()
+
+        self.RemoveGroup('tabs')
+
+    def AddFrame(self, plan, outline_thickness):
+        # Add outline
+        for x0, y0, x1, y1 in plan.frame_segments:
+            self.AddBoardOutline(x0, y0, x1, y1, outline_thickness)
 
         # Add holes in the frame of the panel
         hole_size = wxSize(self.settings.outline_hole, self.settings.outline_hole)
-        self.AddHole(outline_1w2, outline_1w2, hole_size)
-        self.AddHole(needed_width - outline_1w2, outline_1w2, hole_size)
-        self.AddHole(outline_1w2, needed_height - outline_1w2, hole_size)
-
-        # Add fiducials to the front
-        self.AddFiducial(outline_3w2, outline_1w2)
-        self.AddFiducial(needed_width - outline_1w2, outline_3w2)
-        self.AddFiducial(outline_1w2, needed_height - outline_3w2)
-        # Add fiducials to the back
-        self.AddFiducial(outline_1w2, outline_3w2, back=True)
-        self.AddFiducial(needed_width - outline_3w2, outline_1w2, back=True)
-        self.AddFiducial(outline_3w2, needed_height - outline_1w2, back=True)
-
-        # Add boards
-        for y in range(self.settings.boards_y):
-            for x in range(self.settings.boards_x):
-                board_x = self.settings.outline_width + self.settings.spacing_width + (self.settings.spacing_width + board_w) * x
-                board_y = self.settings.outline_width + self.settings.spacing_width + (self.settings.spacing_width + board_h) * y
-                self.AppendBoard(other_board, box, board_x, board_y, outline_thickness)
-
-        hole_size = wxSize(FromMM(0.5), FromMM(0.5))
-        tab_ver_offsets, tab_hor_offsets = self.GetTabOffsets(other_board, box, outline_thickness)
-        # Add the tabs for each of the boards
-        for y in range(self.settings.boards_y+1):
-            for x in range(self.settings.boards_x+1):
-                board_x = self.settings.outline_width + self.settings.spacing_width + (self.settings.spacing_width + board_w) * x
-                board_y = self.settings.outline_width + self.settings.spacing_width + (self.settings.spacing_width + board_h) * y
-
-                if x != self.settings.boards_x:
-                    for tab_offset in tab_ver_offsets:
-                        # Calculate the position of the tab
-                        lx = board_x + tab_offset
-                        ly = board_y - self.settings.spacing_width
-
-                        hits = []
-                        # Open up both sides of the tab
-                        for offset in [0, self.settings.spacing_width]:
-                            hit_rect = EDA_RECT(
-                                wxPoint(lx - self.settings.tab_width/2, ly + offset),
-                                wxSize(self.settings.tab_width, 0)
-                            )
-                            # Check all drawing items for outline segments that need to be opened up
-                            for drawing in self.board.GetDrawings():
-                                if (type(drawing) == DRAWSEGMENT and
-                                    drawing.GetShape() == DrawSegmentShape.Segment and
-                                    drawing.GetLayer() == Layers.Edge_Cuts and
-                                    drawing.HitTest(hit_rect, False, 10)
-                                ):
-                                    hits.append((drawing, hit_rect))
-                                    break
-
-                        # If the number of hits is not two, this tab is missing one or more of its
-                        # sides, therefore we should not add it
-                        if len(hits) != 2:
-                            continue
-
-                        # Break the outline for each of the hits
-                        for drawing, hit_rect in hits:
-                            self.BreakOutline(drawing, hit_rect, 0)
-
-                        # Add the holes slightly inset
-                        for hole_offset in [FromMM(0.1), self.settings.spacing_width - FromMM(0.1)]:
-                            self.AddHole(lx, ly + hole_offset, hole_size)
-                            for i in range(1, int(self.settings.tab_width / FromMM(2))+1):
-                                self.AddHole(lx - FromMM(i), ly + hole_offset, hole_size)
-                                self.AddHole(lx + FromMM(i), ly + hole_offset, hole_size)
-
-                        # Add in the connecting lines
-                        self.AddBoardOutline(hit_rect.GetLeft(), ly, hit_rect.GetLeft(), ly + self.settings.spacing_width, outline_thickness)
-                        self.AddBoardOutline(hit_rect.GetRight(), ly, hit_rect.GetRight(), ly + self.settings.spacing_width, outline_thickness)
-
-                if y != self.settings.boards_y:
-                    for tab_offset in tab_hor_offsets:
-                        # Calculate the position of the tab
-                        lx = board_x - self.settings.spacing_width
-                        ly = board_y + tab_offset
-
-                        hits = []
-                        # Open up both sides of the tab
-                        for offset in [0, self.settings.spacing_width]:
-                            hit_rect = EDA_RECT(
-                                wxPoint(lx + offset, ly - self.settings.tab_width/2),
-                                wxSize(0, self.settings.tab_width)
-                            )
-                            # Check all drawing items for outline segments that need to be opened up
-                            for drawing in self.board.GetDrawings():
-                                if (type(drawing) == DRAWSEGMENT and
-                                    drawing.GetShape() == DrawSegmentShape.Segment and
-                                    drawing.GetLayer() == Layers.Edge_Cuts and
-                                    drawing.HitTest(hit_rect, False, 10)
-                                ):
-                                    hits.append((drawing, hit_rect))
-                                    break
-
-                        # If the number of hits is not two, this tab is missing one or more of its
-                        # sides, therefore we should not add it
-                        if len(hits) != 2:
-                            continue
-
-                        # Break the outline for each of the hits
-                        for drawing, hit_rect in hits:
-                            self.BreakOutline(drawing, hit_rect, 1)
-
-                        # Add the holes slightly inset
-                        for hole_offset in [FromMM(0.1), self.settings.spacing_width - FromMM(0.1)]:
-                            self.AddHole(lx + hole_offset, ly, hole_size)
-                            for i in range(1, int(self.settings.tab_width / FromMM(2))+1):
-                                self.AddHole(lx + hole_offset, ly - FromMM(i), hole_size)
-                                self.AddHole(lx + hole_offset, ly + FromMM(i), hole_size)
-
-                        # Add in the connecting lines
-                        self.AddBoardOutline(lx, hit_rect.GetTop(), lx + self.settings.spacing_width, hit_rect.GetTop(), outline_thickness)
-                        self.AddBoardOutline(lx, hit_rect.GetBottom(), lx + self.settings.spacing_width, hit_rect.GetBottom(), outline_thickness)
-
-        self.board.Move(self.page_offset)
+        for x, y in plan.frame_holes:
+            self.AddHole(x, y, hole_size)
+
+        # Add fiducials to the front and back
+        for x, y, back in plan.fiducials:
+            self.AddFiducial(x, y, back=back)
+
+        # Add the score lines across the panel
+        for x0, y0, x1, y1 in plan.scores:
+            self.AddScoreLine(x0, y0, x1, y1, outline_thickness)
+        self.stats.Count('score_lines', len(plan.scores))
+
+    def OrientedSource(self, design, orientation):
+        # The source board of the design turned by the rotation of the panel and the orientation of a copy
+        return self.sources[design].Rotated((self.settings.rotation + orientation) * 10)
+
+    def PlanPanel(self, sources):
+        # Compute the layout of the panel for the turned source boards
+        self.crowded_tabs = []
+        if self.settings.designs and self.settings.alternate != PanelSettings.ALTERNATE_NONE:
+            raise ValueError('Alternating boards cannot be combined with a mixed panel')
+        if self.settings.vscore:
+            return self.PlanScoredPanel(sources)
+        if self.settings.designs:
+            return self.PlanMixedPanel(sources)
+        # The tabs have to suit every orientation of the board which is used in the panel
+        oriented = [self.OrientedSource(0, orientation) for orientation in sorted(set(CopyOrientations(self.settings)))]
+        tab_ver_offsets, tab_hor_offsets = self.GetTabOffsets(oriented)
+        return PlanLayout(self.settings, sources[0].GetWidth(), sources[0].GetHeight(), tab_ver_offsets, tab_hor_offsets)
+
+    def PlanScoredPanel(self, sources):
+        # Score lines can only separate a grid of rectangular boards
+        if self.settings.designs:
+            raise ValueError('V-scores cannot be combined with a mixed panel')
+        source = sources[0]
+        if source.edge_ranges is None:
+            source.edge_ranges = self.ScanBoardEdgeRanges(source)
+        if not FollowsBoundingBox(source.edge_ranges, source.GetWidth(), source.GetHeight()):
+            raise ValueError('V-scores need a rectangular board outline')
+        return PlanLayout(self.settings, source.GetWidth(), source.GetHeight(), [], [])
+
+    def PlanMixedPanel(self, sources):
+        # Pack every copy of every design, the tabs are placed on the straight parts of the edges
+        quantities = self.settings.DesignQuantities()
+        designs = [i for i, (_, quantity) in enumerate(quantities) for _ in range(quantity)]
+        sizes = [(s.GetWidth(), s.GetHeight()) for s in sources]
+        packed = PackPanel([sizes[d] for d in designs], self.settings.spacing_width, self.settings.pack_width)
+        if packed is None:
+            raise ValueError('The boards do not fit in the pack width')
+        positions, pack_width, pack_height = packed
+        self.stats.Count('packed_boards', len(positions))
+
+        edge_ranges = [self.FindBoardEdgeRanges(s) for s in sources]
+        return PlanMixedLayout(self.settings, sizes, edge_ranges, positions, designs, pack_width, pack_height)
+
+    def AddBoardSteps(self, plan, progress):
+        # Add boards, the netlist is only rebuilt once all of them are placed. Every orientation of a
+        # design is turned and prepared once, its copies are moved duplicates of it.
+        variants, copy_variants = plan.CopyVariants()
+        oriented = [self.OrientedSource(design, orientation) for design, orientation in variants]
+        self.BeginAssembly()
+        for i, (board_x, board_y) in enumerate(plan.copies):
+            with self.stats.Phase('boards'):
+                with self.stats.Copy(i, board_x, board_y):
+                    self.AppendBoard(oriented[copy_variants[i]], board_x, board_y, i)
+            yield progress.Step('Placing board {} of {}'.format(i + 1, len(plan.copies)))
+        with self.stats.Phase('netlist'):
+            self.CommitAssembly()
+        yield progress.Step('Updating the netlist')
+
+    def AddTabSteps(self, plan, outline_thickness, tab_rows, progress):
+        if not plan.tabs:
+            return
+        # Index all outline segments of the frame and the boards for the tab hit tests
+        with self.stats.Phase('tabs'):
+            self.outline_index = OutlineIndex(4 * max(self.settings.tab_width, self.settings.spacing_width))
+            self.outline_index.Build(self.board)
+
+        # Tabs which were added, their holes are placed afterwards
+        added = []
+        for row, tabs in enumerate(tab_rows):
+            with self.stats.Phase('tabs'):
+                for tab in tabs:
+                    if self.AddTab(plan, tab, outline_thickness):
+                        added.append(tab)
+            yield progress.Step('Placing tab row {} of {}'.format(row + 1, len(tab_rows)))
+        self.stats.Count('drawings_scanned', self.outline_index.scanned)
+        self.stats.Count('hit_tests', self.outline_index.hit_tests)
+        self.outline_index = None
+
+        hole_size = wxSize(plan.hole_size, plan.hole_size)
+        # Holes as (x, y), or the position of a tab and the footprint holding all its holes
+        if self.settings.group_tab_holes:
+            # Footprints holding all holes of a tab, created once for each direction
+            hole_groups = {}
+            for direction, pattern in plan.hole_pattern.items():
+                hole_groups[direction] = self.CreateHoleGroup(pattern, hole_size)
+            holes = [(tab[1], tab[2], hole_groups[tab[0]]) for tab in added]
+        else:
+            holes = [(x, y, None) for tab in added for x, y in plan.TabHoles(tab)]
+        for start in range(0, len(holes), HOLE_BATCH):
+            with self.stats.Phase('tabs'):
+                for x, y, group in holes[start:start + HOLE_BATCH]:
+                    if group is not None:
+                        self.AddHoleGroup(group, x, y)
+                    else:
+                        self.AddHole(x, y, hole_size)
+            yield progress.Step('Placing holes {} of {}'.format(min(start + HOLE_BATCH, len(holes)), len(holes)))
+
+    def AddTab(self, plan, tab, outline_thickness):
+        hits = []
+        # Open up both sides of the tab
+        for x, y, w, h in plan.TabCuts(tab):
+            hit_rect = EDA_RECT(wxPoint(x, y), wxSize(w, h))
+            # Find the outline segment that needs to be opened up
+            drawing = self.outline_index.FindHit(hit_rect)
+            if drawing is not None:
+                hits.append((drawing, hit_rect))
+
+        # If the number of hits is not two, this tab is missing one or more of its
+        # sides, therefore we should not add it
+        if len(hits) != 2:
+            return False
+
+        # Break the outline for each of the hits
+        for drawing, hit_rect in hits:
+            self.BreakOutline(drawing, hit_rect, tab[0])
+        self.stats.Count('holes', len(plan.hole_pattern[tab[0]]))
+
+        # Add in the connecting lines
+        for x0, y0, x1, y1 in plan.TabLines(tab):
+            self.AddBoardOutline(x0, y0, x1, y1, outline_thickness)
+        return True
+
+    def RefillZonesNearTabs(self, plan):
+        # Index the area of every tab, including its holes
+        radius = plan.hole_size // 2
+        tabs = GridIndex(4 * max(self.settings.tab_width, self.settings.spacing_width))
+        for tab in plan.tabs:
+            points = [(x, y) for x, y, w, h in plan.TabCuts(tab) for x, y in ((x, y), (x + w, y + h))]
+            points.extend(plan.TabHoles(tab))
+            xs = [p[0] for p in points]
+            ys = [p[1] for p in points]
+            tabs.Insert(tab, min(xs) - radius, min(ys) - radius, max(xs) + radius, max(ys) + radius)
+
+        # Only the zones which come within their clearance of a tab can have a different fill on the panel
+        refill = []
+        for zone in self.filled_zones:
+            box = zone.GetBoundingBox()
+            clearance = zone.GetZoneClearance()
+            if tabs.Query(box.GetLeft() - clearance, box.GetTop() - clearance, box.GetRight() + clearance, box.GetBottom() + clearance):
+                refill.append(zone)
+        self.stats.Count('zones_kept', len(self.filled_zones) - len(refill))
+        self.stats.Count('zones_refilled', len(refill))
+        if refill:
+            ZONE_FILLER(self.board).Fill(refill)
 
     def AddBoardOutline(self, x0, y0, x1, y1, width=FromMM(0.25)):
         line = DRAWSEGMENT(self.board)
@@ -189,6 +524,21 @@ class Panel:
         line.SetEnd(wxPoint(x1, y1))
         line.SetLayer(Layers.Edge_Cuts)
         self.board.Add(line)
+        self.Record(line, outline=True)
+        # Keep the outline index up to date
+        if self.outline_index is not None:
+            self.outline_index.Add(line)
+        return line
+
+    def AddScoreLine(self, x0, y0, x1, y1, width):
+        line = DRAWSEGMENT(self.board)
+        line.SetWidth(width)
+        line.SetStart(wxPoint(x0, y0))
+        line.SetEnd(wxPoint(x1, y1))
+        line.SetLayer(self.settings.vscore_layer)
+        self.board.Add(line)
+        self.Record(line)
+        return line
 
     def AddBoardOutlineSquare(self, x, y, w, h, width=FromMM(0.25)):
         self.AddBoardOutline(x, y, x + w, y, width)
@@ -199,24 +549,34 @@ class Panel:
     def BreakOutline(self, drawing, rect, direction):
         # Get the thickness of the original line
         outline_thickness = drawing.GetWidth()
-        # Get the start and end point
+        # Get the start and end point, as plain values since pcbnew returns references into the drawing
         start = drawing.GetStart()
+        start = (start[0], start[1])
         end = drawing.GetEnd()
+        end = (end[0], end[1])
         # Swap the start and end coordinates if the line is backwards in the current direction
         start_x = start[0] if start[direction] < end[direction] else end[0]
         start_y = start[1] if start[direction] < end[direction] else end[1]
         end_x = end[0] if start[direction] < end[direction] else start[0]
         end_y = end[1] if start[direction] < end[direction] else start[1]
+        self.stats.Count('outline_breaks')
         # Remove the original line
-        self.board.Delete(drawing)
+        group = self.outline_groups.get(id(drawing), self.group)
+        self.RemoveItem(drawing)
         # Add two lines to replace the deleted line with a split
-        self.AddBoardOutline(start_x, start_y, rect.GetLeft(), rect.GetTop(), outline_thickness)
-        self.AddBoardOutline(rect.GetRight(), rect.GetBottom(), end_x, end_y, outline_thickness)
+        halves = (
+            self.AddBoardOutline(start_x, start_y, rect.GetLeft(), rect.GetTop(), outline_thickness),
+            self.AddBoardOutline(rect.GetRight(), rect.GetBottom(), end_x, end_y, outline_thickness),
+        )
+        # Remember the original line so it can be restored
+        self.breaks.append((drawing, group, start, end, outline_thickness, halves))
 
     def AddHole(self, x, y, size):
         # Create a new footprint
         module = MODULE(self.board)
         self.board.Add(module)
+        self.Record(module)
+        self.stats.Count('footprints_created')
         # Create a new pad
         pad = D_PAD(module)
         module.Add(pad)
@@ -228,10 +588,36 @@ class Panel:
         # Move the pad to the requested position
         module.SetPosition(wxPoint(x, y))
 
+    def CreateHoleGroup(self, pattern, size):
+        # Create a footprint with a pad for every hole, which is not yet added to the board
+        module = MODULE(self.board)
+        for dx, dy in pattern:
+            pad = D_PAD(module)
+            # Set the position relative to the footprint origin
+            pad.SetPos0(wxPoint(dx, dy))
+            pad.SetPosition(wxPoint(dx, dy))
+            module.Add(pad)
+            # Set the size of the pad
+            pad.SetSize(size)
+            pad.SetDrillSize(size)
+            # Set the pad to non-plated through hole
+            pad.SetAttribute(PAD_ATTRIB_HOLE_NOT_PLATED)
+        return module
+
+    def AddHoleGroup(self, group, x, y):
+        # Place a copy of the hole group footprint
+        module = BOARD_ITEM.Duplicate(group)
+        self.board.Add(module)
+        self.Record(module)
+        self.stats.Count('footprints_created')
+        module.SetPosition(wxPoint(x, y))
+
     def AddFiducial(self, x, y, back=False):
         # Create a new footprint for the fiducial
         fid = MODULE(self.board)
         self.board.Add(fid)
+        self.Record(fid)
+        self.stats.Count('footprints_created')
 
         # Determine the layers for the mask and copper
         mask_layer = Layers.F_Mask if not back else Layers.B_Mask
@@ -254,220 +640,253 @@ class Panel:
         # Move the fiducial to the correct place
         fid.SetPosition(wxPoint(x, y))
 
-    def AppendBoard(self, other_board, box, board_x, board_y, outline_thickness):
-        # Clone the bounding box to make sure the inflate does not change it
-        box = EDA_RECT(box.GetOrigin(), box.GetSize())
-        # Get the origin of the bounding box
-        origin_point = box.GetOrigin()
-        # Determine the move offset needed to place the board at the correct position
-        offset_point = wxPoint(board_x, board_y) - origin_point
+    def GetPrototype(self, source):
+        # Prepare each source board only once, all copies reuse the prepared items
+        key = (self.settings.trim_silkscreen, self.settings.spacing_width, self.settings.vscore)
+        if key in source.prototypes:
+            return source.prototypes[key]
+
+        # Inflate the bounding box for the silkscreen trim check
+        trim_box = EDA_RECT(source.box.GetOrigin(), source.box.GetSize())
+        trim_box.Inflate(self.settings.spacing_width // 2, self.settings.spacing_width // 2)
 
-        # Inflate the bounding box again for the silkscreen trim check
-        box.Inflate(self.settings.spacing_width / 2, self.settings.spacing_width / 2)
+        # The copies of a scored panel are not cut out, so their outer outline is left out
+        prototype = BoardPrototype(source.board, source.box, trim_box if self.settings.trim_silkscreen else None,
+                                   keep_outline=not self.settings.vscore)
+        source.prototypes[key] = prototype
+        return prototype
+
+    def AppendBoard(self, source, board_x, board_y, index=0):
+        prototype = self.GetPrototype(source)
+        # Determine the move offset needed to place the board at the correct position
+        offset_point = prototype.GetOffset(board_x, board_y)
+        # Nets of this copy by source net code, when the copy gets its own nets
+        net_map = self.AddCopyNets(prototype, index) if self.settings.separate_nets else None
 
         # Duplicate all the tracks
-        for track in other_board.GetTracks():
+        for i, track in enumerate(prototype.tracks):
             new_track = track.Duplicate()
             self.board.Add(new_track)
+            self.Record(new_track)
             new_track.Move(offset_point)
+            if net_map is not None:
+                new_track.SetNet(net_map[prototype.track_nets[i]])
         # Duplicate all footprints
-        for module in other_board.GetModules():
-            module_dup = BOARD_ITEM.Duplicate(module)
+        for i in range(len(prototype.modules)):
+            module_dup = prototype.DuplicateModule(i)
             self.board.Add(module_dup)
-
-            # Go through all graphical items and possibly remove silkscreen
-            marked_for_deletion = []
-            for drawing in module_dup.GraphicalItems():
-                if self.TrimSilkscreenTest(drawing, box):
-                    marked_for_deletion.append(drawing)
-            for item in marked_for_deletion:
-                item.DeleteStructure()
-
+            self.Record(module_dup)
+            if net_map is not None:
+                for pad, code in zip(module_dup.Pads(), prototype.pad_nets[i]):
+                    pad.SetNet(net_map[code])
             module_dup.Move(offset_point)
         # Duplicate all graphical items
-        for drawing in other_board.GetDrawings():
-            # Possibly skip silkscreen drawing if trimmed
-            if self.TrimSilkscreenTest(drawing, box):
-                continue
-
+        for drawing in prototype.drawings:
             drawing_dup = drawing.Duplicate()
             self.board.Add(drawing_dup)
+            self.Record(drawing_dup, outline=True)
             drawing_dup.Move(offset_point)
-        # Duplicate all zones
-        for i in range(other_board.GetAreaCount()):
-            zone = other_board.GetArea(i)
+        # Duplicate all zones, the fill is duplicated and moved along with the zone
+        for zone, filled, code in zip(prototype.zones, prototype.zone_fills, prototype.zone_nets):
             zone_dup = zone.Duplicate()
             self.board.Add(zone_dup)
+            self.Record(zone_dup)
             zone_dup.Move(offset_point)
+            if net_map is not None:
+                zone_dup.SetNet(net_map[code])
+            if self.settings.keep_zone_fills and filled:
+                # The fill was already valid on the source board, so the copy does not need a refill
+                zone_dup.SetIsFilled(True)
+                zone_dup.SetNeedRefill(False)
+                self.filled_zones.append(zone_dup)
+        self.stats.Count('items_copied', len(prototype.tracks) + len(prototype.modules) + len(prototype.drawings) + len(prototype.zones))
+
+        if self.assembly_prototypes is not None:
+            # Defer adding the nets until the assembly is committed
+            if net_map is None and prototype not in self.assembly_prototypes:
+                self.assembly_prototypes.append(prototype)
+        else:
+            if net_map is None:
+                self.AddNets(prototype)
+            self.RebuildNetlist()
+
+    def BeginAssembly(self):
+        # Start collecting the boards of which the nets still need to be added
+        self.assembly_prototypes = []
+
+    def CommitAssembly(self):
+        prototypes = self.assembly_prototypes
+        self.assembly_prototypes = None
+        if prototypes is None:
+            return
+        # Add the nets of every appended board once and refresh the netlist a single time
+        for prototype in prototypes:
+            self.AddNets(prototype)
+        self.RebuildNetlist()
+
+    def AddNets(self, prototype):
         # Duplicate all the nets
-        for net in other_board.GetNetInfo().NetsByNetcode():
-            self.board.Add(other_board.GetNetInfo().GetNetItem(net))
-
+        for net, netclass in zip(prototype.nets, prototype.net_classes):
+            self.board.Add(net)
+            self.AddToNetClass(netclass, net.GetNetname())
+        self.added_nets.extend(net for net in prototype.nets if net.GetNet() != 0)
+        self.stats.Count('nets_added', len(prototype.nets))
+
+    def AddCopyNets(self, prototype, index):
+        # Add a renamed copy of every net of the source board, and return them as a list indexed by the
+        # source net code. Net code 0 means not connected and is kept.
+        net_map = [None] * (max(net.GetNet() for net in prototype.nets) + 1)
+        net_map[0] = self.board.GetNetInfo().GetNetItem(0)
+        for net, netclass in zip(prototype.nets, prototype.net_classes):
+            code = net.GetNet()
+            if code == 0:
+                continue
+            name = COPY_NET_NAME.format(index=index + 1, name=net.GetNetname())
+            new_net = NETINFO_ITEM(self.board, name)
+            self.board.Add(new_net)
+            self.AddToNetClass(netclass, name)
+            self.added_nets.append(new_net)
+            net_map[code] = new_net
+            self.stats.Count('nets_added')
+        return net_map
+
+    def AddToNetClass(self, netclass, net_name):
+        # Put a net of the panel in the net class of its source net, SynchronizeNetsAndNetClasses puts
+        # the nets which are not a member of any class of the panel board in the default class
+        if netclass is None or netclass.GetName() == NETCLASS.Default:
+            return
+        netclasses = self.board.GetDesignSettings().GetNetClasses()
+        panel_class = netclasses.Find(netclass.GetName())
+        if panel_class is None:
+            # Net classes with the same name are merged, the rules of the first source board are used
+            panel_class = NETCLASS(netclass.GetName())
+            for rule in NET_CLASS_RULES:
+                getattr(panel_class, 'Set' + rule)(getattr(netclass, 'Get' + rule)())
+            netclasses.Add(panel_class)
+        panel_class.Add(net_name)
+
+    def RebuildNetlist(self):
         # Refresh the board netlist
+        self.stats.Count('netlist_rebuilds')
         self.board.BuildListOfNets()
         self.board.SynchronizeNetsAndNetClasses()
         self.board.BuildConnectivity()
 
-    def TrimSilkscreenTest(self, drawing, hitbox):
-        return (self.settings.trim_silkscreen and
-                (drawing.GetLayer() == Layers.F_SilkS or drawing.GetLayer() == Layers.B_SilkS) and
-                not drawing.HitTest(hitbox, True, 0))
-
-    def GetTabOffsets(self, other_board, box, outline_thickness):
-        # Offsets of the tabs
-        tab_ver_offsets = []
-        tab_hor_offsets = []
-        # Get the width and height of the board
-        board_w = box.GetWidth()
-        board_h = box.GetHeight()
-
-        if self.settings.tab_mode == PanelSettings.TABS_SPACE_EVENLY:
-            # Space the tabs evenly over the sides of the board
-            tab_ver_offsets.extend(self.SpaceItemsEvenly(0, board_w, self.settings.tabs_x))
-            tab_hor_offsets.extend(self.SpaceItemsEvenly(0, board_h, self.settings.tabs_y))
-        elif self.settings.tab_mode == PanelSettings.TABS_SPACE_AROUND:
-            # Space the tabs with equal space around them
-            tab_ver_offsets.extend(self.SpaceItemsAround(0, board_w, self.settings.tabs_x))
-            tab_hor_offsets.extend(self.SpaceItemsAround(0, board_h, self.settings.tabs_y))
-        elif self.settings.tab_mode == PanelSettings.TABS_SPACE_AUTO:
-            # Find the ranges of the board edges which follow the bounding box
-            overlap_ver, overlap_hor = self.FindBoardEdgeRanges(other_board, box)
-
-            # Distribute the vertical tabs based on the ranges
-            tabs_ver_dist = self.ScoreDistributeTabs(overlap_ver, self.settings.tabs_x)
-            for i, count in enumerate(tabs_ver_dist):
-                if count > 0:
-                    tab_ver_offsets.extend(self.SpaceItemsAround(overlap_ver[i][0], overlap_ver[i][1], count))
-            # Distribute the horizontal tabs based on the ranges
-            tabs_hor_dist = self.ScoreDistributeTabs(overlap_hor, self.settings.tabs_y)
-            for i, count in enumerate(tabs_hor_dist):
-                if count > 0:
-                    tab_hor_offsets.extend(self.SpaceItemsAround(overlap_hor[i][0], overlap_hor[i][1], count))
-
-        return (tab_ver_offsets, tab_hor_offsets)
-
-    def SpaceItemsAround(self, low, high, count):
-        # Space the items with equal space around each item
-        result = []
-        spacing = (high - low) / (count * 2)
-        for t in range(count):
-            result.append(low + (t*2+1) * spacing)
-        return result
-
-    def SpaceItemsEvenly(self, low, high, count):
-        # Space the items with equal distance between them
-        result = []
-        spacing = (high - low) / (count + 1)
-        for t in range(count):
-            result.append(low + (t+1) * spacing)
-        return result
-
-    def FindBoardEdgeRanges(self, other_board, box):
-        # Get the origin of the board
-        origin_point = box.GetOrigin()
-        # Get the width and heigth of the board
-        board_w = box.GetWidth()
-        board_h = box.GetHeight()
-
-        # Hit rectangle to match the top edge
-        rect_top = EDA_RECT(origin_point, wxSize(board_w, 0))
-        rect_top.Inflate(0, 10)
-        # Hit rectangle to match the left edge
-        rect_left = EDA_RECT(origin_point, wxSize(0, board_h))
-        rect_left.Inflate(10, 0)
-        # Hit rectangle to match the bottom edge
-        rect_bottom = EDA_RECT(origin_point + wxPoint(0, board_h), wxSize(board_w, 0))
-        rect_bottom.Inflate(0, 10)
-        # Hit rectangle to match the right edge
-        rect_rigth = EDA_RECT(origin_point + wxPoint(board_w, 0), wxSize(0, board_h))
-        rect_rigth.Inflate(10, 0)
-        # List for all the hits of each edge
-        hits_top = []
-        hits_left = []
-        hits_bottom = []
-        hits_right = []
-
-        # Check each drawing in the board
-        for drawing in other_board.GetDrawings():
-            # Make sure the drawing is a line segment and is on the Edge_Cuts layer
-            if type(drawing) == DRAWSEGMENT and drawing.GetShape() == DrawSegmentShape.Segment and drawing.GetLayer() == Layers.Edge_Cuts:
-                start = drawing.GetStart() - origin_point
-                end = drawing.GetEnd() - origin_point
-                # Check if this drawing hits any of the edges
-                if drawing.HitTest(rect_top, True, 0):
-                    hits_top.append((start[0], end[0]) if start[0] < end[0] else (end[0], start[0]))
-                elif drawing.HitTest(rect_left, True, 0):
-                    hits_left.append((start[1], end[1]) if start[1] < end[1] else (end[1], start[1]))
-                elif drawing.HitTest(rect_bottom, True, 0):
-                    hits_bottom.append((start[0], end[0]) if start[0] < end[0] else (end[0], start[0]))
-                elif drawing.HitTest(rect_rigth, True, 0):
-                    hits_right.append((start[1], end[1]) if start[1] < end[1] else (end[1], start[1]))
-
-        # Sort all the ranges that were found
-        hits_top.sort()
-        hits_left.sort()
-        hits_bottom.sort()
-        hits_right.sort()
+    def GetTabOffsets(self, sources):
+        # Tab offsets which suit every orientation of the board in the panel. The orientations differ by
+        # 180 degrees, so they share the size of the bounding box and each is only analyzed once.
+        board_w = sources[0].GetWidth()
+        board_h = sources[0].GetHeight()
+        mode = self.settings.tab_mode
+        # Find the ranges of the board edges which follow the bounding box in every orientation
+        edge_ranges = None
+        if mode in (PanelSettings.TABS_SPACE_AUTO, PanelSettings.TABS_OPTIMIZE):
+            edge_ranges = self.FindBoardEdgeRanges(sources[0])
+            f = lambda r: r[1] - r[0] > self.settings.tab_width
+            for source in sources[1:]:
+                edge_ranges = tuple([r for r in IntersectRanges(a, b) if f(r)]
+                                    for a, b in zip(edge_ranges, self.FindBoardEdgeRanges(source)))
+        if mode != PanelSettings.TABS_OPTIMIZE:
+            offsets = TabOffsets(self.settings, board_w, board_h, edge_ranges)
+            return self.CheckTabClearance(sources, offsets, edge_ranges)
+
+        # Keep the tabs away from the parts near the edges
+        keepouts = [self.GetKeepouts(source) for source in sources]
+        half = self.settings.tab_width // 2
+        # The vertical tabs connect to the top and the bottom edge
+        clearance_ver = lambda x: min(
+            k.Clearance(x - half, y, x + half, y) for k in keepouts for y in (0, board_h))
+        # The horizontal tabs connect to the left and the right edge
+        clearance_hor = lambda y: min(
+            k.Clearance(x, y - half, x, y + half) for k in keepouts for x in (0, board_w))
+        offsets = TabOffsets(self.settings, board_w, board_h, edge_ranges, clearance_ver, clearance_hor)
+        return self.CheckTabClearance(sources, offsets, edge_ranges)
+
+    def CheckTabClearance(self, sources, offsets, edge_ranges):
+        # Check the copper around every tab and its mouse bite holes before anything is built. Every copy
+        # is one of the orientations moved, so the tabs only need to be checked once against each of them.
+        required = self.settings.tab_clearance
+        if required <= 0:
+            return offsets
+        board_w = sources[0].GetWidth()
+        board_h = sources[0].GetHeight()
+        coppers = [self.GetCopperKeepouts(source) for source in sources]
+        half = self.settings.tab_width // 2
+        inset = self.settings.mousebite_inset
+        radius = MOUSEBITE_HOLE // 2
+        # Positions of the holes along the tab, the rows are inset from the edges of both boards
+        along = sorted(set(a for a, _ in MouseBitePattern(
+            TAB_HORIZONTAL_CUT, self.settings.tab_width, self.settings.spacing_width,
+            self.settings.mousebite_pitch, inset)))
+
+        def clearance(offset, length, box):
+            # Clearance of a tab at the offset along the edges at 0 and at the length across the board,
+            # the box function turns a range along the edge and a position across it into a box
+            c = min(copper.Clearance(*box(offset - half, offset + half, edge)) for copper in coppers for edge in (0, length))
+            for copper in coppers:
+                for a in along:
+                    for across in (-inset, length + inset):
+                        c = min(c, copper.Clearance(*box(offset + a, offset + a, across)) - radius)
+            return c
+
+        # The vertical tabs connect to the top and the bottom edge, the horizontal tabs to the left and
+        # the right edge
+        clearance_ver = lambda x: clearance(x, board_h, lambda low, high, y: (low, y, high, y))
+        clearance_hor = lambda y: clearance(y, board_w, lambda low, high, x: (x, low, x, high))
+        # The tabs can only move along the parts of the edges which follow the bounding box
+        ranges_ver, ranges_hor = edge_ranges if edge_ranges is not None else ([(0, board_w)], [(0, board_h)])
+        checked = []
+        for direction, tabs, fn, ranges in ((TAB_HORIZONTAL_CUT, offsets[0], clearance_ver, ranges_ver),
+                                            (TAB_VERTICAL_CUT, offsets[1], clearance_hor, ranges_hor)):
+            if self.settings.move_crowded_tabs:
+                tabs, crowded = ShiftTabs(tabs, ranges, self.settings.tab_width, fn, required)
+            else:
+                crowded = [(o, c) for o, c in ((o, fn(o)) for o in tabs) if c < required]
+            self.crowded_tabs.extend((direction, o, max(c, 0)) for o, c in crowded)
+            checked.append(tabs)
+        self.stats.Count('crowded_tabs', len(self.crowded_tabs))
+        return tuple(checked)
+
+    def GetKeepouts(self, source):
+        # The parts near the edges only depend on the source board, so they are indexed once
+        margin = self.settings.tab_clearance
+        if margin not in source.keepouts:
+            keepouts = KeepoutIndex(source.box, margin, max(margin, self.settings.tab_width) * 4)
+            keepouts.Build(source.board)
+            source.keepouts[margin] = keepouts
+            self.stats.Count('keepout_items', len(keepouts))
+        return source.keepouts[margin]
+
+    def CrowdedTabsMessage(self):
+        # Description of the tabs which are too close to the copper, one line per tab
+        edges = {TAB_HORIZONTAL_CUT: 'top and bottom', TAB_VERTICAL_CUT: 'left and right'}
+        return '\n'.join('Tab at {:.2f} mm on the {} edges has {:.2f} mm clearance to the copper'.format(
+            ToMM(offset), edges[direction], ToMM(clearance)) for direction, offset, clearance in self.crowded_tabs)
+
+    def GetCopperKeepouts(self, source):
+        # The copper near the edges, indexed once with room for the mouse bite holes outside the edges
+        margin = self.settings.tab_clearance + self.settings.mousebite_inset + MOUSEBITE_HOLE // 2
+        key = ('copper', margin)
+        if key not in source.keepouts:
+            copper = KeepoutIndex(source.box, margin, max(margin, self.settings.tab_width) * 4)
+            copper.BuildCopper(source.board)
+            source.keepouts[key] = copper
+            self.stats.Count('copper_items', len(copper))
+        return source.keepouts[key]
+
+    def FindBoardEdgeRanges(self, source):
+        # The ranges only depend on the source board, so they are computed once
+        if source.edge_ranges is None:
+            source.edge_ranges = self.ScanBoardEdgeRanges(source)
+        overlap_ver, overlap_hor = source.edge_ranges
 
         # Filter out any range that is smaller than a single tab
         f = lambda i: i[1]-i[0] > self.settings.tab_width
-        overlap_ver = filter(f, self.FindOverlappingRanges(hits_top, hits_bottom))
-        overlap_hor = filter(f, self.FindOverlappingRanges(hits_left, hits_right))
-        # Return the ranges that were found
-        return (overlap_ver, overlap_hor)
-
-    def FindOverlappingRanges(self, a, b):
-        from collections import deque
-        # Put the ranges is a queue
-        aq, bq = deque(a), deque(b)
-        results = []
-        # While there is an item is both of the queues
-        while len(aq) and len(bq):
-            # Take the first item of the queues
-            ia = aq.popleft()
-            ib = bq.popleft()
-
-            # Determine the overlapping range
-            mx = max(ia[0], ib[0])
-            mn = min(ia[1], ib[1])
-            diff = mx-mn
-
-            if diff > 0:
-                # If there is no overlap, return the range with the highest end
-                if ib[1] < ia[1]:
-                    aq.appendleft(ia)
-                else:
-                    bq.appendleft(ib)
-            else:
-                # If there is overlap, insert the overlap into the results
-                results.append((mx, mn))
-                # Return a partial range to the queue if it is not consumed
-                if mn < ia[1]:
-                    aq.appendleft((mn+1, ia[1]))
-                if mn < ib[1]:
-                    bq.appendleft((mn+1, ib[1]))
-
-        # Return the overlapping ranges
-        return results
-
-    def ScoreDistributeTabs(self, ranges, count):
-        # Set the initial scores to the width of the range
-        score_orig = [b - a for a, b in ranges]
-        score = score_orig[:]
-        # Set the number of tabs for each range to zero
-        tabs = [0 for _ in ranges]
-
-        # Distribute the tabs
-        for _ in range(count):
-            # Find the range with the highest score
-            hs, hs_idx = 0, 0
-            for i, s in enumerate(score):
-                if s > hs:
-                    hs, hs_idx = s, i
-            # Assign a tab to the range
-            tabs[hs_idx] += 1
-            # Update the score of the range based on the number of tabs
-            score[hs_idx] = (score_orig[hs_idx] - tabs[hs_idx] * self.settings.tab_width) / (tabs[hs_idx] + 1)
-
-        # Return the number of tabs for each range
-        return tabs
+        return ([r for r in overlap_ver if f(r)], [r for r in overlap_hor if f(r)])
+
+    def ScanBoardEdgeRanges(self, source):
+        outline = source.GetOutline()
+        self.stats.Count('outline_segments', len(outline))
+        # Collect the outline on each side of the bounding box and sweep for the overlapping parts
+        box = source.box
+        return FindEdgeRanges(outline, box.GetLeft(), box.GetTop(), box.GetRight(), box.GetBottom())
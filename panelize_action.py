@@ -2,6 +2,8 @@ import pcbnew
 import os
 import wx
 from .panelize import Panel, PanelSettings
+from .instrumentation import PanelStats
+from .source_board import SourceBoardCache
 from .panelize_gui import PanelizePluginDialog
 
 class PanelizePlugin(pcbnew.ActionPlugin):
@@ -13,10 +15,16 @@ class PanelizePlugin(pcbnew.ActionPlugin):
         self.icon_file_name = os.path.join(os.path.dirname(__file__), 'panelize_plugin.png')
 
         self.settings_history = PanelSettings("")
+        # Loaded and analyzed source boards, reused while the file does not change
+        self.board_cache = SourceBoardCache()
+        # Panel created by the last run, which can be updated in place
+        self.last_panel = None
 
     def Run(self):
-        # Check if the current board is empty
-        if not pcbnew.GetBoard().IsEmpty():
+        # A board which still holds the last created panel can be updated, other boards need to be empty
+        board = pcbnew.GetBoard()
+        update = self.last_panel is not None and self.last_panel.IsPanelBoard(board)
+        if not update and not board.IsEmpty():
             dlg = wx.MessageDialog(None,
                 'A panel cannot be created when the board is non-empty. Delete everything, or create a new empty board.',
                 'Cannot create panel',
@@ -27,20 +35,42 @@ class PanelizePlugin(pcbnew.ActionPlugin):
             return
 
         # Ask the user for the board and settings
-        panelize_dialog = PanelizePluginDialog()
+        panelize_dialog = PanelizePluginDialog(board_cache=self.board_cache)
         panelize_dialog.LoadSettings(self.settings_history)
+        panelize_dialog.UpdatePreview()
         ok = panelize_dialog.ShowModal()
         if not ok:
             panelize_dialog.Destroy()
             return
         settings = panelize_dialog.GetSettings()
+        stats = PanelStats() if panelize_dialog.GetShowReport() else None
         panelize_dialog.Destroy()
         self.settings_history = settings
 
-        # Load the board to be panelized
+        # Load the board to be panelized. All changes are made within this run, so KiCad records them
+        # as a single undo step and refreshes the view once afterwards.
         try:
-            Panel(settings).create_panel()
-        except IOError:
+            source = self.board_cache.GetSources(settings)
+            if update:
+                panel = self.last_panel
+                previous = (panel.settings, panel.sources)
+                steps = panel.update_panel_steps(settings, source, stats)
+            else:
+                panel = Panel(settings, board, stats)
+                steps = panel.create_panel_steps(source)
+
+            if not self.RunSteps(steps):
+                # Put back the settings of the panel which was being updated first, so the rollback
+                # removes what was created with them, then rebuild that panel
+                if update:
+                    panel.settings = previous[0]
+                    self.settings_history = previous[0]
+                panel.Rollback()
+                if update:
+                    panel.create_panel(previous[1])
+                return
+            self.last_panel = panel
+        except (IOError, OSError):
             dlg = wx.MessageDialog(None,
                 'The board that was selected could not be opened.',
                 'Cannot open board',
@@ -48,3 +78,39 @@ class PanelizePlugin(pcbnew.ActionPlugin):
             )
             dlg.ShowModal()
             dlg.Destroy()
+            return
+
+        if panel.crowded_tabs:
+            dlg = wx.MessageDialog(None, panel.CrowdedTabsMessage(), 'Tabs close to copper', wx.OK | wx.ICON_WARNING)
+            dlg.ShowModal()
+            dlg.Destroy()
+        if stats is not None:
+            self.ShowReport(stats)
+
+    def RunSteps(self, steps):
+        # Run the panel creation steps while showing the progress, returns False when cancelled
+        dlg = wx.ProgressDialog('Create Panel', 'Loading the board', 100, None,
+            wx.PD_APP_MODAL | wx.PD_CAN_ABORT | wx.PD_ELAPSED_TIME | wx.PD_REMAINING_TIME)
+        try:
+            for done, total, message in steps:
+                keep_going, _ = dlg.Update(100 * done // max(total, 1), message)
+                if not keep_going:
+                    steps.close()
+                    return False
+            return True
+        finally:
+            dlg.Destroy()
+
+    def ShowReport(self, stats):
+        # Show the timings and counters of the run, and optionally save them
+        dlg = wx.MessageDialog(None, stats.Format(), 'Panel timing report', wx.YES_NO)
+        dlg.SetYesNoLabels('Save report', 'Close')
+        save = dlg.ShowModal() == wx.ID_YES
+        dlg.Destroy()
+        if not save:
+            return
+
+        dlg = wx.FileDialog(None, 'Save timing report', os.path.expanduser('~'), 'panel_report.json', '*.json', wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
+        if dlg.ShowModal() == wx.ID_OK:
+            stats.Write(dlg.GetPath())
+        dlg.Destroy()
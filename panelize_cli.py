@@ -0,0 +1,333 @@
+import argparse
+import json
+import os
+import shutil
+import multiprocessing
+import sys
+from pcbnew import *
+from .panelize import Panel, PanelSettings
+from .constants import Layers
+from .instrumentation import PanelStats, NullStats
+from .source_board import SourceBoardCache
+from .layout_solver import LayoutSolver
+from .pcb_writer import PanelWriter
+from .fab_output import FabOutput
+from .panel_cache import PanelCache, PanelKey, SamePanel
+
+# Settings which are given in millimeters on the command line and in job files
+LENGTH_SETTINGS = [
+    'outline_width', 'outline_hole', 'spacing_width', 'tab_width',
+    'fiducial_mask', 'fiducial_copper', 'mousebite_pitch', 'mousebite_inset',
+    'tab_clearance', 'pack_width',
+]
+# Settings which are given as plain values
+VALUE_SETTINGS = [
+    'boards_x', 'boards_y', 'tabs_x', 'tabs_y', 'tab_mode', 'trim_silkscreen',
+    'group_tab_holes', 'rotation', 'keep_zone_fills', 'separate_nets', 'vscore', 'vscore_layer', 'move_crowded_tabs', 'alternate',
+]
+TAB_MODES = {
+    'evenly': PanelSettings.TABS_SPACE_EVENLY,
+    'around': PanelSettings.TABS_SPACE_AROUND,
+    'auto': PanelSettings.TABS_SPACE_AUTO,
+    'optimize': PanelSettings.TABS_OPTIMIZE,
+}
+# Which boards are turned by another 180 degrees
+ALTERNATE_MODES = {
+    'none': PanelSettings.ALTERNATE_NONE,
+    'columns': PanelSettings.ALTERNATE_COLUMNS,
+    'rows': PanelSettings.ALTERNATE_ROWS,
+}
+# Layers which can hold the V-score lines
+VSCORE_LAYERS = {
+    'Dwgs.User': Layers.Dwgs_User,
+    'Cmts.User': Layers.Cmts_User,
+    'Eco1.User': Layers.Eco1_User,
+    'Eco2.User': Layers.Eco2_User,
+}
+# Settings which are given by name, the names of every setting
+NAMED_SETTINGS = {
+    'tab_mode': TAB_MODES,
+    'alternate': ALTERNATE_MODES,
+    'vscore_layer': VSCORE_LAYERS,
+}
+
+# Job parameters besides the settings which change the panel
+SOLVER_KEYS = ['max_panel_width', 'max_panel_height', 'prices']
+# Size of the panel cache in megabytes
+DEFAULT_CACHE_SIZE = 1024
+
+# Source boards loaded by this process, jobs for variants of the same design share them
+source_cache = SourceBoardCache()
+
+def settings_from_job(job):
+    # Start from the recipe of the job, if any, the settings of the job override it
+    if job.get('recipe'):
+        settings = PanelSettings.Load(job['recipe'])
+        if job.get('board_file'):
+            settings.board_file = job['board_file']
+        if job.get('designs'):
+            settings.designs = []
+    else:
+        settings = PanelSettings(job.get('board_file') or '')
+    for name in LENGTH_SETTINGS:
+        if job.get(name) is not None:
+            setattr(settings, name, FromMM(job[name]))
+    for name in VALUE_SETTINGS:
+        if job.get(name) is not None:
+            setattr(settings, name, named_value(name, job[name]) if name in NAMED_SETTINGS else job[name])
+    # Designs of a mixed panel, as {"board_file": ..., "quantity": ...} or [board_file, quantity]
+    for design in job.get('designs') or []:
+        if isinstance(design, dict):
+            settings.designs.append((design['board_file'], int(design.get('quantity', 1))))
+        else:
+            settings.designs.append((design[0], int(design[1])))
+    return settings
+
+def named_value(name, value):
+    # The value of a setting which is given by name, or as one of the values. An unknown name is an error,
+    # as it would otherwise be ignored or fail much later.
+    values = NAMED_SETTINGS[name]
+    if value in values:
+        return values[value]
+    if value not in values.values():
+        raise ValueError('Unknown {} "{}", use one of: {}'.format(name, value, ', '.join(sorted(values))))
+    return value
+
+def job_name(job):
+    if job.get('designs'):
+        return ', '.join(d['board_file'] if isinstance(d, dict) else d[0] for d in job['designs'])
+    return job.get('board_file') or job.get('recipe')
+
+def solver_from_job(job, settings):
+    # Search the board counts and rotation when a maximum panel size or a price table is given
+    max_width = job.get('max_panel_width')
+    max_height = job.get('max_panel_height')
+    prices = job.get('prices')
+    if max_width is None and max_height is None and not prices:
+        return None
+    if max_width is not None and max_height is None:
+        max_height = max_width
+    if max_height is not None and max_width is None:
+        max_width = max_height
+    return LayoutSolver(
+        settings,
+        FromMM(max_width) if max_width is not None else None,
+        FromMM(max_height) if max_height is not None else None,
+        [(FromMM(w), FromMM(h), price) for w, h, price in prices or []]
+    )
+
+def run_job(job):
+    try:
+        settings = settings_from_job(job)
+        if job.get('save_recipe'):
+            settings.Save(job['save_recipe'])
+        stats = PanelStats() if job.get('report') else None
+        if job.get('gerber'):
+            if job.get('cache'):
+                return (job, 'Gerber output is not cached, leave out the cache')
+            return run_gerber_job(job, settings, stats)
+        if job.get('cache'):
+            error, warnings = run_cached_job(job, settings, stats)
+        else:
+            error, warnings = build_panel(job, settings, stats, job['output'])
+        warn_crowded_tabs(job, warnings)
+        # Write the timings and counters of the run, also when the panel was taken from the cache
+        if error is None and stats is not None:
+            stats.Write(job['report'])
+        return (job, error)
+    except (IOError, OSError) as e:
+        return (job, 'Cannot open board: {}'.format(e))
+    except Exception as e:
+        return (job, 'Failed: {}'.format(e))
+
+def build_panel(job, settings, stats, file_name):
+    # Create the panel file of the job, returns an error message or None and the warnings of the panel
+    if job.get('direct'):
+        return write_direct_panel(job, settings, stats, file_name), ''
+    return create_board_panel(job, settings, stats, file_name)
+
+def create_board_panel(job, settings, stats, file_name):
+    # Create the panel in a fresh board instead of the board open in pcbnew
+    board = BOARD()
+    source = source_cache.GetSources(settings)
+    solver = solver_from_job(job, settings)
+    if solver is not None:
+        if settings.designs:
+            return 'A layout search cannot be combined with a mixed panel', ''
+        settings = solver.SolveSource(source)
+        if settings is None:
+            return 'No panel layout fits the maximum panel size', ''
+    panel = Panel(settings, board, stats)
+    panel.create_panel(source)
+    SaveBoard(file_name, board)
+    return None, panel.CrowdedTabsMessage()
+
+def write_direct_panel(job, settings, stats, file_name):
+    # Write the panel file straight from the source files, without building the board in pcbnew
+    writer = PanelWriter(settings, stats)
+    solver = solver_from_job(job, settings)
+    if solver is not None:
+        if settings.designs:
+            return 'A layout search cannot be combined with a mixed panel'
+        source = writer.LoadSources()
+        settings = solver.SolveSource(source)
+        if settings is None:
+            return 'No panel layout fits the maximum panel size'
+        writer.settings = settings
+        writer.Write(file_name, source)
+    else:
+        writer.Write(file_name)
+    return None
+
+def run_cached_job(job, settings, stats):
+    # Copy the panel from the cache when the same panel was created before, otherwise create and store it.
+    # Returns an error message or None and the warnings of the panel, which are stored along with it.
+    cache = PanelCache(job['cache'], int((job.get('cache_size') or DEFAULT_CACHE_SIZE) * (1 << 20)))
+    phases = stats if stats is not None else NullStats()
+    with phases.Phase('cache'):
+        key = PanelKey(settings, 'direct' if job.get('direct') else 'board', dict((name, job.get(name)) for name in SOLVER_KEYS))
+        hit = cache.Get(key, job['output'])
+    phases.Count('cache_hits' if hit else 'cache_misses')
+    if not hit:
+        error, warnings = build_panel(job, settings, stats, job['output'])
+        if error is None:
+            cache.Put(key, job['output'], warnings)
+        return error, warnings
+    if not job.get('verify_cache'):
+        return None, cache.Warnings(key)
+
+    # Create the panel again and compare it with the stored one
+    verify_name = os.path.splitext(job['output'])[0] + '-verify.kicad_pcb'
+    error, warnings = build_panel(job, settings, stats, verify_name)
+    if error is not None:
+        return error, warnings
+    try:
+        if SamePanel(job['output'], verify_name):
+            return None, warnings
+        cache.Put(key, verify_name, warnings)
+        shutil.copyfile(verify_name, job['output'])
+        return 'The cached panel differs from a new one, the cache entry was replaced', warnings
+    finally:
+        os.remove(verify_name)
+
+def run_gerber_job(job, settings, stats):
+    # Write the fabrication files of the panel into the output directory, named after the directory
+    source = source_cache.GetSources(settings)
+    solver = solver_from_job(job, settings)
+    if solver is not None:
+        if settings.designs:
+            return (job, 'A layout search cannot be combined with a mixed panel')
+        settings = solver.SolveSource(source)
+        if settings is None:
+            return (job, 'No panel layout fits the maximum panel size')
+    name = os.path.basename(os.path.normpath(job['output']))
+    output = FabOutput(settings, stats)
+    output.Write(job['output'], name, source)
+    warn_crowded_tabs(job, output.panel.CrowdedTabsMessage())
+    if stats is not None:
+        stats.Write(job['report'])
+    return (job, None)
+
+def warn_crowded_tabs(job, message):
+    # The panel is still created, the tabs which are too close to the copper are only reported
+    for line in message.splitlines():
+        sys.stderr.write('{}: warning: {}\n'.format(job_name(job), line))
+
+def run_jobs(jobs, processes=None):
+    if len(jobs) == 1 or processes == 1:
+        return [run_job(job) for job in jobs]
+    # Run every job in a separate worker process, each with its own pcbnew instance
+    pool = multiprocessing.Pool(processes)
+    try:
+        return list(pool.imap_unordered(run_job, jobs))
+    finally:
+        pool.close()
+        pool.join()
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Create panels of KiCad boards without the GUI')
+    parser.add_argument('board_file', nargs='?', help='board to be panelized')
+    parser.add_argument('-o', '--output', help='file name of the panel')
+    parser.add_argument('--jobs', help='JSON file with a list of panel jobs')
+    parser.add_argument('--report', help='write a JSON timing report of the run to this file')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--boards-x', type=int)
+    parser.add_argument('--boards-y', type=int)
+    parser.add_argument('--tabs-x', type=int)
+    parser.add_argument('--tabs-y', type=int)
+    parser.add_argument('--design', nargs=2, action='append', metavar=('BOARD_FILE', 'QUANTITY'),
+                        help='add a design to a mixed panel, can be given multiple times')
+    parser.add_argument('--tab-mode', choices=sorted(TAB_MODES))
+    parser.add_argument('--rotation', type=int, choices=[0, 90])
+    parser.add_argument('--alternate', choices=sorted(ALTERNATE_MODES),
+                        help='turn every other column or row of boards by another 180 degrees')
+    parser.add_argument('--max-panel-width', type=float, metavar='MM',
+                        help='choose the board counts and rotation to fit this panel width')
+    parser.add_argument('--max-panel-height', type=float, metavar='MM',
+                        help='choose the board counts and rotation to fit this panel height')
+    parser.add_argument('--prices', metavar='FILE',
+                        help='JSON list of [width, height, price] fabrication panels, to minimize the cost per board')
+    parser.add_argument('--direct', action='store_true', default=None,
+                        help='write the panel file directly from the KiCad 5 board files, without pcbnew')
+    parser.add_argument('--gerber', action='store_true', default=None,
+                        help='write Gerber and drill files with step and repeat blocks into the output directory')
+    parser.add_argument('--recipe', help='JSON settings file to start from, saved with --save-recipe')
+    parser.add_argument('--save-recipe', metavar='FILE', help='save the settings of the panel to this file')
+    parser.add_argument('--cache', metavar='DIR', help='reuse panels created before with the same boards and settings')
+    parser.add_argument('--cache-size', type=float, metavar='MB',
+                        help='size of the panel cache, the least recently used panels are removed beyond it')
+    parser.add_argument('--verify-cache', action='store_true', default=None,
+                        help='create cached panels again and check that they are the same')
+    parser.add_argument('--vscore', action='store_true', default=None,
+                        help='separate the boards with V-score lines instead of tabs, for rectangular boards')
+    parser.add_argument('--vscore-layer', choices=sorted(VSCORE_LAYERS), help='layer of the V-score lines')
+    parser.add_argument('--move-crowded-tabs', action='store_true', default=None,
+                        help='move the tabs which are closer than the tab clearance to the copper, instead of only reporting them')
+    parser.add_argument('--trim-silkscreen', action='store_true', default=None)
+    parser.add_argument('--group-tab-holes', action='store_true', default=None,
+                        help='put all holes of a tab in a single footprint')
+    parser.add_argument('--keep-zone-fills', action='store_true', default=None,
+                        help='keep the zone fills of the source board, only refill the zones near the tabs')
+    parser.add_argument('--separate-nets', action='store_true', default=None,
+                        help='give every board its own nets, prefixed with the board number')
+    for name in LENGTH_SETTINGS:
+        parser.add_argument('--' + name.replace('_', '-'), type=float, metavar='MM')
+    args = parser.parse_args(argv)
+
+    if args.jobs is None and ((args.board_file is None and not args.design and args.recipe is None) or args.output is None):
+        parser.error('either a board file, designs or a recipe and an output file, or a job file is required')
+    return args
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    if args.jobs is not None:
+        with open(args.jobs) as f:
+            jobs = json.load(f)
+    else:
+        jobs = [{
+            'board_file': args.board_file, 'output': args.output, 'report': args.report,
+            'max_panel_width': args.max_panel_width, 'max_panel_height': args.max_panel_height,
+            'designs': args.design, 'direct': args.direct, 'gerber': args.gerber,
+            'recipe': args.recipe, 'save_recipe': args.save_recipe,
+            'cache': args.cache, 'cache_size': args.cache_size, 'verify_cache': args.verify_cache,
+        }]
+        if args.prices is not None:
+            with open(args.prices) as f:
+                jobs[0]['prices'] = json.load(f)
+        # Settings given on the command line override the defaults
+        for name in LENGTH_SETTINGS + VALUE_SETTINGS:
+            jobs[0][name] = getattr(args, name)
+
+    failed = 0
+    for job, error in run_jobs(jobs, args.processes):
+        if error is None:
+            print('{} -> {}'.format(job_name(job), job['output']))
+        else:
+            sys.stderr.write('{}: {}\n'.format(job_name(job), error))
+            failed += 1
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,11 +2,18 @@ import pcbnew
 import wx
 import os
 from .panelize import PanelSettings
+from .panel_preview import PanelPreview, OutlineSnapshot, PlanPreview
+
+# Delay after the last change before the preview is updated, in milliseconds
+PREVIEW_DELAY = 150
 
 class PanelizePluginDialog(wx.Dialog):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, board_cache=None):
         wx.Dialog.__init__(self, parent, title='Create panelized board')
         self.Bind(wx.EVT_CLOSE, self.OnCancel, id=self.GetId())
+        # Source boards for the preview, loaded once for every selected file
+        self.board_cache = board_cache
+        self.snapshots = {}
 
         # Create a panel
         panel = wx.Panel(self)
@@ -36,6 +43,14 @@ class PanelizePluginDialog(wx.Dialog):
         self.boards_y = wx.SpinCtrl(panel, style=wx.SP_ARROW_KEYS, min=1, value='1')
         item_grid.Add(self.boards_y, 1, wx.EXPAND)
 
+        item_grid.Add(wx.StaticText(panel, label='Board rotation'), 1, wx.ALIGN_CENTRE_VERTICAL)
+        self.rotation = wx.Choice(panel, choices=['0 degrees', '90 degrees'])
+        item_grid.Add(self.rotation, 1, wx.EXPAND)
+
+        item_grid.Add(wx.StaticText(panel, label='Turn every other'), 1, wx.ALIGN_CENTRE_VERTICAL)
+        self.alternate = wx.Choice(panel, choices=['No boards', 'Column by 180 degrees', 'Row by 180 degrees'])
+        item_grid.Add(self.alternate, 1, wx.EXPAND)
+
         item_grid.Add(wx.StaticText(panel, label='Tabs horizontal', size=wx.Size(120, -1)), 1, wx.ALIGN_CENTRE_VERTICAL)
         self.tabs_y = wx.SpinCtrl(panel, style=wx.SP_ARROW_KEYS, value='1')
         item_grid.Add(self.tabs_y, 1, wx.EXPAND)
@@ -45,7 +60,7 @@ class PanelizePluginDialog(wx.Dialog):
         item_grid.Add(self.tabs_x, 1, wx.EXPAND)
 
         item_grid.Add(wx.StaticText(panel, label='Tab mode'), 1, wx.ALIGN_CENTRE_VERTICAL)
-        self.tab_mode = wx.Choice(panel, choices=['Space evenly', 'Space around', 'Automatic'])
+        self.tab_mode = wx.Choice(panel, choices=['Space evenly', 'Space around', 'Automatic', 'Optimized'])
         item_grid.Add(self.tab_mode, 1, wx.EXPAND)
 
         item_grid.Add(wx.StaticText(panel, label='Frame width (mm)'), 1, wx.ALIGN_CENTRE_VERTICAL)
@@ -68,10 +83,45 @@ class PanelizePluginDialog(wx.Dialog):
         self.tab_width.SetDigits(1)
         item_grid.Add(self.tab_width, 1, wx.EXPAND)
 
+        item_grid.Add(wx.StaticText(panel, label='Tab clearance (mm)'), 1, wx.ALIGN_CENTRE_VERTICAL)
+        self.tab_clearance = wx.SpinCtrlDouble(panel, style=wx.SP_ARROW_KEYS, min=0.0, inc=0.1, value='1.0')
+        self.tab_clearance.SetDigits(1)
+        item_grid.Add(self.tab_clearance, 1, wx.EXPAND)
+
+        item_grid.Add(wx.StaticText(panel, label='Move tabs away from copper'), 1, wx.ALIGN_CENTRE_VERTICAL)
+        self.move_crowded_tabs = wx.CheckBox(panel)
+        item_grid.Add(self.move_crowded_tabs, 1, wx.EXPAND)
+
+        item_grid.Add(wx.StaticText(panel, label='Mouse bite pitch (mm)', size=wx.Size(140, -1)), 1, wx.ALIGN_CENTRE_VERTICAL)
+        self.mousebite_pitch = wx.SpinCtrlDouble(panel, style=wx.SP_ARROW_KEYS, min=0.1, inc=0.1, value='1.0')
+        self.mousebite_pitch.SetDigits(1)
+        item_grid.Add(self.mousebite_pitch, 1, wx.EXPAND)
+
+        item_grid.Add(wx.StaticText(panel, label='Mouse bite inset (mm)', size=wx.Size(140, -1)), 1, wx.ALIGN_CENTRE_VERTICAL)
+        self.mousebite_inset = wx.SpinCtrlDouble(panel, style=wx.SP_ARROW_KEYS, min=0.0, inc=0.05, value='0.1')
+        self.mousebite_inset.SetDigits(2)
+        item_grid.Add(self.mousebite_inset, 1, wx.EXPAND)
+
+        item_grid.Add(wx.StaticText(panel, label='V-score instead of tabs'), 1, wx.ALIGN_CENTRE_VERTICAL)
+        self.vscore = wx.CheckBox(panel)
+        item_grid.Add(self.vscore, 1, wx.EXPAND)
+
+        item_grid.Add(wx.StaticText(panel, label='Group tab holes'), 1, wx.ALIGN_CENTRE_VERTICAL)
+        self.group_tab_holes = wx.CheckBox(panel)
+        item_grid.Add(self.group_tab_holes, 1, wx.EXPAND)
+
         item_grid.Add(wx.StaticText(panel, label='Trim silkscreen'), 1, wx.ALIGN_CENTRE_VERTICAL)
         self.trim_silkscreen = wx.CheckBox(panel)
         item_grid.Add(self.trim_silkscreen, 1, wx.EXPAND)
 
+        item_grid.Add(wx.StaticText(panel, label='Keep zone fills'), 1, wx.ALIGN_CENTRE_VERTICAL)
+        self.keep_zone_fills = wx.CheckBox(panel)
+        item_grid.Add(self.keep_zone_fills, 1, wx.EXPAND)
+
+        item_grid.Add(wx.StaticText(panel, label='Separate nets per board'), 1, wx.ALIGN_CENTRE_VERTICAL)
+        self.separate_nets = wx.CheckBox(panel)
+        item_grid.Add(self.separate_nets, 1, wx.EXPAND)
+
         item_grid.Add(wx.StaticText(panel, label='Fiducial mask (mm)', size=wx.Size(140, -1)), 1, wx.ALIGN_CENTRE_VERTICAL)
         self.fiducial_mask = wx.SpinCtrlDouble(panel, style=wx.SP_ARROW_KEYS, min=0.1, inc=0.1, value='2.5')
         self.fiducial_mask.SetDigits(1)
@@ -82,6 +132,10 @@ class PanelizePluginDialog(wx.Dialog):
         self.fiducial_copper.SetDigits(1)
         item_grid.Add(self.fiducial_copper, 1, wx.EXPAND)
 
+        item_grid.Add(wx.StaticText(panel, label='Show timing report'), 1, wx.ALIGN_CENTRE_VERTICAL)
+        self.show_report = wx.CheckBox(panel)
+        item_grid.Add(self.show_report, 1, wx.EXPAND)
+
         # Create two buttons
         button_box = wx.BoxSizer(wx.HORIZONTAL)
         btn_cancel = wx.Button(panel, label='Cancel')
@@ -91,8 +145,19 @@ class PanelizePluginDialog(wx.Dialog):
         self.Bind(wx.EVT_BUTTON, self.OnCreate, id=btn_create.GetId())
         button_box.Add(btn_create, 1)
 
+        # Preview of the panel next to the options, updated shortly after the last change
+        self.preview = PanelPreview(panel)
+        self.preview_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.UpdatePreview, self.preview_timer)
+        for event in (wx.EVT_SPINCTRL, wx.EVT_SPINCTRLDOUBLE, wx.EVT_CHOICE, wx.EVT_CHECKBOX):
+            self.Bind(event, self.OnSettingChanged)
+        self.file_name.Bind(wx.EVT_TEXT, self.OnSettingChanged)
+
         # Add the items to the vbox
-        vbox.Add(item_grid, 1, wx.EXPAND | wx.ALIGN_CENTRE | wx.ALL, 10)
+        options_box = wx.BoxSizer(wx.HORIZONTAL)
+        options_box.Add(item_grid, 1, wx.EXPAND | wx.ALIGN_CENTRE | wx.ALL, 10)
+        options_box.Add(self.preview, 1, wx.EXPAND | wx.ALL, 10)
+        vbox.Add(options_box, 1, wx.EXPAND)
         vbox.Add(button_box, 0, wx.ALIGN_RIGHT | wx.LEFT | wx.RIGHT | wx.BOTTOM, 20)
         # Make the vbox
         panel.SetSizer(vbox)
@@ -100,11 +165,38 @@ class PanelizePluginDialog(wx.Dialog):
         self.Centre()
 
     def OnCancel(self, event):
+        self.preview_timer.Stop()
         self.EndModal(0)
 
     def OnCreate(self, event):
+        self.preview_timer.Stop()
         self.EndModal(1)
 
+    def OnSettingChanged(self, event):
+        # Restart the delay, so a series of changes only updates the preview once
+        self.preview_timer.StartOnce(PREVIEW_DELAY)
+        event.Skip()
+
+    def GetSnapshot(self, file_name):
+        # The outline of the board file, or None when it cannot be loaded
+        if self.board_cache is None or not os.path.isfile(file_name):
+            return None
+        key = self.board_cache.Key(file_name)
+        if key not in self.snapshots:
+            try:
+                self.snapshots = {key: OutlineSnapshot.FromSource(self.board_cache.Get(file_name))}
+            except (IOError, OSError):
+                return None
+        return self.snapshots[key]
+
+    def UpdatePreview(self, event=None):
+        settings = self.GetSettings()
+        snapshot = self.GetSnapshot(settings.board_file)
+        if snapshot is None:
+            self.preview.SetMessage('Select a board file' if self.board_cache is not None else 'No preview available')
+            return
+        self.preview.SetPlan(PlanPreview(settings, snapshot), snapshot, settings)
+
     def SelectFile(self, event):
         search_path = os.path.expanduser("~")
         if self.file_name.GetValue() != "":
@@ -118,6 +210,8 @@ class PanelizePluginDialog(wx.Dialog):
         settings = PanelSettings(self.file_name.GetValue())
         settings.boards_x = self.boards_x.GetValue()
         settings.boards_y = self.boards_y.GetValue()
+        settings.rotation = 90 if self.rotation.GetSelection() == 1 else 0
+        settings.alternate = self.alternate.GetSelection()
         settings.tabs_x = self.tabs_x.GetValue()
         settings.tabs_y = self.tabs_y.GetValue()
         settings.outline_width = pcbnew.FromMM(self.outline_width.GetValue())
@@ -125,15 +219,28 @@ class PanelizePluginDialog(wx.Dialog):
         settings.spacing_width = pcbnew.FromMM(self.spacing_width.GetValue())
         settings.tab_width = pcbnew.FromMM(self.tab_width.GetValue())
         settings.tab_mode = self.tab_mode.GetSelection()
+        settings.tab_clearance = pcbnew.FromMM(self.tab_clearance.GetValue())
+        settings.move_crowded_tabs = self.move_crowded_tabs.IsChecked()
+        settings.mousebite_pitch = pcbnew.FromMM(self.mousebite_pitch.GetValue())
+        settings.mousebite_inset = pcbnew.FromMM(self.mousebite_inset.GetValue())
+        settings.vscore = self.vscore.IsChecked()
+        settings.group_tab_holes = self.group_tab_holes.IsChecked()
         settings.trim_silkscreen = self.trim_silkscreen.IsChecked()
+        settings.keep_zone_fills = self.keep_zone_fills.IsChecked()
+        settings.separate_nets = self.separate_nets.IsChecked()
         settings.fiducial_mask = pcbnew.FromMM(self.fiducial_mask.GetValue())
         settings.fiducial_copper = pcbnew.FromMM(self.fiducial_copper.GetValue())
         return settings
 
+    def GetShowReport(self):
+        return self.show_report.IsChecked()
+
     def LoadSettings(self, settings):
         self.file_name.SetValue(settings.board_file)
         self.boards_x.SetValue(settings.boards_x)
         self.boards_y.SetValue(settings.boards_y)
+        self.rotation.SetSelection(1 if settings.rotation == 90 else 0)
+        self.alternate.SetSelection(settings.alternate)
         self.tabs_x.SetValue(settings.tabs_x)
         self.tabs_y.SetValue(settings.tabs_y)
         self.outline_width.SetValue(pcbnew.ToMM(settings.outline_width))
@@ -141,6 +248,14 @@ class PanelizePluginDialog(wx.Dialog):
         self.spacing_width.SetValue(pcbnew.ToMM(settings.spacing_width))
         self.tab_width.SetValue(pcbnew.ToMM(settings.tab_width))
         self.tab_mode.SetSelection(settings.tab_mode)
+        self.tab_clearance.SetValue(pcbnew.ToMM(settings.tab_clearance))
+        self.move_crowded_tabs.SetValue(settings.move_crowded_tabs)
+        self.mousebite_pitch.SetValue(pcbnew.ToMM(settings.mousebite_pitch))
+        self.mousebite_inset.SetValue(pcbnew.ToMM(settings.mousebite_inset))
+        self.vscore.SetValue(settings.vscore)
+        self.group_tab_holes.SetValue(settings.group_tab_holes)
         self.trim_silkscreen.SetValue(settings.trim_silkscreen)
+        self.keep_zone_fills.SetValue(settings.keep_zone_fills)
+        self.separate_nets.SetValue(settings.separate_nets)
         self.fiducial_mask.SetValue(pcbnew.ToMM(settings.fiducial_mask))
         self.fiducial_copper.SetValue(pcbnew.ToMM(settings.fiducial_copper))
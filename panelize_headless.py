@@ -0,0 +1,21 @@
+# Command line entry point which does not run the package __init__, so nothing of the GUI is loaded even
+# when wx is installed:
+#
+#   python panelize_headless.py board.kicad_pcb -o panel.kicad_pcb --boards-x 3 --boards-y 2
+import os
+import sys
+import types
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Import the plugin modules as a package without running its __init__, which registers the action plugin.
+# This is done on import, as the worker processes of the jobs import this script again.
+if 'panelize_plugin' not in sys.modules:
+    package = types.ModuleType('panelize_plugin')
+    package.__path__ = [PLUGIN_DIR]
+    sys.modules['panelize_plugin'] = package
+
+from panelize_plugin import panelize_cli
+
+if __name__ == '__main__':
+    sys.exit(panelize_cli.main())
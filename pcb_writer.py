@@ -0,0 +1,466 @@
+# Panel output which writes the .kicad_pcb file directly from the source files, without building
+# pcbnew objects. Every source file is parsed once, its items are turned into a template in which only
+# the coordinates and timestamps change, and each copy is streamed to the output file.
+import math
+import re
+from collections import OrderedDict
+from .geometry import (
+    FromMM, PlanLayout, PlanMixedLayout, PackPanel, TabOffsets, FindEdgeRanges,
+    ArcPoints, BezierPoints, PolylineSegments, CutOutline,
+)
+from .instrumentation import NullStats
+from .constants import COPY_NET_NAME
+
+# Newest board file format which can be written, the one used by KiCad 5
+KICAD5_VERSION = 20171130
+# Offset of the panel from the corner of the page, the same as used by the Panel
+PAGE_OFFSET = FromMM(20)
+
+TOKEN = re.compile(r'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()"]+')
+
+# Nodes of which the first two values are a coordinate
+COORDINATE_NODES = set(['at', 'start', 'end', 'center', 'mid', 'xy'])
+FOOTPRINT_NODES = set(['module', 'footprint'])
+# Nodes which are taken from a single source board and written before the nets
+HEADER_NODES = set(['version', 'host', 'general', 'page', 'title_block', 'layers', 'setup'])
+# Counts in the general section which no longer match the panel
+GENERAL_COUNTS = set(['links', 'no_connects', 'area', 'drawings', 'tracks', 'zones', 'modules', 'nets'])
+SILKSCREEN_LAYERS = set(['F.SilkS', 'B.SilkS'])
+
+# Kinds of template slots
+SLOT_X = 0
+SLOT_Y = 1
+SLOT_STAMP = 2
+SLOT_NET = 3
+SLOT_NET_NAME = 4
+
+def ParseSexpr(text):
+    # Nested lists of tokens, quoted strings keep their quotes so they are written back unchanged
+    stack = [[]]
+    for token in TOKEN.findall(text):
+        if token == '(':
+            stack.append([])
+        elif token == ')':
+            if len(stack) == 1:
+                raise ValueError('Unbalanced parentheses in board file')
+            node = stack.pop()
+            stack[-1].append(node)
+        else:
+            stack[-1].append(token)
+    if len(stack) != 1 or len(stack[0]) != 1:
+        raise ValueError('Unbalanced parentheses in board file')
+    return stack[0][0]
+
+def FormatSexpr(node):
+    return '(' + ' '.join(FormatSexpr(c) if isinstance(c, list) else c for c in node) + ')'
+
+def Child(node, name):
+    for child in node[1:]:
+        if isinstance(child, list) and child and child[0] == name:
+            return child
+    return None
+
+def Unquote(token):
+    return token[1:-1] if token.startswith('"') else token
+
+def ToNM(token):
+    return FromMM(float(token))
+
+def FormatMM(value):
+    text = ('%.6f' % (value / 1e6)).rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+def Layer(node):
+    layer = Child(node, 'layer')
+    return Unquote(layer[1]) if layer is not None and len(layer) > 1 else None
+
+def FootprintPlacement(node):
+    # Function which turns footprint relative coordinates into board coordinates
+    at = Child(node, 'at')
+    x, y = ToNM(at[1]), ToNM(at[2])
+    angle = math.radians(float(at[3])) if len(at) > 3 else 0.0
+    c, s = math.cos(angle), math.sin(angle)
+    return lambda p: (int(round(x + p[0] * c + p[1] * s)), int(round(y - p[0] * s + p[1] * c)))
+
+def ShapeSegments(node, place=None):
+    # Shape of a graphic item approximated by line segments (x0, y0, x1, y1)
+    kind = node[0][3:]
+    place = place or (lambda p: p)
+
+    def point(name):
+        child = Child(node, name)
+        return place((ToNM(child[1]), ToNM(child[2])))
+
+    if kind == 'line':
+        return [point('start') + point('end')]
+    elif kind == 'rect':
+        (x0, y0), (x1, y1) = point('start'), point('end')
+        return PolylineSegments([(x0, y0), (x1, y0), (x1, y1), (x0, y1)], True)
+    elif kind == 'arc':
+        # Arcs are stored as the center, the start point and the angle in degrees
+        (cx, cy), (sx, sy) = point('start'), point('end')
+        return PolylineSegments(ArcPoints(cx, cy, sx, sy, float(Child(node, 'angle')[1]) * 10))
+    elif kind == 'circle':
+        (cx, cy), (ex, ey) = point('center'), point('end')
+        radius = int(round(math.hypot(ex - cx, ey - cy)))
+        return PolylineSegments(ArcPoints(cx, cy, cx + radius, cy, 3600))
+    elif kind in ('poly', 'curve'):
+        points = [place((ToNM(xy[1]), ToNM(xy[2]))) for xy in Child(node, 'pts')[1:]]
+        if kind == 'curve':
+            return PolylineSegments(BezierPoints(*points))
+        return PolylineSegments(points, True)
+    elif kind == 'text':
+        return [point('at') * 2]
+    return []
+
+def InsideBox(segments, box):
+    left, top, right, bottom = box
+    return all(
+        left <= x0 <= right and left <= x1 <= right and top <= y0 <= bottom and top <= y1 <= bottom
+        for x0, y0, x1, y1 in segments
+    )
+
+class TextBoard:
+    def __init__(self, file_name):
+        self.file_name = file_name
+        with open(file_name) as f:
+            root = ParseSexpr(f.read())
+        if not root or root[0] != 'kicad_pcb':
+            raise ValueError('{} is not a KiCad board file'.format(file_name))
+        version = Child(root, 'version')
+        if version is not None and int(version[1]) > KICAD5_VERSION:
+            raise ValueError('Only KiCad 5 board files can be written directly')
+
+        self.header = []
+        # Nets as (code, name), and the net classes
+        self.nets = []
+        self.net_classes = []
+        # Items which are copied using a template
+        self.items = []
+        # Straight outline segments (x0, y0, x1, y1, width), copied separately so that tabs can break them.
+        # Rectangles and polygons are copied as their sides.
+        self.outline_lines = []
+        self.outline_thickness = 0
+        outline = []
+        for node in root[1:]:
+            if not isinstance(node, list) or not node:
+                continue
+            head = node[0]
+            if head in HEADER_NODES:
+                self.header.append(node)
+            elif head == 'net':
+                self.nets.append((int(node[1]), node[2] if len(node) > 2 else '""'))
+            elif head == 'net_class':
+                self.net_classes.append(node)
+            elif head.startswith('gr_') and Layer(node) == 'Edge.Cuts':
+                segments = ShapeSegments(node)
+                outline.extend(segments)
+                width = Child(node, 'width')
+                width = ToNM(width[1]) if width is not None else 0
+                self.outline_thickness = max(self.outline_thickness, width)
+                if head in ('gr_line', 'gr_rect', 'gr_poly'):
+                    self.outline_lines.extend(segment + (width,) for segment in segments)
+                else:
+                    self.items.append(node)
+            else:
+                self.items.append(node)
+        if not outline:
+            raise ValueError('{} has no board outline'.format(file_name))
+
+        # Bounding box of the center of the outline
+        self.left = min(min(s[0], s[2]) for s in outline)
+        self.top = min(min(s[1], s[3]) for s in outline)
+        self.right = max(max(s[0], s[2]) for s in outline)
+        self.bottom = max(max(s[1], s[3]) for s in outline)
+        self.edge_ranges = FindEdgeRanges(outline, self.left, self.top, self.right, self.bottom)
+
+        layers = Child(root, 'layers')
+        self.copper_layers = len([l for l in (layers or [])[1:] if isinstance(l, list) and Unquote(l[1]).endswith('.Cu')])
+
+    def GetWidth(self):
+        return self.right - self.left
+
+    def GetHeight(self):
+        return self.bottom - self.top
+
+class PanelWriter:
+    def __init__(self, settings, stats=None):
+        self.settings = settings
+        # Collect timings and counters only when a PanelStats is given
+        self.stats = stats if stats is not None else NullStats()
+        self.stamp = 0
+
+    def LoadSources(self):
+        # Every design of a mixed panel is parsed once
+        if self.settings.designs:
+            return [TextBoard(board_file) for board_file, _ in self.settings.DesignQuantities()]
+        return TextBoard(self.settings.board_file)
+
+    def Write(self, file_name, source=None):
+        # Write the panel to the file. For a mixed panel the source is a list with a board for each design.
+        with self.stats.Phase('load'):
+            if source is None:
+                source = self.LoadSources()
+        sources = list(source) if isinstance(source, (list, tuple)) else [source]
+        if self.settings.rotation % 360 or self.settings.alternate:
+            raise ValueError('Turned boards cannot be written directly')
+        if self.settings.vscore:
+            raise ValueError('Scored panels cannot be written directly')
+        outline_thickness = max(s.outline_thickness for s in sources)
+
+        with self.stats.Phase('layout'):
+            plan = self.Plan(sources)
+        with self.stats.Phase('tabs'):
+            outline, holes = self.PlaceTabs(sources, plan, outline_thickness)
+
+        with open(file_name, 'w') as out:
+            with self.stats.Phase('header'):
+                copy_nets = self.WriteHeader(out, sources, plan)
+            with self.stats.Phase('boards'):
+                self.WriteBoards(out, sources, plan, copy_nets)
+            with self.stats.Phase('frame'):
+                self.WriteFrame(out, plan, outline, holes)
+            out.write(')\n')
+
+    def Plan(self, sources):
+        tab_width = self.settings.tab_width
+        edge_ranges = [
+            tuple([r for r in ranges if r[1] - r[0] > tab_width] for ranges in s.edge_ranges)
+            for s in sources
+        ]
+        if not self.settings.designs:
+            source = sources[0]
+            tab_ver_offsets, tab_hor_offsets = TabOffsets(self.settings, source.GetWidth(), source.GetHeight(), edge_ranges[0])
+            return PlanLayout(self.settings, source.GetWidth(), source.GetHeight(), tab_ver_offsets, tab_hor_offsets)
+
+        # Pack every copy of every design
+        quantities = self.settings.DesignQuantities()
+        designs = [i for i, (_, quantity) in enumerate(quantities) for _ in range(quantity)]
+        sizes = [(s.GetWidth(), s.GetHeight()) for s in sources]
+        packed = PackPanel([sizes[d] for d in designs], self.settings.spacing_width, self.settings.pack_width)
+        if packed is None:
+            raise ValueError('The boards do not fit in the pack width')
+        positions, pack_width, pack_height = packed
+        self.stats.Count('packed_boards', len(positions))
+        return PlanMixedLayout(self.settings, sizes, edge_ranges, positions, designs, pack_width, pack_height)
+
+    def PlaceTabs(self, sources, plan, outline_thickness):
+        # Outline segments of the frame and of all copies in panel coordinates, as [x0, y0, x1, y1, width]
+        outline = [[x0, y0, x1, y1, outline_thickness] for x0, y0, x1, y1 in plan.frame_segments]
+        for (board_x, board_y), design in zip(plan.copies, plan.copy_designs):
+            source = sources[design]
+            dx, dy = board_x - source.left, board_y - source.top
+            outline.extend([x0 + dx, y0 + dy, x1 + dx, y1 + dy, w] for x0, y0, x1, y1, w in source.outline_lines)
+        outline, cut_tabs = CutOutline(plan, outline, outline_thickness)
+        self.stats.Count('outline_breaks', 2 * len(cut_tabs))
+
+        # Holes as (x, y, pattern), the pattern is None for a single hole
+        holes = []
+        for tab in cut_tabs:
+            self.stats.Count('holes', len(plan.hole_pattern[tab[0]]))
+            if self.settings.group_tab_holes:
+                holes.append((tab[1], tab[2], plan.hole_pattern[tab[0]]))
+            else:
+                holes.extend((x, y, None) for x, y in plan.TabHoles(tab))
+        return outline, holes
+
+    def NextStamp(self):
+        self.stamp += 1
+        return '%08X' % self.stamp
+
+    def NetTable(self, sources, plan):
+        # Nets of the panel as {name: (code, name token)}, and for every copy the panel net of each
+        # source net code, as {code: (panel code, name token)}. Nets with the same name are merged,
+        # unless every copy gets its own nets.
+        nets = OrderedDict([('', ('0', '""'))])
+        copy_nets = []
+        merged = {}
+        for i, design in enumerate(plan.copy_designs):
+            if not self.settings.separate_nets and design in merged:
+                copy_nets.append(merged[design])
+                continue
+            codes = {0: nets['']}
+            for code, token in sources[design].nets:
+                name = Unquote(token)
+                if code == 0 or not name:
+                    continue
+                if self.settings.separate_nets:
+                    name = COPY_NET_NAME.format(index=i + 1, name=name)
+                    token = '"' + name + '"'
+                if name not in nets:
+                    nets[name] = (str(len(nets)), token)
+                codes[code] = nets[name]
+            merged[design] = codes
+            copy_nets.append(codes)
+        return nets, copy_nets
+
+    def WriteHeader(self, out, sources, plan):
+        # The header of the board with the most copper layers is used for the panel
+        header_source = max(sources, key=lambda s: s.copper_layers)
+        nets, copy_nets = self.NetTable(sources, plan)
+
+        out.write('(kicad_pcb')
+        for node in header_source.header:
+            if node[0] == 'general':
+                node = [c for c in node if not (isinstance(c, list) and c[0] in GENERAL_COUNTS)]
+                node.append(['nets', str(len(nets))])
+            out.write('\n  ' + FormatSexpr(node))
+        out.write('\n')
+        for code, token in nets.values():
+            out.write('  (net {} {})\n'.format(code, token))
+
+        # Panel nets of every source net name, to put them in the net class of the source net
+        aliases = {}
+        for design, codes in zip(plan.copy_designs, copy_nets):
+            for code, token in sources[design].nets:
+                if code in codes:
+                    panel_names = aliases.setdefault(Unquote(token), [])
+                    if codes[code][1] not in panel_names:
+                        panel_names.append(codes[code][1])
+
+        # Net classes with the same name are merged
+        classes = OrderedDict()
+        for source in sources:
+            for node in source.net_classes:
+                key = Unquote(node[1])
+                if key not in classes:
+                    classes[key] = ([c for c in node if not (isinstance(c, list) and c[0] == 'add_net')], [])
+                members = classes[key][1]
+                for child in node[2:]:
+                    if isinstance(child, list) and child[0] == 'add_net':
+                        members.extend(n for n in aliases.get(Unquote(child[1]), []) if n not in members)
+        for node, members in classes.values():
+            out.write('  ' + FormatSexpr(node + [['add_net', n] for n in members]) + '\n')
+        return copy_nets
+
+    def WriteBoards(self, out, sources, plan, copy_nets):
+        templates = {}
+        for i, ((board_x, board_y), design) in enumerate(zip(plan.copies, plan.copy_designs)):
+            # Compile the template of each design once, all copies only fill in the slots
+            if design not in templates:
+                templates[design] = self.CompileTemplate(sources[design])
+            template, slots = templates[design]
+            source = sources[design]
+            nets = copy_nets[i]
+            dx = board_x - source.left + PAGE_OFFSET
+            dy = board_y - source.top + PAGE_OFFSET
+            with self.stats.Copy(i, board_x, board_y):
+                values = tuple(
+                    FormatMM(value + dx) if kind == SLOT_X else
+                    FormatMM(value + dy) if kind == SLOT_Y else
+                    self.NextStamp() if kind == SLOT_STAMP else
+                    nets.get(value, nets[0])[kind - SLOT_NET]
+                    for kind, value in slots
+                )
+                out.write(template % values)
+                self.stats.Count('items_copied', len(source.items) + len(source.outline_lines))
+
+    def CompileTemplate(self, source):
+        # Format string of all items of the source, with a slot for every coordinate, timestamp and net
+        chunks = []
+        slots = []
+        trim_box = None
+        if self.settings.trim_silkscreen:
+            half = self.settings.spacing_width // 2
+            trim_box = (source.left - half, source.top - half, source.right + half, source.bottom + half)
+
+        for node in source.items:
+            if trim_box is not None:
+                if node[0].startswith('gr_') and Layer(node) in SILKSCREEN_LAYERS and not InsideBox(ShapeSegments(node), trim_box):
+                    continue
+                if node[0] in FOOTPRINT_NODES:
+                    node = self.TrimFootprint(node, trim_box)
+            chunks.append('  ')
+            self.CompileNode(node, chunks, slots, True)
+            chunks.append('\n')
+        return (''.join(chunks), slots)
+
+    def TrimFootprint(self, node, trim_box):
+        # Drop the graphic items on the silkscreen which are not within the trim box
+        place = FootprintPlacement(node)
+        kept = [node[0]]
+        for child in node[1:]:
+            if (isinstance(child, list) and child[0].startswith('fp_') and Layer(child) in SILKSCREEN_LAYERS and
+                    not (child[0] == 'fp_text' and child[1] in ('reference', 'value')) and
+                    not InsideBox(ShapeSegments(child, place), trim_box)):
+                continue
+            kept.append(child)
+        return kept
+
+    def CompileNode(self, node, chunks, slots, translate):
+        head = node[0]
+        if head == 'tstamp' and len(node) == 2:
+            chunks.append('(tstamp %s)')
+            slots.append((SLOT_STAMP, None))
+            return
+        if head == 'net' and len(node) in (2, 3):
+            # Net of a track, via or zone, or of a pad together with the net name
+            code = int(node[1])
+            chunks.append('(net %s %s)' if len(node) == 3 else '(net %s)')
+            slots.append((SLOT_NET, code))
+            if len(node) == 3:
+                slots.append((SLOT_NET_NAME, code))
+            return
+        values = [v.replace('%', '%%') if not isinstance(v, list) else v for v in node[1:]]
+
+        chunks.append('(' + head.replace('%', '%%'))
+        if translate and head in COORDINATE_NODES and len(values) >= 2:
+            chunks.append(' %s %s')
+            slots.append((SLOT_X, ToNM(values[0])))
+            slots.append((SLOT_Y, ToNM(values[1])))
+            values = values[2:]
+        footprint = head in FOOTPRINT_NODES
+        # A zone names its net in a separate node, which has to follow the net of the copy
+        zone_net = Child(node, 'net') if head == 'zone' else None
+        for value in values:
+            chunks.append(' ')
+            if zone_net is not None and isinstance(value, list) and value[0] == 'net_name' and len(value) == 2:
+                chunks.append('(net_name %s)')
+                slots.append((SLOT_NET_NAME, int(zone_net[1])))
+            elif isinstance(value, list):
+                # Footprint items are relative to the footprint, only its own position moves
+                self.CompileNode(value, chunks, slots, translate and (not footprint or value[0] == 'at'))
+            else:
+                chunks.append(value)
+        chunks.append(')')
+
+    def WriteFrame(self, out, plan, outline, holes):
+        # Outline of the frame, the copies and the tabs
+        offset = PAGE_OFFSET
+        for x0, y0, x1, y1, width in outline:
+            out.write('  (gr_line (start {} {}) (end {} {}) (layer Edge.Cuts) (width {}) (tstamp {}))\n'.format(
+                FormatMM(x0 + offset), FormatMM(y0 + offset), FormatMM(x1 + offset), FormatMM(y1 + offset),
+                FormatMM(width), self.NextStamp()))
+
+        # Holes in the frame and the tabs
+        hole = FormatMM(plan.hole_size)
+        frame_hole = FormatMM(self.settings.outline_hole)
+        for x, y in plan.frame_holes:
+            self.WriteFootprint(out, 'Panel:Hole', x, y, [self.HolePad(0, 0, frame_hole)])
+        for x, y, pattern in holes:
+            pads = [self.HolePad(dx, dy, hole) for dx, dy in (pattern or [(0, 0)])]
+            self.WriteFootprint(out, 'Panel:MouseBite', x, y, pads)
+
+        # Fiducials on the front and back
+        mask = FormatMM(self.settings.fiducial_mask)
+        copper = FormatMM(self.settings.fiducial_copper)
+        for x, y, back in plan.fiducials:
+            side = 'B' if back else 'F'
+            self.WriteFootprint(out, 'Panel:Fiducial', x, y, [
+                '(pad "" smd circle (at 0 0) (size {0} {0}) (layers {1}.Mask))'.format(mask, side),
+                '(pad "" smd circle (at 0 0) (size {0} {0}) (layers {1}.Cu))'.format(copper, side),
+            ])
+
+    def HolePad(self, dx, dy, size):
+        return '(pad "" np_thru_hole circle (at {0} {1}) (size {2} {2}) (drill {2}) (layers *.Cu *.Mask))'.format(
+            FormatMM(dx), FormatMM(dy), size)
+
+    def WriteFootprint(self, out, name, x, y, pads):
+        self.stats.Count('footprints_created')
+        out.write('  (module {} (layer F.Cu) (tedit 0) (tstamp {}) (at {} {})\n'.format(
+            name, self.NextStamp(), FormatMM(x + PAGE_OFFSET), FormatMM(y + PAGE_OFFSET)))
+        for kind in ('reference', 'value'):
+            out.write('    (fp_text {} "" (at 0 0) (layer F.SilkS) hide (effects (font (size 1 1) (thickness 0.15))))\n'.format(kind))
+        for pad in pads:
+            out.write('    ' + pad + '\n')
+        out.write('  )\n')
@@ -0,0 +1,128 @@
+import os
+from collections import OrderedDict
+from pcbnew import *
+from .constants import Layers, DrawSegmentShape
+from .geometry import ArcPoints, BezierPoints, PolylineSegments
+
+class SourceBoard:
+    def __init__(self, board, file_name=''):
+        self.board = board
+        self.file_name = file_name
+
+        # Get the thickness of the outline
+        self.box = board.GetBoardEdgesBoundingBox()
+        self.outline_thickness = 0
+        for drawing in board.GetDrawings():
+            if type(drawing) == DRAWSEGMENT and drawing.GetLayer() == Layers.Edge_Cuts:
+                self.outline_thickness = max(self.outline_thickness, drawing.GetWidth())
+        # Shrink the bounding box to the center of the outline
+        self.box.Inflate(-(self.outline_thickness // 2), -(self.outline_thickness // 2))
+
+        # Outline as line segments and the ranges of the board edges which follow the bounding box,
+        # computed when first needed
+        self.outline = None
+        self.edge_ranges = None
+        # Parts near the edges which tabs should avoid, keyed by the required clearance
+        self.keepouts = {}
+        # Prepared items for copying, keyed by the settings which affect them
+        self.prototypes = {}
+        # Turned copies of this board, keyed by the angle
+        self.rotations = {}
+
+    def GetWidth(self):
+        return self.box.GetWidth()
+
+    def GetHeight(self):
+        return self.box.GetHeight()
+
+    def Rotated(self, angle):
+        # This board turned counterclockwise by the angle in tenths of a degree, around the center of the outline
+        angle = angle % 3600
+        if angle == 0:
+            return self
+        if angle not in self.rotations:
+            board = LoadBoard(self.file_name)
+            center = self.box.GetCenter()
+            items = list(board.GetDrawings()) + list(board.GetModules()) + list(board.GetTracks())
+            items.extend(board.GetArea(i) for i in range(board.GetAreaCount()))
+            for item in items:
+                item.Rotate(center, angle)
+            self.rotations[angle] = SourceBoard(board, self.file_name)
+        return self.rotations[angle]
+
+    def GetOutline(self):
+        # All the shapes on the Edge_Cuts layer, approximated by line segments (x0, y0, x1, y1)
+        if self.outline is None:
+            self.outline = []
+            for drawing in self.board.GetDrawings():
+                if type(drawing) == DRAWSEGMENT and drawing.GetLayer() == Layers.Edge_Cuts:
+                    self.outline.extend(self.OutlineSegments(drawing))
+        return self.outline
+
+    @staticmethod
+    def OutlineSegments(drawing):
+        shape = drawing.GetShape()
+        if shape == DrawSegmentShape.Segment:
+            start = drawing.GetStart()
+            end = drawing.GetEnd()
+            return [(start[0], start[1], end[0], end[1])]
+        elif shape == DrawSegmentShape.Rect:
+            start = drawing.GetStart()
+            end = drawing.GetEnd()
+            corners = [(start[0], start[1]), (end[0], start[1]), (end[0], end[1]), (start[0], end[1])]
+            return PolylineSegments(corners, True)
+        elif shape == DrawSegmentShape.Arc:
+            center = drawing.GetCenter()
+            start = drawing.GetArcStart()
+            return PolylineSegments(ArcPoints(center[0], center[1], start[0], start[1], drawing.GetAngle()))
+        elif shape == DrawSegmentShape.Circle:
+            center = drawing.GetCenter()
+            radius = drawing.GetRadius()
+            return PolylineSegments(ArcPoints(center[0], center[1], center[0] + radius, center[1], 3600))
+        elif shape == DrawSegmentShape.Polygon:
+            points = [(p[0], p[1]) for p in drawing.GetPolyPoints()]
+            return PolylineSegments(points, True)
+        elif shape == DrawSegmentShape.Curve:
+            points = [drawing.GetStart(), drawing.GetBezControl1(), drawing.GetBezControl2(), drawing.GetEnd()]
+            return PolylineSegments(BezierPoints(*[(p[0], p[1]) for p in points]))
+        return []
+
+class SourceBoardCache:
+    def __init__(self, max_entries=3):
+        self.max_entries = max_entries
+        # Loaded boards in least recently used order
+        self.entries = OrderedDict()
+
+    def Key(self, file_name):
+        # A board is reused as long as the file was not modified
+        path = os.path.abspath(file_name)
+        stat = os.stat(path)
+        return (path, stat.st_mtime, stat.st_size)
+
+    def Get(self, file_name, keep=0):
+        # The boards of the same panel are kept together, up to keep boards may stay beyond the size
+        key = self.Key(file_name)
+        source = self.entries.pop(key, None)
+        if source is None:
+            # Drop older versions of the same file
+            for other in [k for k in self.entries if k[0] == key[0]]:
+                del self.entries[other]
+            source = SourceBoard(LoadBoard(file_name), file_name)
+
+        # Mark the board as most recently used and evict the least recently used boards
+        self.entries[key] = source
+        while len(self.entries) > max(self.max_entries, keep):
+            self.entries.popitem(last=False)
+        return source
+
+    def GetSources(self, settings):
+        # The source board for the settings, or a list with one source board per design for a mixed panel
+        if settings.designs:
+            # Every design of the panel stays loaded until other boards are used, or loading the last
+            # designs would evict the first ones and the next run would load them all again
+            quantities = settings.DesignQuantities()
+            return [self.Get(board_file, len(quantities)) for board_file, _ in quantities]
+        return self.Get(settings.board_file)
+
+    def Clear(self):
+        self.entries.clear()
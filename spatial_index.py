@@ -0,0 +1,118 @@
+from pcbnew import *
+from .constants import Layers, DrawSegmentShape
+from .geometry import GridIndex
+
+class OutlineIndex:
+    def __init__(self, cell_size, accuracy=10):
+        self.grid = GridIndex(cell_size)
+        self.accuracy = accuracy
+        # Number of drawings looked at and hit tests done, for instrumentation
+        self.scanned = 0
+        self.hit_tests = 0
+
+    @staticmethod
+    def IsOutlineSegment(drawing):
+        return (type(drawing) == DRAWSEGMENT and
+                drawing.GetShape() == DrawSegmentShape.Segment and
+                drawing.GetLayer() == Layers.Edge_Cuts)
+
+    def Build(self, board):
+        # Add all the outline segments which are currently on the board
+        for drawing in board.GetDrawings():
+            self.scanned += 1
+            if self.IsOutlineSegment(drawing):
+                self.Add(drawing)
+
+    def Add(self, drawing):
+        start = drawing.GetStart()
+        end = drawing.GetEnd()
+        # Grow the bounding box with the line width and the hit test accuracy
+        margin = drawing.GetWidth() // 2 + self.accuracy
+        self.grid.Insert(
+            drawing,
+            min(start[0], end[0]) - margin,
+            min(start[1], end[1]) - margin,
+            max(start[0], end[0]) + margin,
+            max(start[1], end[1]) + margin
+        )
+
+    def Remove(self, drawing):
+        self.grid.Remove(drawing)
+
+    def FindHit(self, hit_rect):
+        # Check only the outline segments close to the hit rectangle
+        left = min(hit_rect.GetLeft(), hit_rect.GetRight())
+        right = max(hit_rect.GetLeft(), hit_rect.GetRight())
+        top = min(hit_rect.GetTop(), hit_rect.GetBottom())
+        bottom = max(hit_rect.GetTop(), hit_rect.GetBottom())
+        for drawing in self.grid.Query(left, top, right, bottom):
+            self.hit_tests += 1
+            if drawing.HitTest(hit_rect, False, self.accuracy):
+                return drawing
+        return None
+
+class KeepoutIndex:
+    def __init__(self, box, margin, cell_size):
+        # Items are stored relative to the origin of the board bounding box
+        self.origin = box.GetOrigin()
+        self.width = box.GetWidth()
+        self.height = box.GetHeight()
+        self.margin = margin
+        self.grid = GridIndex(cell_size)
+
+    def Build(self, board):
+        # Footprints, approximated by their outline without texts, their pads and the tracks
+        for module in board.GetModules():
+            self.Add(module.GetFootprintRect())
+            for pad in module.Pads():
+                self.Add(pad.GetBoundingBox())
+        for track in board.GetTracks():
+            self.Add(track.GetBoundingBox())
+
+    def BuildCopper(self, board):
+        # Only the copper: the pads, the tracks and vias, and the zones
+        for module in board.GetModules():
+            for pad in module.Pads():
+                self.Add(pad.GetBoundingBox())
+        for track in board.GetTracks():
+            self.Add(track.GetBoundingBox())
+        for i in range(board.GetAreaCount()):
+            zone = board.GetArea(i)
+            # The fill keeps at least the zone clearance from the board edge, so the zone is
+            # approximated by its outline within the board shrunk by the clearance
+            box = zone.GetBoundingBox()
+            clearance = zone.GetZoneClearance()
+            left = max(min(box.GetLeft(), box.GetRight()) - self.origin[0], clearance)
+            right = min(max(box.GetLeft(), box.GetRight()) - self.origin[0], self.width - clearance)
+            top = max(min(box.GetTop(), box.GetBottom()) - self.origin[1], clearance)
+            bottom = min(max(box.GetTop(), box.GetBottom()) - self.origin[1], self.height - clearance)
+            if left <= right and top <= bottom:
+                self.AddBox(zone, left, top, right, bottom)
+
+    def Add(self, rect):
+        left = min(rect.GetLeft(), rect.GetRight()) - self.origin[0]
+        right = max(rect.GetLeft(), rect.GetRight()) - self.origin[0]
+        top = min(rect.GetTop(), rect.GetBottom()) - self.origin[1]
+        bottom = max(rect.GetTop(), rect.GetBottom()) - self.origin[1]
+        self.AddBox(rect, left, top, right, bottom)
+
+    def AddBox(self, item, left, top, right, bottom):
+        # Only the items close to the edges of the board can get in the way of a tab
+        m = self.margin
+        if left > m and top > m and right < self.width - m and bottom < self.height - m:
+            return
+        self.grid.Insert(item, left, top, right, bottom)
+
+    def Clearance(self, left, top, right, bottom):
+        # Distance from the box to the closest item, up to the margin
+        clearance = self.margin
+        m = self.margin
+        for item in self.grid.Query(left - m, top - m, right + m, bottom + m):
+            box = self.grid.items[id(item)][2]
+            dx = max(box[0] - right, left - box[2], 0)
+            dy = max(box[1] - bottom, top - box[3], 0)
+            clearance = min(clearance, int((dx * dx + dy * dy) ** 0.5))
+        return clearance
+
+    def __len__(self):
+        return len(self.grid)
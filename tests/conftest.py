@@ -0,0 +1,17 @@
+# The tests run without KiCad, against the pcbnew stand-in of the benchmarks
+import os
+import sys
+import types
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.join(PLUGIN_DIR, 'benchmarks'))
+
+import fake_pcbnew
+# The plugin does 'from pcbnew import *', so the stand-in has to be registered first
+sys.modules['pcbnew'] = fake_pcbnew
+
+# Import the plugin modules without running the package __init__, which registers the action plugin
+package = types.ModuleType('panelize_plugin')
+package.__path__ = [PLUGIN_DIR]
+sys.modules['panelize_plugin'] = package
@@ -0,0 +1,148 @@
+import types
+import pytest
+import fake_pcbnew
+from fake_pcbnew import LoadBoard, MODULE, FromMM, wxPoint, register_board
+from boards import make_board
+from panelize_plugin.constants import Layers
+from panelize_plugin.fab_output import FabOutput, GerberLayer, ExcellonFile
+from panelize_plugin.panelize import PanelSettings
+from panelize_plugin.source_board import SourceBoard
+
+# Top copper of a board as plotted by KiCad 5, with the origin at the top left corner of the board
+GERBER = '''G04 #@! TF.GenerationSoftware,KiCad,Pcbnew,5.1.9*
+G04 #@! TF.FileFunction,Copper,L1,Top*
+%FSLAX46Y46*%
+G04 Gerber Fmt 4.6, Leading zero omitted, Abs format (unit mm)*
+%MOMM*%
+%LPD*%
+G01*
+G04 APERTURE LIST*
+%AMRoundRect*
+0 Rectangle with rounded corners*
+21,1,$1,$2,0,0,0*%
+%ADD10C,0.250000*%
+%ADD11RoundRect,0.250000X0.500000*%
+%TD*%
+G04 APERTURE END LIST*
+D10*
+X1000000Y-2000000D02*
+X3000000Y-2000000D01*
+G54D11*
+X2000000Y-1000000D03*
+M02*
+'''
+
+# Plated holes of a board as written by KiCad 5
+EXCELLON = '''M48
+; DRILL file {KiCad 5.1.9} date Sat Oct 17 12:00:00 2026
+; FORMAT={-:-/ absolute / metric / decimal}
+FMAT,2
+METRIC
+T1C0.800
+T2C1.000
+%
+G90
+G05
+T1
+X10.0Y-5.0
+X12.5Y-5.0
+T2
+X20.0Y-10.0
+T0
+M30
+'''
+
+def grid_plan(xs, ys):
+    # Copies of a single design at the given positions in millimeters
+    return types.SimpleNamespace(copies=[(FromMM(x), FromMM(y)) for y in ys for x in xs], panel_height=FromMM(100))
+
+def fab_output(plan, variants=None):
+    fab = FabOutput(PanelSettings('board.kicad_pcb'))
+    fab.copy_variants = variants if variants is not None else [0] * len(plan.copies)
+    return fab
+
+def test_gerber_layer_is_split_into_prelude_apertures_and_objects():
+    layer = GerberLayer(GERBER)
+    assert layer.decimals == 6
+    assert '%FSLAX46Y46*%' in layer.prelude and '%MOMM*%' in layer.prelude
+    assert [a[:5] for a in layer.apertures] == ['%AMRo', '%ADD1', '%ADD1', '%TD*%']
+    assert layer.body[0] == 'D10*'
+    assert layer.body[-1] == 'X2000000Y-1000000D03*'
+
+def test_gerber_layer_in_inches_is_rejected():
+    with pytest.raises(ValueError):
+        GerberLayer(GERBER.replace('%MOMM*%', '%MOIN*%'))
+
+def test_renumbered_apertures_and_macros():
+    apertures, body, next_code = GerberLayer(GERBER).Renumbered(20, '_1')
+    assert next_code == 22
+    assert apertures[0].startswith('%AMRoundRect_1*')
+    assert '%ADD20C,0.250000*%' in apertures
+    assert '%ADD21RoundRect_1,0.250000X0.500000*%' in apertures
+    # The aperture selections follow the new codes, the coordinates are unchanged
+    assert [b for b in body if b.endswith('D10*') or b.endswith('D11*')] == []
+    assert body[0] == 'D20*' and 'D21*' in body
+    assert 'X3000000Y-2000000D01*' in body
+
+def test_grid_steps():
+    plan = grid_plan([10, 40, 70], [10, 35])
+    assert fab_output(plan).GridSteps(plan) == (3, 2, FromMM(30), FromMM(25))
+    assert fab_output(plan, [0, 1, 0, 1, 0, 1]).GridSteps(plan) is None
+
+def test_grid_steps_of_a_non_uniform_grid():
+    plan = grid_plan([10, 40, 80], [10, 35])
+    assert fab_output(plan).GridSteps(plan) is None
+
+def test_step_and_repeat_covers_every_copy(tmp_path):
+    plan = grid_plan([10, 40, 70], [10, 35])
+    fab = fab_output(plan)
+    grid = fab.GridSteps(plan)
+    fab.origin = fab.Origin(plan, grid)
+    # The plotted board lies at the origin, every copy is a step up or to the right of it
+    steps = set((i * 30, j * 25) for i in range(3) for j in range(2))
+    assert set(tuple(int(v) // 1000000 for v in fab.Point(x, y)[1:].split('Y')) for x, y in plan.copies) == steps
+
+    file_name = str(tmp_path / 'F_Cu.gbr')
+    assert fab.WriteLayer(file_name, [GerberLayer(GERBER)], plan, grid, [])
+    text = open(file_name).read()
+    assert '%SRX3Y2I30J25*%' in text
+    assert text.index('%SRX3Y2') < text.index('X1000000Y-2000000D02*') < text.index('%SR*%')
+
+def test_drills_are_moved_to_every_copy(tmp_path):
+    plan = grid_plan([10, 40], [10])
+    fab = fab_output(plan)
+    fab.origin = (FromMM(10), FromMM(50))
+    file_name = str(tmp_path / 'PTH.drl')
+    fab.WriteDrill(file_name, [ExcellonFile(EXCELLON)], plan, [(FromMM(5), FromMM(45), FromMM(2.5))])
+    lines = open(file_name).read().splitlines()
+
+    assert lines[lines.index('T1C0.8') + 2:lines.index('%')] == ['T3C2.5']
+    # The copies are 40 mm above the origin, the second one also 30 mm to the right
+    t1 = lines[lines.index('T1') + 1:lines.index('T2')]
+    assert t1 == ['X10Y35', 'X12.5Y35', 'X40Y35', 'X42.5Y35']
+    # The holes of the frame have the y axis pointing up
+    assert lines[lines.index('T3') + 1] == 'X-5Y5'
+
+def test_silkscreen_is_trimmed_like_the_copies():
+    board = make_board(tracks=0, footprints=0, zones=0)
+    # Footprint on the corner of the board, its reference crosses the edge of the copy
+    module = MODULE(board)
+    module.Reference().SetLayer(Layers.F_SilkS)
+    module.SetPosition(wxPoint(FromMM(99), FromMM(99)))
+    board.Add(module)
+    register_board('trim.kicad_pcb', board)
+    settings = PanelSettings('trim.kicad_pcb')
+    settings.trim_silkscreen = True
+    source = SourceBoard(LoadBoard('trim.kicad_pcb'))
+
+    removed, added = FabOutput(settings).TrimSilkscreen(source)
+    # The silkscreen line which crosses the edge is replaced by its clipped copy
+    line = [d for d in removed if isinstance(d, fake_pcbnew.DRAWSEGMENT)]
+    clipped = [d for d in added if isinstance(d, fake_pcbnew.DRAWSEGMENT)]
+    assert len(line) == 1 and len(clipped) == 1
+    assert clipped[0].GetStart()[0] > line[0].GetStart()[0]
+    # The footprint is replaced by a duplicate with the reference hidden
+    modules = [m for m in added if isinstance(m, MODULE)]
+    assert [m for m in removed if isinstance(m, MODULE)] == [source.board.GetModules()[0]]
+    assert len(modules) == 1 and not modules[0].Reference().IsVisible()
+    assert source.board.GetModules()[0].Reference().IsVisible()
@@ -0,0 +1,72 @@
+import random
+import pytest
+from panelize_plugin.geometry import PackPanel, PlanMixedLayout, FromMM, TAB_HORIZONTAL_CUT
+from panelize_plugin.panelize import PanelSettings
+
+SPACING = FromMM(2)
+
+def random_sizes(count, seed=0):
+    rng = random.Random(seed)
+    return [(FromMM(rng.uniform(5, 60)), FromMM(rng.uniform(5, 60))) for _ in range(count)]
+
+def board_boxes(positions, sizes, offset=0):
+    return [(offset + x, offset + y, offset + x + w, offset + y + h) for (x, y), (w, h) in zip(positions, sizes)]
+
+@pytest.mark.parametrize('width', [0, FromMM(150)])
+def test_packed_boards_do_not_overlap_and_keep_the_spacing(width):
+    sizes = random_sizes(80)
+    positions, used_w, used_h = PackPanel(sizes, SPACING, width)
+    boxes = board_boxes(positions, sizes)
+    for i, a in enumerate(boxes):
+        # Inside the packed area, which ends with the spacing after the last board
+        assert a[0] >= 0 and a[1] >= 0 and a[2] + SPACING <= used_w and a[3] + SPACING <= used_h
+        for b in boxes[i + 1:]:
+            assert a[2] + SPACING <= b[0] or b[2] + SPACING <= a[0] or a[3] + SPACING <= b[1] or b[3] + SPACING <= a[1]
+    if width:
+        assert used_w <= width + SPACING
+
+def test_boards_which_do_not_fit_the_width_are_rejected():
+    assert PackPanel([(FromMM(50), FromMM(10))], SPACING, FromMM(40)) is None
+
+def tab_faces(plan, tab, boxes):
+    # Whether the tab ends on an edge on both sides of the gap, which cover the whole width of the tab
+    direction, x, y = tab
+    half = plan.tab_width // 2
+    if direction == TAB_HORIZONTAL_CUT:
+        covers = lambda b: b[0] <= x - half and x + half <= b[2]
+        return (any(b[3] == y and covers(b) for b in boxes) and
+                any(b[1] == y + plan.spacing_width and covers(b) for b in boxes))
+    covers = lambda b: b[1] <= y - half and y + half <= b[3]
+    return (any(b[2] == x and covers(b) for b in boxes) and
+            any(b[0] == x + plan.spacing_width and covers(b) for b in boxes))
+
+def mixed_plan(sizes, positions, pack_width, pack_height):
+    settings = PanelSettings('')
+    settings.tabs_x = 2
+    settings.tabs_y = 2
+    edge_ranges = [([(0, w)], [(0, h)]) for w, h in sizes]
+    plan = PlanMixedLayout(settings, sizes, edge_ranges, positions, list(range(len(sizes))), pack_width, pack_height)
+    # The boards and the inner edges of the frame
+    ow = settings.outline_width
+    w, h = plan.panel_width, plan.panel_height
+    boxes = board_boxes(positions, sizes, ow + settings.spacing_width)
+    boxes += [(0, 0, w, ow), (0, h - ow, w, h), (0, 0, ow, h), (w - ow, 0, w, h)]
+    return plan, boxes
+
+def test_tabs_only_connect_boards_which_face_each_other():
+    # A and B side by side, C below A only, so B and C share no edge
+    sizes = [(FromMM(20), FromMM(10)), (FromMM(20), FromMM(10)), (FromMM(10), FromMM(10))]
+    positions = [(0, 0), (FromMM(20) + SPACING, 0), (0, FromMM(10) + SPACING)]
+    plan, boxes = mixed_plan(sizes, positions, FromMM(42) + SPACING, FromMM(20) + 2 * SPACING)
+    assert plan.tabs
+    assert all(tab_faces(plan, tab, boxes) for tab in plan.tabs)
+    # No tab in the gap below B, where nothing faces it
+    b_left, b_bottom = boxes[1][0], boxes[1][3]
+    assert not [t for t in plan.tabs if t[0] == TAB_HORIZONTAL_CUT and t[2] == b_bottom and t[1] > b_left]
+
+def test_tabs_of_a_packed_panel_face_each_other():
+    sizes = random_sizes(30, seed=1)
+    positions, used_w, used_h = PackPanel(sizes, SPACING)
+    plan, boxes = mixed_plan(sizes, positions, used_w, used_h)
+    assert plan.tabs
+    assert all(tab_faces(plan, tab, boxes) for tab in plan.tabs)
@@ -0,0 +1,19 @@
+import fake_pcbnew
+from boards import register_synthetic_board
+from panelize_plugin.instrumentation import PanelStats
+from panelize_plugin.panelize import Panel, PanelSettings
+
+def test_every_phase_is_reported_once():
+    register_synthetic_board('phases.kicad_pcb', tracks=20, footprints=4)
+    settings = PanelSettings('phases.kicad_pcb')
+    settings.boards_x = 4
+    settings.boards_y = 4
+    stats = PanelStats()
+    Panel(settings, fake_pcbnew.BOARD(), stats).create_panel()
+
+    names = [phase['name'] for phase in stats.phases]
+    assert len(names) == len(set(names))
+    assert 'boards' in names and 'tabs' in names
+    boards = next(phase for phase in stats.phases if phase['name'] == 'boards')
+    assert len(stats.copies) == 16
+    assert boards['counters']['items_copied'] == stats.totals['items_copied']
@@ -0,0 +1,74 @@
+import os
+import json
+from panelize_plugin.panel_cache import PanelCache, PanelKey
+from panelize_plugin.panelize import PanelSettings
+from panelize_plugin.panelize_cli import run_job
+from test_pcb_writer import BOARD
+
+def board_settings(tmp_path, name='board.kicad_pcb', board=BOARD):
+    board_file = tmp_path / name
+    board_file.write_text(board)
+    settings = PanelSettings(str(board_file))
+    settings.boards_x = 2
+    return settings
+
+def test_panel_key_follows_the_content_and_settings(tmp_path):
+    settings = board_settings(tmp_path)
+    key = PanelKey(settings, 'direct')
+    assert PanelKey(settings, 'direct') == key
+    # The same content under another path is the same panel
+    assert PanelKey(board_settings(tmp_path, 'copy.kicad_pcb'), 'direct') == key
+    # Other settings, output kinds, job parameters or board content are not
+    settings.tabs_x = 2
+    assert PanelKey(settings, 'direct') != key
+    settings.tabs_x = 1
+    assert PanelKey(settings, 'board') != key
+    assert PanelKey(settings, 'direct', {'max_panel_width': 100}) != key
+    assert PanelKey(board_settings(tmp_path, 'other.kicad_pcb', BOARD.replace('GND', 'VCC')), 'direct') != key
+
+def test_evict_removes_the_least_recently_used_panels(tmp_path):
+    cache = PanelCache(str(tmp_path / 'cache'), max_bytes=250)
+    panel = tmp_path / 'panel.kicad_pcb'
+    panel.write_text('x' * 100)
+    keys = ['aa' + str(i) * 62 for i in range(3)]
+    for age, key in enumerate(keys):
+        cache.Put(key, str(panel), 'warning {}'.format(key))
+        # Older panels were used longer ago
+        os.utime(cache.Path(key), (1000 + age, 1000 + age))
+    # The first panel was removed on the third Put, using the second one keeps it over the third
+    assert not os.path.exists(cache.Path(keys[0]))
+    assert cache.Warnings(keys[0]) == ''
+    assert cache.Get(keys[1], str(tmp_path / 'out.kicad_pcb'))
+    cache.Put(keys[0], str(panel))
+    assert os.path.exists(cache.Path(keys[0])) and os.path.exists(cache.Path(keys[1]))
+    assert not os.path.exists(cache.Path(keys[2]))
+    assert cache.Warnings(keys[1]) == 'warning {}'.format(keys[1])
+
+def cached_job(tmp_path, **job):
+    settings = board_settings(tmp_path)
+    job.update({'board_file': settings.board_file, 'boards_x': 2, 'direct': True, 'cache': str(tmp_path / 'cache'),
+                'output': str(tmp_path / 'panel.kicad_pcb')})
+    return run_job(job)[1]
+
+def test_cache_hits_write_the_report(tmp_path):
+    assert cached_job(tmp_path) is None
+    report = str(tmp_path / 'report.json')
+    assert cached_job(tmp_path, report=report) is None
+    with open(report) as f:
+        assert json.load(f)['totals'] == {'cache_hits': 1}
+
+def test_verify_replaces_a_differing_cache_entry(tmp_path):
+    assert cached_job(tmp_path) is None
+    output = tmp_path / 'panel.kicad_pcb'
+    panel = output.read_text()
+    # The same panel apart from the timestamps is accepted
+    assert cached_job(tmp_path, verify_cache=True) is None
+
+    key = [f for f in (tmp_path / 'cache').glob('*/*.kicad_pcb')][0]
+    key.write_text('(kicad_pcb)\n')
+    assert cached_job(tmp_path, verify_cache=True) == 'The cached panel differs from a new one, the cache entry was replaced'
+    assert output.read_text() == panel and key.read_text() == panel
+    assert not os.path.exists(str(tmp_path / 'panel-verify.kicad_pcb'))
+
+def test_gerber_output_is_not_cached(tmp_path):
+    assert cached_job(tmp_path, gerber=True).startswith('Gerber output is not cached')
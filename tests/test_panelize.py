@@ -0,0 +1,99 @@
+import pytest
+import fake_pcbnew
+from fake_pcbnew import DRAWSEGMENT, FromMM, wxPoint, register_board
+from boards import make_board
+from panelize_plugin.constants import Layers, DrawSegmentShape
+from panelize_plugin.instrumentation import PanelStats
+from panelize_plugin.panelize import Panel, PanelSettings
+
+def rect_outline_board(file_name):
+    # Synthetic 50 x 40 mm board whose outline is a single rectangle
+    board = make_board(tracks=0, footprints=0, zones=0)
+    for drawing in [d for d in board.drawings if d.GetLayer() == Layers.Edge_Cuts]:
+        board.Remove(drawing)
+    rect = DRAWSEGMENT(board)
+    rect.SetShape(DrawSegmentShape.Rect)
+    rect.SetLayer(Layers.Edge_Cuts)
+    rect.SetWidth(FromMM(0.1))
+    rect.SetStart(wxPoint(FromMM(100), FromMM(100)))
+    rect.SetEnd(wxPoint(FromMM(150), FromMM(140)))
+    board.Add(rect)
+    register_board(file_name, board)
+
+def test_tabs_are_placed_on_a_rect_outline():
+    rect_outline_board('rect.kicad_pcb')
+    settings = PanelSettings('rect.kicad_pcb')
+    settings.boards_x = 2
+    settings.boards_y = 2
+    settings.tabs_x = 2
+    settings.tabs_y = 1
+    settings.tab_mode = PanelSettings.TABS_SPACE_AUTO
+    stats = PanelStats()
+    panel = Panel(settings, fake_pcbnew.BOARD(), stats)
+    panel.create_panel()
+
+    # Tabs above and below every board and left and right of every board, each opens the outline twice
+    tabs = 3 * 2 * settings.tabs_x + 2 * 3 * settings.tabs_y
+    assert stats.totals['outline_breaks'] == 2 * tabs
+    outline = [d for d in panel.board.drawings if d.GetLayer() == Layers.Edge_Cuts]
+    assert all(d.GetShape() == DrawSegmentShape.Segment for d in outline)
+
+def test_panel_with_a_replaced_item_is_not_updated():
+    register_board('update.kicad_pcb', make_board(tracks=10, footprints=2, zones=0))
+    settings = PanelSettings('update.kicad_pcb')
+    settings.boards_x = 2
+    board = fake_pcbnew.BOARD()
+    panel = Panel(settings, board)
+    panel.create_panel()
+    assert panel.IsPanelBoard(board)
+
+    # Replace a generated mouse bite footprint with another footprint, the item counts stay the same
+    board.Remove(panel.items['tabs'][-1])
+    board.Add(fake_pcbnew.MODULE(board))
+    assert not panel.IsPanelBoard(board)
+
+def test_update_only_removes_the_items_of_the_earlier_run():
+    register_board('update.kicad_pcb', make_board(tracks=10, footprints=2, zones=0))
+    settings = PanelSettings('update.kicad_pcb')
+    settings.boards_x = 2
+    board = fake_pcbnew.BOARD()
+    panel = Panel(settings, board)
+    panel.create_panel()
+    # The items are kept alive, so that their ids are not reused
+    earlier_items = panel.BoardItems(board)
+    earlier = set(id(item) for item in earlier_items)
+
+    # The undo step of the first run still refers to its items, so they must not be freed
+    deleted = []
+    board.Delete = lambda item: (deleted.append(item), fake_pcbnew.BOARD.Remove(board, item))
+    changed = PanelSettings('update.kicad_pcb')
+    changed.boards_x = 2
+    changed.tabs_x = 2
+    panel.update_panel(changed)
+    assert deleted
+    assert not any(id(item) in earlier for item in deleted)
+    assert panel.IsPanelBoard(board)
+
+def net_class_board(file_name):
+    # Board with Net-1 in a net class with its own clearance, assigned as when KiCad loads the board
+    board = make_board(tracks=10, footprints=2, zones=0)
+    power = fake_pcbnew.NETCLASS('Power')
+    power.SetClearance(FromMM(0.5))
+    power.Add('Net-1')
+    board.GetDesignSettings().GetNetClasses().Add(power)
+    board.SynchronizeNetsAndNetClasses()
+    register_board(file_name, board)
+
+@pytest.mark.parametrize('separate_nets, net_name', [(True, 'Board_2-Net-1'), (False, 'Net-1')])
+def test_panel_nets_keep_their_net_class(separate_nets, net_name):
+    net_class_board('classes.kicad_pcb')
+    settings = PanelSettings('classes.kicad_pcb')
+    settings.boards_x = 2
+    settings.separate_nets = separate_nets
+    panel = Panel(settings, fake_pcbnew.BOARD())
+    panel.create_panel()
+
+    net = panel.board.FindNet(net_name)
+    assert net.GetClassName() == 'Power'
+    assert net.GetNetClass().GetClearance() == FromMM(0.5)
+    assert panel.board.FindNet(net_name.replace('Net-1', 'Net-2')).GetClassName() == 'Default'
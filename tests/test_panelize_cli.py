@@ -0,0 +1,15 @@
+import pytest
+from panelize_plugin.panelize import PanelSettings
+from panelize_plugin.panelize_cli import run_job, settings_from_job
+
+def test_settings_are_given_by_name():
+    settings = settings_from_job({'board_file': 'a.kicad_pcb', 'tab_mode': 'around', 'alternate': 'rows'})
+    assert settings.tab_mode == PanelSettings.TABS_SPACE_AROUND
+    assert settings.alternate == PanelSettings.ALTERNATE_ROWS
+    # The values themselves are accepted as well
+    assert settings_from_job({'tab_mode': PanelSettings.TABS_OPTIMIZE}).tab_mode == PanelSettings.TABS_OPTIMIZE
+
+@pytest.mark.parametrize('name, value', [('tab_mode', 'aroud'), ('alternate', 'colums'), ('vscore_layer', 'Dwgs'), ('tab_mode', 7)])
+def test_unknown_names_are_rejected(name, value):
+    job, error = run_job({'board_file': 'a.kicad_pcb', 'output': 'panel.kicad_pcb', name: value})
+    assert error.startswith('Failed: Unknown {}'.format(name))
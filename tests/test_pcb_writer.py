@@ -0,0 +1,57 @@
+from panelize_plugin.instrumentation import PanelStats
+from panelize_plugin.panelize import PanelSettings
+from panelize_plugin.pcb_writer import PanelWriter, ParseSexpr, Child, Unquote
+
+BOARD = '''(kicad_pcb (version 20171130) (host pcbnew 5.1.9)
+  (general (thickness 1.6) (nets 2))
+  (layers (0 F.Cu signal) (31 B.Cu signal) (44 Edge.Cuts user))
+  (net 0 "")
+  (net 1 GND)
+  (gr_line (start 100 100) (end 130 100) (layer Edge.Cuts) (width 0.1))
+  (gr_line (start 130 100) (end 130 120) (layer Edge.Cuts) (width 0.1))
+  (gr_line (start 130 120) (end 100 120) (layer Edge.Cuts) (width 0.1))
+  (gr_line (start 100 120) (end 100 100) (layer Edge.Cuts) (width 0.1))
+  (zone (net 1) (net_name GND) (layer F.Cu) (tstamp 5F000001) (hatch edge 0.508)
+    (connect_pads (clearance 0.508))
+    (min_thickness 0.254)
+    (fill (arc_segments 32) (thermal_gap 0.508) (thermal_bridge_width 0.508))
+    (polygon (pts (xy 101 101) (xy 129 101) (xy 129 119) (xy 101 119))))
+)
+'''
+
+def write_panel(tmp_path, board=BOARD, stats=None, **settings):
+    board_file = tmp_path / 'board.kicad_pcb'
+    board_file.write_text(board)
+    panel_settings = PanelSettings(str(board_file))
+    for name, value in settings.items():
+        setattr(panel_settings, name, value)
+    output = tmp_path / 'panel.kicad_pcb'
+    PanelWriter(panel_settings, stats).Write(str(output))
+    return ParseSexpr(output.read_text())
+
+def test_zone_net_names_follow_separate_nets(tmp_path):
+    root = write_panel(tmp_path, boards_x=2, separate_nets=True)
+    nets = dict((node[1], Unquote(node[2])) for node in root[1:] if isinstance(node, list) and node[0] == 'net')
+    zones = [node for node in root[1:] if isinstance(node, list) and node[0] == 'zone']
+    assert len(zones) == 2
+    names = []
+    for zone in zones:
+        name = Unquote(Child(zone, 'net_name')[1])
+        assert nets[Child(zone, 'net')[1]] == name
+        names.append(name)
+    assert names == ['Board_1-GND', 'Board_2-GND']
+
+def test_zone_net_names_are_shared_without_separate_nets(tmp_path):
+    root = write_panel(tmp_path, boards_x=2)
+    zones = [node for node in root[1:] if isinstance(node, list) and node[0] == 'zone']
+    assert [Unquote(Child(zone, 'net_name')[1]) for zone in zones] == ['GND', 'GND']
+
+def test_tabs_break_a_rect_outline(tmp_path):
+    lines = [line for line in BOARD.splitlines() if not line.startswith('  (gr_line')]
+    lines.insert(5, '  (gr_rect (start 100 100) (end 130 120) (layer Edge.Cuts) (width 0.1))')
+    stats = PanelStats()
+    root = write_panel(tmp_path, '\n'.join(lines), stats, boards_x=2, tab_mode=PanelSettings.TABS_SPACE_AUTO)
+
+    # Two tabs above and below each board and three left and right of the boards, each opens the outline twice
+    assert stats.totals['outline_breaks'] == 2 * (2 * 2 + 3)
+    assert not [node for node in root[1:] if isinstance(node, list) and node[0] == 'gr_rect']
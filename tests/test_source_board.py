@@ -0,0 +1,36 @@
+import fake_pcbnew
+from fake_pcbnew import register_board
+from boards import make_board
+from panelize_plugin.panelize import PanelSettings
+from panelize_plugin.source_board import SourceBoardCache
+
+def mixed_settings(tmp_path, designs=5):
+    # A mixed panel with more designs than the default size of the cache
+    settings = PanelSettings(str(tmp_path / 'design0.kicad_pcb'))
+    for i in range(designs):
+        file_name = str(tmp_path / 'design{}.kicad_pcb'.format(i))
+        open(file_name, 'w').close()
+        register_board(file_name, make_board(tracks=0, footprints=0, zones=0))
+        settings.designs.append((file_name, 1))
+    return settings
+
+def test_cache_keeps_every_design_of_a_mixed_panel(tmp_path):
+    settings = mixed_settings(tmp_path)
+    cache = SourceBoardCache()
+    first = cache.GetSources(settings)
+    fake_pcbnew.reset_calls()
+    second = cache.GetSources(settings)
+
+    # The second run reuses every loaded board
+    assert all(a is b for a, b in zip(first, second))
+    assert fake_pcbnew.calls.get('LoadBoard', 0) == 0
+
+def test_cache_shrinks_again_after_a_mixed_panel(tmp_path):
+    settings = mixed_settings(tmp_path)
+    cache = SourceBoardCache()
+    cache.GetSources(settings)
+    assert len(cache.entries) == 5
+    # A single board afterwards only keeps the size of the cache
+    cache.Get(settings.designs[0][0])
+    assert cache.max_entries == 3
+    assert len(cache.entries) == 3